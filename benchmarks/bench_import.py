@@ -0,0 +1,176 @@
+"""Benchmark the time taken to import the PBS executor.
+
+Each sample imports a module in a fresh interpreter, so the time
+includes everything a short-lived BMI or CLI process pays before it
+does any work. The heavy dependencies that the import pulled in are
+also reported. Results are written as JSON so that runs from
+different releases can be compared.
+
+Example::
+
+    python benchmarks/bench_import.py --repeat 20 \\
+        --output import_results.json --compare import_baseline.json
+
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from pbs_executor import __version__
+
+
+modules = ['pbs_executor.bmi_ingest', 'pbs_executor.ingest',
+           'pbs_executor.watch']
+heavy = ['netCDF4', 'numpy', 'yaml', 'markdown', 'sqlite3',
+         'multiprocessing']
+probe = '''
+import sys, time, json
+start = time.time()
+import {}
+seconds = time.time() - start
+loaded = [name for name in {!r} if name in sys.modules]
+sys.stdout.write(json.dumps({{'seconds': seconds, 'loaded': loaded}}))
+'''
+
+
+def sample(module):
+    """
+    Import a module in a new interpreter and time it.
+
+    Parameters
+    ----------
+    module : str
+      The module to import.
+
+    Returns
+    -------
+    dict
+      The import time, in seconds, and the heavy dependencies loaded.
+
+    """
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        os.pardir)
+    out = subprocess.check_output(
+        [sys.executable, '-c', probe.format(module, heavy)], cwd=root)
+    return json.loads(out.decode('utf-8'))
+
+
+def run_case(module, repeat):
+    """
+    Time repeated imports of a module.
+
+    Parameters
+    ----------
+    module : str
+      The module to import.
+    repeat : int
+      The number of samples.
+
+    Returns
+    -------
+    dict
+      The module, the minimum and median import times and the heavy
+      dependencies loaded.
+
+    """
+    samples = [sample(module) for i in range(repeat)]
+    times = sorted(s['seconds'] for s in samples)
+    return {
+        'module': module,
+        'repeat': repeat,
+        'min': times[0],
+        'median': times[len(times) // 2],
+        'loaded': samples[-1]['loaded'],
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Find modules that are slower to import than in a baseline run.
+
+    Parameters
+    ----------
+    results : list of dict
+      The results of this run.
+    baseline : list of dict
+      The results of an earlier run.
+    threshold : float
+      The ratio of median times above which an import counts as a
+      regression.
+
+    Returns
+    -------
+    list of str
+      A description of each regression.
+
+    """
+    earlier = dict((r['module'], r) for r in baseline)
+    regressions = []
+    for r in results:
+        b = earlier.get(r['module'])
+        if b is None:
+            continue
+        if b['median'] > 0 and r['median'] / b['median'] > threshold:
+            regressions.append('{}: {:.3f} s -> {:.3f} s'.format(
+                r['module'], b['median'], r['median']))
+        added = sorted(set(r['loaded']) - set(b['loaded']))
+        if added:
+            regressions.append('{}: now loads {}'.format(
+                r['module'], ', '.join(added)))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark the import time of the PBS executor.')
+    parser.add_argument('--modules', nargs='+', default=modules,
+                        help='Modules to import')
+    parser.add_argument('--repeat', type=int, default=10,
+                        help='Number of samples for each module')
+    parser.add_argument('--output', default='import_results.json',
+                        help='Path to the JSON results file')
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help='JSON results of an earlier run to compare')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='Slowdown ratio reported as a regression')
+    args = parser.parse_args(argv)
+
+    results = []
+    for module in args.modules:
+        try:
+            r = run_case(module, args.repeat)
+        except subprocess.CalledProcessError:
+            sys.stdout.write('{:28s} import failed\n'.format(module))
+            continue
+        results.append(r)
+        sys.stdout.write(
+            '{module:28s} min {min:7.3f} s  median {median:7.3f} s  '
+            'loads {0}\n'.format(', '.join(r['loaded']) or '-', **r))
+    report = {
+        'version': __version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time': time.time(),
+        'results': results,
+    }
+    with open(args.output, 'w') as fp:
+        json.dump(report, fp, indent=2, sort_keys=True)
+    if args.compare is not None:
+        with open(args.compare, 'r') as fp:
+            baseline = json.load(fp)['results']
+        regressions = compare(results, baseline, args.threshold)
+        for line in regressions:
+            sys.stdout.write('REGRESSION ' + line + '\n')
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,211 @@
+"""Benchmark the PBS ingest tools on synthetic netCDF files.
+
+Each run generates files in a scratch directory and times the
+`verify`, `move` and `symlink` steps and the `Logger` separately, for
+both ModelIngestTool and BenchmarkIngestTool. Results are written as
+JSON so that runs from different releases can be compared.
+
+Example::
+
+    python benchmarks/bench_ingest.py --counts 10 1000 --sizes 10KB 1MB \\
+        --output bench_results.json --compare bench_baseline.json
+
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from pbs_executor import __version__
+from pbs_executor.file import IngestFile, Logger
+from pbs_executor.ingest import ModelIngestTool, BenchmarkIngestTool
+from synthetic import make_files, parse_size, formats
+
+
+tools = {
+    'model': (ModelIngestTool, 'MODELS', 'MODELS-by-project'),
+    'benchmark': (BenchmarkIngestTool, 'DATA', 'DATA-by-project'),
+}
+steps = ['verify', 'move', 'symlink', 'logger']
+log_message = '''## File Moved\n
+The file `{}` has been moved to `{}` in the PBS data store.
+'''
+
+
+def make_tool(kind, root, names):
+    tool_class, dest_dir, link_dir = tools[kind]
+    tool = tool_class()
+    tool.ilamb_root = root
+    tool.dest_dir = dest_dir
+    tool.link_dir = ''
+    tool.project_name = 'PBS'
+    tool.source_name = 'bench'
+    tool.ingest_files = [IngestFile(name) for name in names]
+    return tool, link_dir
+
+
+def timed(func, *args):
+    start = time.time()
+    func(*args)
+    return time.time() - start
+
+
+def run_case(kind, count, size, fmt, jobs=1):
+    """
+    Time each ingest step for one set of synthetic files.
+
+    Parameters
+    ----------
+    kind : str
+      'model' or 'benchmark'.
+    count : int
+      The number of files.
+    size : str
+      The approximate size of each file; e.g., '10KB'.
+    fmt : str
+      'NETCDF3_CLASSIC' or 'NETCDF4_CLASSIC'.
+    jobs : int, optional
+      Number of verification workers (default is 1).
+
+    Returns
+    -------
+    dict
+      The case parameters and the wall time of each step.
+
+    """
+    cwd = os.getcwd()
+    root = tempfile.mkdtemp(prefix='pbs-bench-')
+    try:
+        os.chdir(root)
+        names = make_files(root, count, size, fmt=fmt, kind=kind)
+        nbytes = sum(os.path.getsize(name) for name in names)
+        tool, link_dir = make_tool(kind, root, names)
+        tool.jobs = jobs
+        result = {
+            'tool': kind,
+            'count': count,
+            'size': parse_size(size),
+            'format': fmt,
+            'jobs': jobs,
+            'bytes': nbytes,
+        }
+        result['verify'] = timed(tool.verify)
+        result['move'] = timed(tool.move)
+        tool.link_dir = link_dir
+
+        def symlink():
+            for f in tool.ingest_files:
+                tool.link(f)
+
+        result['symlink'] = timed(symlink)
+
+        def log():
+            x = Logger(title='Benchmark')
+            for f in tool.ingest_files:
+                x.add(log_message.format(f.name, f.target))
+            x.close()
+
+        result['logger'] = timed(log)
+        result['verified'] = sum(f.is_verified for f in tool.ingest_files)
+        return result
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(root)
+
+
+def compare(results, baseline, threshold):
+    """
+    Find steps that are slower than in a baseline run.
+
+    Parameters
+    ----------
+    results : list of dict
+      The results of this run.
+    baseline : list of dict
+      The results of an earlier run.
+    threshold : float
+      The ratio of times above which a step counts as a regression.
+
+    Returns
+    -------
+    list of str
+      A description of each regression.
+
+    """
+    keys = ['tool', 'count', 'size', 'format', 'jobs']
+    earlier = dict((tuple(r[k] for k in keys), r) for r in baseline)
+    regressions = []
+    for r in results:
+        b = earlier.get(tuple(r[k] for k in keys))
+        if b is None:
+            continue
+        for step in steps:
+            if b[step] > 0 and r[step] / b[step] > threshold:
+                regressions.append(
+                    '{} {} {} x {} B: {} {:.3f} s -> {:.3f} s'.format(
+                        r['tool'], r['format'], r['count'], r['size'],
+                        step, b[step], r[step]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark the PBS ingest tools.')
+    parser.add_argument('--counts', type=int, nargs='+', default=[10, 100],
+                        help='Numbers of files to ingest')
+    parser.add_argument('--sizes', nargs='+', default=['10KB'],
+                        help='Approximate file sizes; e.g., 10KB 5MB 1GB')
+    parser.add_argument('--formats', nargs='+', default=formats,
+                        choices=formats, help='netCDF formats')
+    parser.add_argument('--tools', nargs='+', default=sorted(tools),
+                        choices=sorted(tools), help='Ingest tools')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='Number of verification workers')
+    parser.add_argument('--output', default='bench_results.json',
+                        help='Path to the JSON results file')
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help='JSON results of an earlier run to compare')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='Slowdown ratio reported as a regression')
+    args = parser.parse_args(argv)
+
+    results = []
+    for kind in args.tools:
+        for fmt in args.formats:
+            for size in args.sizes:
+                for count in args.counts:
+                    r = run_case(kind, count, size, fmt, jobs=args.jobs)
+                    results.append(r)
+                    sys.stdout.write(
+                        '{tool:9s} {format:15s} {count:7d} x {size:>10d} B  '
+                        'verify {verify:8.3f} s  move {move:8.3f} s  '
+                        'symlink {symlink:8.3f} s  logger {logger:8.3f} s\n'
+                        .format(**r))
+    report = {
+        'version': __version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time': time.time(),
+        'results': results,
+    }
+    with open(args.output, 'w') as fp:
+        json.dump(report, fp, indent=2, sort_keys=True)
+    if args.compare is not None:
+        with open(args.compare, 'r') as fp:
+            baseline = json.load(fp)['results']
+        regressions = compare(results, baseline, args.threshold)
+        for line in regressions:
+            sys.stdout.write('REGRESSION ' + line + '\n')
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""Generate synthetic CMIP5-named netCDF files for benchmarking the
+PBS ingest tools.
+
+"""
+import os
+import shutil
+import numpy as np
+from netCDF4 import Dataset
+
+
+formats = ['NETCDF3_CLASSIC', 'NETCDF4_CLASSIC']
+nlat, nlon = 36, 72
+
+
+def parse_size(size):
+    """
+    Convert a size such as '10KB', '5MB' or '1GB' to bytes.
+
+    Parameters
+    ----------
+    size : str or int
+      The size.
+
+    """
+    if isinstance(size, int):
+        return size
+    units = {'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3, 'B': 1}
+    size = size.strip().upper()
+    for suffix in ['KB', 'MB', 'GB', 'B']:
+        if size.endswith(suffix):
+            return int(float(size[:-len(suffix)]) * units[suffix])
+    return int(size)
+
+
+def model_filename(index, variable='tas', model='PBS-bench'):
+    """
+    Make a unique CMIP5-compatible model output file name.
+
+    Parameters
+    ----------
+    index : int
+      A number that makes the name unique.
+    variable : str, optional
+      The variable name (default is 'tas').
+    model : str, optional
+      The model name (default is 'PBS-bench').
+
+    """
+    return '{}_Amon_{}_historical_r{}i1p1_185001-200512.nc'.format(
+        variable, model, index + 1)
+
+
+def benchmark_filename(index, variable='tas'):
+    """
+    Make a unique ILAMB benchmark data file name.
+
+    Parameters
+    ----------
+    index : int
+      A number that makes the name unique.
+    variable : str, optional
+      The variable name (default is 'tas').
+
+    """
+    return '{}_{:06d}.nc'.format(variable, index)
+
+
+def write_template(path, nbytes, fmt='NETCDF3_CLASSIC', variable='tas'):
+    """
+    Write a netCDF file of roughly a given size.
+
+    The file holds a monthly (time, lat, lon) float32 field on a
+    5-degree grid, with as many time steps as fit in *nbytes*. A file
+    holds at least one time step, about 10 KB.
+
+    Parameters
+    ----------
+    path : str
+      The path to the new file.
+    nbytes : int
+      The approximate size of the file, in bytes.
+    fmt : str, optional
+      'NETCDF3_CLASSIC' or 'NETCDF4_CLASSIC'.
+    variable : str, optional
+      The variable name (default is 'tas').
+
+    """
+    ntime = max(1, nbytes // (nlat * nlon * 4))
+    with Dataset(path, 'w', format=fmt) as d:
+        d.createDimension('time', None)
+        d.createDimension('lat', nlat)
+        d.createDimension('lon', nlon)
+        t = d.createVariable('time', 'f8', ('time',))
+        t.units = 'days since 1850-01-01'
+        lat = d.createVariable('lat', 'f4', ('lat',))
+        lat.units = 'degrees_north'
+        lat[:] = np.linspace(-87.5, 87.5, nlat)
+        lon = d.createVariable('lon', 'f4', ('lon',))
+        lon.units = 'degrees_east'
+        lon[:] = np.linspace(-177.5, 177.5, nlon)
+        v = d.createVariable(variable, 'f4', ('time', 'lat', 'lon'))
+        v.units = 'K'
+        step = max(1, (1024 * 1024) // (nlat * nlon * 4))
+        rng = np.random.RandomState(0)
+        for i in range(0, ntime, step):
+            n = min(step, ntime - i)
+            t[i:i + n] = 30.0 * np.arange(i, i + n)
+            v[i:i + n] = 273.15 + rng.standard_normal(
+                (n, nlat, nlon)).astype('f4')
+
+
+def make_files(directory, count, size, fmt='NETCDF3_CLASSIC', kind='model'):
+    """
+    Generate synthetic files for an ingest benchmark.
+
+    One template file is written and then copied under *count* unique
+    names, so large counts are cheap to generate.
+
+    Parameters
+    ----------
+    directory : str
+      The directory in which to write the files.
+    count : int
+      The number of files.
+    size : str or int
+      The approximate size of each file; e.g., '10KB'.
+    fmt : str, optional
+      'NETCDF3_CLASSIC' or 'NETCDF4_CLASSIC'.
+    kind : str, optional
+      'model' for CMIP5 model output names or 'benchmark' for ILAMB
+      benchmark data names.
+
+    Returns
+    -------
+    list of str
+      The names of the files, relative to *directory*.
+
+    """
+    if fmt not in formats:
+        raise ValueError('Unknown format: {}'.format(fmt))
+    template = os.path.join(directory, '.template.nc')
+    write_template(template, parse_size(size), fmt=fmt)
+    names = []
+    for i in range(count):
+        if kind == 'model':
+            name = model_filename(i)
+        else:
+            name = benchmark_filename(i)
+        shutil.copyfile(template, os.path.join(directory, name))
+        names.append(name)
+    os.remove(template)
+    return names
@@ -0,0 +1,288 @@
+"""The `basins` module contains a sparse index of the cells of each
+river basin in `data/basins_0.5x0.5.nc`, for per-basin reductions of
+model fields.
+
+"""
+import os
+import json
+import shutil
+import numbers
+import tempfile
+from collections import OrderedDict
+from . import data_directory
+from .utils import makedirs
+
+
+basins_file = os.path.join(data_directory, 'basins_0.5x0.5.nc')
+cache_dir = os.path.join(os.path.expanduser('~'), '.cache', 'pbs_executor')
+index_version = 1
+reductions = ['mean', 'sum', 'min', 'max', 'count']
+
+
+def _source_identity(path):
+    st = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': st.st_size,
+            'mtime': st.st_mtime, 'version': index_version}
+
+
+class BasinIndex(object):
+    """
+    The cells of each basin of a basin grid, as a sparse index.
+
+    The flat indices of the cells of every basin are stored in one
+    sorted array, *cells*, with basin *i* at
+    ``cells[offsets[i]:offsets[i + 1]]``. A field is reduced over all
+    basins at once by gathering its values at *cells* and summing the
+    segments with ``numpy.add.reduceat``.
+
+    Parameters
+    ----------
+    cells : numpy.ndarray
+      The flat (lat, lon) indices of the cells of each basin, in
+      basin order.
+    offsets : numpy.ndarray
+      The start of each basin in *cells*, followed by its length.
+    labels : list of str
+      The name of each basin.
+    lat, lon : numpy.ndarray
+      The cell-center coordinates of the grid.
+
+    Attributes
+    ----------
+    labels : list of str
+      The name of each basin.
+    shape : tuple
+      The (lat, lon) shape of the grid.
+
+    Examples
+    --------
+    Find the mean of a field, such as a (time, lat, lon) array on the
+    0.5-degree grid, over each basin:
+
+    >>> index = BasinIndex.load()
+    >>> means = index.reduce(field, how='mean')
+    >>> means['Amazon']
+
+    """
+    def __init__(self, cells, offsets, labels, lat, lon):
+        self.cells = cells
+        self.offsets = offsets
+        self.labels = list(labels)
+        self.lat = lat
+        self.lon = lon
+        self.shape = (len(lat), len(lon))
+
+    @classmethod
+    def build(cls, path=basins_file, variable='basin_index'):
+        """
+        Build the index from a basin grid.
+
+        Parameters
+        ----------
+        path : str, optional
+          The path to the basin file (default is
+          `data/basins_0.5x0.5.nc`).
+        variable : str, optional
+          The name of the (lat, lon) variable of basin numbers
+          (default is 'basin_index'). Cells outside all basins are
+          masked or negative.
+
+        Returns
+        -------
+        BasinIndex
+          The index.
+
+        """
+        import numpy as np
+        from netCDF4 import Dataset
+        with Dataset(path) as dataset:
+            v = dataset.variables[variable]
+            ids = np.ma.filled(v[:], -1).astype('i8').ravel()
+            label_name = getattr(v, 'labels', 'label')
+            labels = [str(x) for x in dataset.variables[label_name][:]]
+            lat = np.asarray(dataset.variables[v.dimensions[0]][:], 'f8')
+            lon = np.asarray(dataset.variables[v.dimensions[1]][:], 'f8')
+        inside = np.flatnonzero(ids >= 0)
+        order = np.argsort(ids[inside], kind='mergesort')
+        cells = inside[order].astype('i4')
+        counts = np.bincount(ids[inside], minlength=len(labels))
+        offsets = np.concatenate(([0], np.cumsum(counts))).astype('i8')
+        return cls(cells, offsets, labels, lat, lon)
+
+    def save(self, directory, source=None):
+        """
+        Save the index as a directory of NumPy arrays.
+
+        The directory is written under a temporary name and renamed,
+        so readers never see a partial index.
+
+        Parameters
+        ----------
+        directory : str
+          The path to the index directory.
+        source : dict, optional
+          The identity of the basin file the index was built from.
+
+        """
+        import numpy as np
+        parent = os.path.dirname(os.path.abspath(directory))
+        makedirs(parent, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=parent)
+        for name in ['cells', 'offsets', 'lat', 'lon']:
+            np.save(os.path.join(tmp, name + '.npy'), getattr(self, name))
+        with open(os.path.join(tmp, 'meta.json'), 'w') as fp:
+            json.dump({'labels': self.labels, 'source': source}, fp)
+        if os.path.isdir(directory):
+            shutil.rmtree(directory)
+        try:
+            os.rename(tmp, directory)
+        except OSError:
+            shutil.rmtree(tmp)
+            if not os.path.isdir(directory):
+                raise
+
+    @classmethod
+    def open(cls, directory):
+        """
+        Open a saved index, memory-mapping its arrays.
+
+        Parameters
+        ----------
+        directory : str
+          The path to the index directory.
+
+        Returns
+        -------
+        BasinIndex
+          The index.
+
+        """
+        import numpy as np
+        arrays = [np.load(os.path.join(directory, name + '.npy'),
+                          mmap_mode='r')
+                  for name in ['cells', 'offsets', 'lat', 'lon']]
+        with open(os.path.join(directory, 'meta.json'), 'r') as fp:
+            meta = json.load(fp)
+        cells, offsets, lat, lon = arrays
+        return cls(cells, offsets, meta['labels'], lat, lon)
+
+    @classmethod
+    def load(cls, path=basins_file, cache=cache_dir):
+        """
+        Get the index of a basin grid, building it only if needed.
+
+        The index is saved under *cache* and reused by later runs for
+        as long as the basin file is unchanged.
+
+        Parameters
+        ----------
+        path : str, optional
+          The path to the basin file (default is
+          `data/basins_0.5x0.5.nc`).
+        cache : str, optional
+          The cache directory (default is ~/.cache/pbs_executor).
+
+        Returns
+        -------
+        BasinIndex
+          The index.
+
+        """
+        source = _source_identity(path)
+        name = os.path.splitext(os.path.basename(path))[0]
+        directory = os.path.join(cache, name + '.basins')
+        meta_file = os.path.join(directory, 'meta.json')
+        if os.path.isfile(meta_file):
+            with open(meta_file, 'r') as fp:
+                if json.load(fp).get('source') == source:
+                    return cls.open(directory)
+        index = cls.build(path)
+        index.save(directory, source=source)
+        return index
+
+    def cells_of(self, basin):
+        """
+        Get the flat (lat, lon) indices of the cells of a basin.
+
+        Parameters
+        ----------
+        basin : str or int
+          The name or number of the basin.
+
+        """
+        if not isinstance(basin, numbers.Integral):
+            basin = self.labels.index(basin)
+        return self.cells[self.offsets[basin]:self.offsets[basin + 1]]
+
+    def reduce(self, field, how='mean', weights=None):
+        """
+        Reduce a field over each basin in one vectorized pass.
+
+        Missing values, given as a masked array or as NaN, are left
+        out.
+
+        Parameters
+        ----------
+        field : array_like
+          A field whose last two dimensions are the (lat, lon) grid of
+          the index; e.g., a (time, lat, lon) array.
+        how : str, optional
+          One of 'mean', 'sum', 'min', 'max' or 'count' (default is
+          'mean').
+        weights : array_like, optional
+          (lat, lon) weights for 'mean' and 'sum'; e.g., cell areas
+          (default is equal weights).
+
+        Returns
+        -------
+        OrderedDict
+          The result for each basin, by name, with the shape of the
+          leading dimensions of *field*. Basins with no valid data
+          have a result of NaN (0 for 'count').
+
+        """
+        import numpy as np
+        if how not in reductions:
+            raise ValueError('Unknown reduction: {}'.format(how))
+        field = np.ma.masked_invalid(np.ma.asarray(field, dtype='f8'))
+        if field.shape[-2:] != self.shape:
+            raise ValueError('Field shape {} does not match grid {}'.format(
+                field.shape[-2:], self.shape))
+        lead = field.shape[:-2]
+        flat = field.reshape(lead + (-1,))
+        cells = np.asarray(self.cells)
+        values = np.ma.filled(flat, np.nan)[..., cells]
+        valid = ~np.ma.getmaskarray(flat)[..., cells]
+        counts = np.diff(np.asarray(self.offsets))
+        nonempty = np.flatnonzero(counts > 0)
+        starts = np.asarray(self.offsets)[:-1][nonempty]
+
+        def segments(ufunc, x, empty=np.nan):
+            out = np.full(lead + (len(self.labels),), empty)
+            if len(starts) > 0:
+                out[..., nonempty] = ufunc.reduceat(x, starts, axis=-1)
+            return out
+
+        n = segments(np.add, valid.astype('f8'), empty=0.0)
+        if how == 'count':
+            result = n.astype('i8')
+        elif how in ['min', 'max']:
+            fill = np.inf if how == 'min' else -np.inf
+            ufunc = np.minimum if how == 'min' else np.maximum
+            result = segments(ufunc, np.where(valid, values, fill))
+            result[n == 0] = np.nan
+        else:
+            w = np.ones(len(cells))
+            if weights is not None:
+                w = np.asarray(weights, dtype='f8').ravel()[cells]
+            w = np.where(valid, w, 0.0)
+            total = segments(np.add, np.where(valid, values, 0.0) * w)
+            if how == 'sum':
+                result = total
+                result[n == 0] = np.nan
+            else:
+                wsum = segments(np.add, w)
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    result = np.where(wsum > 0, total / wsum, np.nan)
+        return OrderedDict((label, result[..., i])
+                           for i, label in enumerate(self.labels))
@@ -25,13 +25,14 @@ class BmiIngestToolBase(Bmi):
     def update(self):
         if self.get_current_time() < self.get_end_time():
             self._time = self.get_end_time()
-            self._tool.verify()
-            self._tool.move()
+            self._tool.ingest()
 
     def update_until(self, time):
         self.update()
 
     def finalize(self):
+        if self._tool is not None:
+            self._tool.log.close()
         self._tool = None
 
     def get_input_var_names(self):
@@ -0,0 +1,191 @@
+"""The `cache` module contains a persistent cache of verification
+results.
+
+"""
+import os
+import json
+import sqlite3
+import threading
+import time
+
+
+schema = '''
+CREATE TABLE IF NOT EXISTS verification (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime REAL,
+    inode INTEGER,
+    rules TEXT,
+    result TEXT,
+    used REAL
+);
+CREATE INDEX IF NOT EXISTS verification_used ON verification (used);
+'''
+
+
+def identity(path):
+    """
+    Get the values that identify the current contents of a file.
+
+    Parameters
+    ----------
+    path : str
+      The path to a file.
+
+    Returns
+    -------
+    tuple or None
+      The absolute path, size, modification time and inode of the
+      file, or None if it can't be read.
+
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return os.path.abspath(path), st.st_size, st.st_mtime, st.st_ino
+
+
+class VerificationCache(object):
+    """
+    A SQLite cache of the results of verifying files.
+
+    A result is reused only while the file has the same path, size,
+    modification time and inode, and was verified under the same
+    rules; see `VerificationTool.rules`. The least recently used
+    results are evicted when the cache holds more than *max_entries*.
+
+    Parameters
+    ----------
+    path : str
+      The path to the cache database. It's created if it doesn't
+      exist.
+    max_entries : int, optional
+      The maximum number of results kept (default is 100000).
+
+    Attributes
+    ----------
+    path : str
+      The path to the cache database.
+    max_entries : int
+      The maximum number of results kept.
+
+    """
+    def __init__(self, path, max_entries=100000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(schema)
+
+    def close(self):
+        """
+        Close the cache database.
+
+        """
+        self._db.close()
+
+    def get(self, path, rules):
+        """
+        Get the cached result of verifying a file.
+
+        Parameters
+        ----------
+        path : str
+          The path to the file.
+        rules : str
+          The rules the file must have been verified under.
+
+        Returns
+        -------
+        dict or None
+          The result returned by `verify_file`, or None if there's no
+          valid cached result.
+
+        """
+        key = identity(path)
+        if key is None:
+            return None
+        with self._lock:
+            row = self._db.execute(
+                'SELECT size, mtime, inode, rules, result FROM verification '
+                'WHERE path = ?', (key[0],)).fetchone()
+            if row is None:
+                return None
+            if tuple(row[:3]) != key[1:] or row[3] != rules:
+                with self._db:
+                    self._db.execute('DELETE FROM verification WHERE path = ?',
+                                     (key[0],))
+                return None
+            with self._db:
+                self._db.execute('UPDATE verification SET used = ? '
+                                 'WHERE path = ?', (time.time(), key[0]))
+        return json.loads(row[4])
+
+    def put(self, path, rules, result):
+        """
+        Store the result of verifying a file.
+
+        Parameters
+        ----------
+        path : str
+          The path to the file.
+        rules : str
+          The rules the file was verified under.
+        result : dict
+          The result returned by `verify_file`.
+
+        """
+        self.put_many([(path, rules, result)])
+
+    def put_many(self, items):
+        """
+        Store several results in a single transaction.
+
+        Parameters
+        ----------
+        items : list of tuple
+          The path, rules and result of each file.
+
+        """
+        now = time.time()
+        rows = []
+        for path, rules, result in items:
+            key = identity(path)
+            if key is not None:
+                rows.append(key + (rules, json.dumps(result), now))
+        with self._lock:
+            with self._db:
+                self._db.executemany(
+                    'INSERT OR REPLACE INTO verification VALUES '
+                    '(?, ?, ?, ?, ?, ?, ?)', rows)
+                self._evict()
+
+    def _evict(self):
+        excess = self._count() - self.max_entries
+        if excess > 0:
+            self._db.execute(
+                'DELETE FROM verification WHERE path IN (SELECT path FROM '
+                'verification ORDER BY used LIMIT ?)', (excess,))
+
+    def _count(self):
+        return self._db.execute(
+            'SELECT COUNT(*) FROM verification').fetchone()[0]
+
+    def count(self):
+        """
+        Get the number of cached results.
+
+        """
+        with self._lock:
+            return self._count()
+
+    def clear(self):
+        """
+        Remove all cached results.
+
+        """
+        with self._lock:
+            with self._db:
+                self._db.execute('DELETE FROM verification')
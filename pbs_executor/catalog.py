@@ -0,0 +1,223 @@
+"""The `catalog` module contains a persistent index of the files
+ingested into the PBS data store.
+
+"""
+import os
+import sqlite3
+import threading
+import time
+
+
+schema = '''
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    kind TEXT,
+    variable TEXT,
+    model TEXT,
+    source TEXT,
+    project TEXT,
+    size INTEGER,
+    mtime REAL,
+    checksum TEXT,
+    ingested REAL
+);
+CREATE INDEX IF NOT EXISTS files_variable ON files (variable);
+CREATE INDEX IF NOT EXISTS files_model ON files (model);
+CREATE INDEX IF NOT EXISTS files_source ON files (source);
+CREATE INDEX IF NOT EXISTS files_project ON files (project);
+'''
+columns = ['path', 'kind', 'variable', 'model', 'source', 'project',
+           'size', 'mtime', 'checksum', 'ingested']
+
+
+class Catalog(object):
+    """
+    A SQLite index of the files in the PBS data store.
+
+    Parameters
+    ----------
+    path : str
+      The path to the catalog database. It's created if it doesn't
+      exist.
+
+    Attributes
+    ----------
+    path : str
+      The path to the catalog database.
+
+    Examples
+    --------
+    List the files ingested for a model:
+
+    >>> catalog = Catalog('/home/csdms/ilamb/.pbs_catalog.sqlite')
+    >>> for record in catalog.find(model='SiBCASA'):
+    ...     print(record['path'])
+
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(schema)
+
+    def close(self):
+        """
+        Close the catalog database.
+
+        """
+        self._db.close()
+
+    def contains(self, path):
+        """
+        Check whether a path is in the catalog.
+
+        Parameters
+        ----------
+        path : str
+          The path to a file in the data store.
+
+        """
+        with self._lock:
+            cur = self._db.execute('SELECT 1 FROM files WHERE path = ?',
+                                   (path,))
+            return cur.fetchone() is not None
+
+    def add(self, path, **fields):
+        """
+        Add a file to the catalog, replacing any existing record.
+
+        The file's size and modification time are read from the
+        filesystem if not given.
+
+        Parameters
+        ----------
+        path : str
+          The path to a file in the data store.
+        **fields
+          Values for the other catalog columns; e.g., `model`.
+
+        """
+        fields['path'] = path
+        self.add_many([fields])
+
+    def add_many(self, records):
+        """
+        Add several files to the catalog in a single transaction.
+
+        Parameters
+        ----------
+        records : list of dict
+          Column values for each file, including `path`.
+
+        """
+        rows = []
+        for fields in records:
+            fields = dict(fields)
+            unknown = set(fields) - set(columns)
+            if unknown:
+                raise ValueError('Unknown catalog fields: {}'.format(
+                    ', '.join(sorted(unknown))))
+            if 'size' not in fields or 'mtime' not in fields:
+                st = os.stat(fields['path'])
+                fields.setdefault('size', st.st_size)
+                fields.setdefault('mtime', st.st_mtime)
+            fields.setdefault('ingested', time.time())
+            rows.append([fields.get(name) for name in columns])
+        sql = 'INSERT OR REPLACE INTO files ({}) VALUES ({})'.format(
+            ', '.join(columns), ', '.join(['?'] * len(columns)))
+        with self._lock:
+            with self._db:
+                self._db.executemany(sql, rows)
+
+    def remove(self, path):
+        """
+        Remove a file from the catalog.
+
+        Parameters
+        ----------
+        path : str
+          The path to a file in the data store.
+
+        """
+        with self._lock:
+            with self._db:
+                self._db.execute('DELETE FROM files WHERE path = ?', (path,))
+
+    def find(self, **criteria):
+        """
+        Find files that match all of the given column values.
+
+        Parameters
+        ----------
+        **criteria
+          Column values to match; e.g., ``model='SiBCASA'``.
+
+        Returns
+        -------
+        list of dict
+          The matching records, ordered by path.
+
+        """
+        unknown = set(criteria) - set(columns)
+        if unknown:
+            raise ValueError('Unknown catalog fields: {}'.format(
+                ', '.join(sorted(unknown))))
+        names = sorted(criteria)
+        sql = 'SELECT * FROM files'
+        if names:
+            sql += ' WHERE ' + ' AND '.join(
+                ['{} = ?'.format(name) for name in names])
+        sql += ' ORDER BY path'
+        with self._lock:
+            cur = self._db.execute(sql, [criteria[name] for name in names])
+            return [dict(zip(row.keys(), row)) for row in cur]
+
+    def count(self):
+        """
+        Get the number of files in the catalog.
+
+        """
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM files').fetchone()[0]
+
+    def scan(self, root, kind, project=None):
+        """
+        Add the files in an existing MODELS or DATA tree to the catalog.
+
+        Parameters
+        ----------
+        root : str
+          The path to the MODELS or DATA directory.
+        kind : str
+          Either 'model', for MODELS/<model>/<file>, or 'benchmark',
+          for DATA/<variable>/<source>/<file>.
+        project : str, optional
+          The project name recorded for the files.
+
+        Returns
+        -------
+        int
+          The number of files added.
+
+        """
+        count = 0
+        for dirpath, dirnames, filenames in os.walk(root):
+            parts = os.path.relpath(dirpath, root).split(os.sep)
+            records = []
+            for name in filenames:
+                fields = {'kind': kind, 'project': project}
+                if kind == 'model' and len(parts) == 1 and parts[0] != '.':
+                    fields['model'] = parts[0]
+                    fields['variable'] = name.split('_')[0]
+                elif kind == 'benchmark' and len(parts) == 2:
+                    fields['variable'] = parts[0]
+                    fields['source'] = parts[1]
+                else:
+                    continue
+                fields['path'] = os.path.join(dirpath, name)
+                records.append(fields)
+            self.add_many(records)
+            count += len(records)
+        return count
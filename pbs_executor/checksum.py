@@ -0,0 +1,108 @@
+"""The `checksum` module contains functions for computing checksums of
+files ingested into the PBS.
+
+"""
+import os
+import hashlib
+
+
+read_size = 1024 * 1024
+part_size = 64 * 1024 * 1024
+
+
+def hash_file(path, algorithm='sha256'):
+    """
+    Compute the checksum of a file.
+
+    Parameters
+    ----------
+    path : str
+      The path to a file.
+    algorithm : str, optional
+      A hash algorithm provided by `hashlib` (default is 'sha256').
+
+    Returns
+    -------
+    str
+      The hexadecimal digest of the file.
+
+    """
+    h = hashlib.new(algorithm)
+    with open(path, 'rb') as fp:
+        while True:
+            buf = fp.read(read_size)
+            if not buf:
+                break
+            h.update(buf)
+    return h.hexdigest()
+
+
+def _hash_part(args):
+    path, algorithm, offset, length = args
+    h = hashlib.new(algorithm)
+    with open(path, 'rb') as fp:
+        fp.seek(offset)
+        while length > 0:
+            buf = fp.read(min(read_size, length))
+            if not buf:
+                break
+            h.update(buf)
+            length -= len(buf)
+    return h.digest()
+
+
+def chunked_type(algorithm, size=part_size):
+    """
+    Get the name of a chunked checksum.
+
+    Parameters
+    ----------
+    algorithm : str
+      A hash algorithm provided by `hashlib`.
+    size : int, optional
+      The size of each chunk, in bytes.
+
+    """
+    return '{}-chunked-{}M'.format(algorithm, size // (1024 * 1024))
+
+
+def hash_file_chunked(path, algorithm='sha256', jobs=4, size=part_size):
+    """
+    Compute a chunked checksum of a file in parallel.
+
+    The file is split into chunks of *size* bytes, which are hashed
+    by a pool of threads. The checksum is the digest of the
+    concatenated chunk digests, so it differs from the checksum
+    returned by `hash_file`.
+
+    Parameters
+    ----------
+    path : str
+      The path to a file.
+    algorithm : str, optional
+      A hash algorithm provided by `hashlib` (default is 'sha256').
+    jobs : int, optional
+      The number of threads (default is 4).
+    size : int, optional
+      The size of each chunk, in bytes (default is 64 MiB).
+
+    Returns
+    -------
+    str
+      The hexadecimal digest of the file.
+
+    """
+    nbytes = os.stat(path).st_size
+    parts = [(path, algorithm, offset, size)
+             for offset in range(0, max(nbytes, 1), size)]
+    from multiprocessing.pool import ThreadPool
+    pool = ThreadPool(jobs)
+    try:
+        digests = pool.map(_hash_part, parts)
+    finally:
+        pool.close()
+        pool.join()
+    h = hashlib.new(algorithm)
+    for digest in digests:
+        h.update(digest)
+    return h.hexdigest()
@@ -0,0 +1,320 @@
+"""The `coverage` module indexes the time periods covered by ingested
+model output files, to find overlapping and missing periods.
+
+"""
+import os
+import re
+import json
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+
+
+key_fields = ['model_name', 'variable_name', 'mip_table', 'experiment',
+              'ensemble_member']
+period_pattern = re.compile(r'^(\d+)-(\d+)')
+
+
+def _start_of(digits):
+    return datetime(int(digits[:4]), int(digits[4:6] or 1),
+                    int(digits[6:8] or 1), int(digits[8:10] or 0),
+                    int(digits[10:12] or 0))
+
+
+def _end_of(digits):
+    start = _start_of(digits)
+    n = len(digits)
+    if n == 4:
+        return start.replace(year=start.year + 1)
+    if n == 6:
+        if start.month == 12:
+            return start.replace(year=start.year + 1, month=1)
+        return start.replace(month=start.month + 1)
+    if n == 8:
+        return start + timedelta(days=1)
+    if n == 10:
+        return start + timedelta(hours=1)
+    return start + timedelta(minutes=1)
+
+
+def parse_period(temporal_subset):
+    """
+    Convert a CMIP5 temporal subset to a time interval.
+
+    Parameters
+    ----------
+    temporal_subset : str
+      A temporal subset such as '185001-200512'.
+
+    Returns
+    -------
+    tuple of datetime
+      The start of the first period and the end of the last, so
+      that the interval is half-open; e.g., 1850-01-01 and 2006-01-01.
+
+    Raises
+    ------
+    ValueError
+      If the temporal subset isn't valid.
+
+    """
+    m = period_pattern.match(temporal_subset)
+    if m is None:
+        raise ValueError('Invalid temporal subset: {}'.format(temporal_subset))
+    return _start_of(m.group(1)), _end_of(m.group(2))
+
+
+def format_period(start, end):
+    """
+    Format a half-open time interval for a log message.
+
+    """
+    return '{:%Y-%m-%d %H:%M} to {:%Y-%m-%d %H:%M}'.format(start, end)
+
+
+class Series(object):
+    """
+    The intervals of one model, variable, experiment and ensemble member.
+
+    Intervals are kept sorted by start time, with the merged coverage
+    kept alongside, so that overlap, gap and coverage queries need
+    only a binary search.
+
+    """
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        self.starts = []
+        self.intervals = []
+        self.max_length = timedelta(0)
+        self.segments = []
+        self.segment_starts = []
+
+    def overlaps(self, start, end):
+        try:
+            lo = start - self.max_length
+        except OverflowError:
+            lo = datetime.min
+        i = bisect_left(self.starts, lo)
+        j = bisect_left(self.starts, end)
+        return [path for s, e, path in self.intervals[i:j]
+                if s < end and start < e]
+
+    def add(self, start, end, path):
+        i = bisect_right(self.starts, start)
+        self.starts.insert(i, start)
+        self.intervals.insert(i, (start, end, path))
+        self.max_length = max(self.max_length, end - start)
+        self._merge(start, end)
+
+    def remove(self, path):
+        intervals = [x for x in self.intervals if x[2] != path]
+        self._reset()
+        for start, end, p in intervals:
+            self.add(start, end, p)
+
+    def _merge(self, start, end):
+        i = bisect_right(self.segment_starts, start)
+        if i > 0 and self.segments[i - 1][1] >= start:
+            i -= 1
+            start = self.segments[i][0]
+        j = i
+        while j < len(self.segments) and self.segments[j][0] <= end:
+            end = max(end, self.segments[j][1])
+            j += 1
+        self.segments[i:j] = [(start, end)]
+        self.segment_starts[i:j] = [start]
+
+    def gaps(self):
+        return [(self.segments[k][1], self.segments[k + 1][0])
+                for k in range(len(self.segments) - 1)]
+
+    def covers(self, start, end):
+        i = bisect_right(self.segment_starts, start) - 1
+        return i >= 0 and self.segments[i][1] >= end
+
+
+class CoverageIndex(object):
+    """
+    An index of the periods covered by model output files.
+
+    Files are grouped into series by model, variable, MIP table,
+    experiment and ensemble member; the MIP table is included so that,
+    e.g., monthly and daily files of a variable aren't compared. The
+    index is updated one file at a time as files are ingested, and
+    can be saved to and loaded from a JSON file.
+
+    Parameters
+    ----------
+    path : str, optional
+      The path to the JSON file. The index is loaded from it if it
+      exists.
+
+    Attributes
+    ----------
+    path : str or None
+      The path to the JSON file.
+
+    Examples
+    --------
+    >>> from pbs_executor.filenames import parse_model
+    >>> index = CoverageIndex()
+    >>> fields = parse_model('tas_Amon_M_historical_r1i1p1_185001-189912.nc')
+    >>> index.add('a.nc', fields)
+    []
+    >>> fields = parse_model('tas_Amon_M_historical_r1i1p1_195001-200512.nc')
+    >>> index.add('b.nc', fields)
+    []
+    >>> [format_period(*gap) for gap in index.gaps(index.key(fields))]
+    ['1900-01-01 00:00 to 1950-01-01 00:00']
+
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self._series = {}
+        self._files = {}
+        self._lock = threading.Lock()
+        if path is not None and os.path.isfile(path):
+            self.load()
+
+    @staticmethod
+    def key(fields):
+        """
+        Get the series key of a file from its parsed filename fields.
+
+        """
+        return tuple(fields.get(name) for name in key_fields)
+
+    def __len__(self):
+        return len(self._files)
+
+    def add(self, path, fields):
+        """
+        Add a file to the index, replacing any earlier entry for it.
+
+        Parameters
+        ----------
+        path : str
+          The path to the file.
+        fields : dict
+          The fields parsed from the filename, including
+          `temporal_subset`.
+
+        Returns
+        -------
+        list of str or None
+          The paths of the files whose periods overlap this file's, or
+          None if the file has no temporal subset.
+
+        """
+        if not fields.get('temporal_subset'):
+            return None
+        start, end = parse_period(fields['temporal_subset'])
+        key = self.key(fields)
+        with self._lock:
+            self._remove(path)
+            series = self._series.setdefault(key, Series())
+            overlaps = series.overlaps(start, end)
+            series.add(start, end, path)
+            self._files[path] = (key, fields['temporal_subset'])
+        return overlaps
+
+    def remove(self, path):
+        """
+        Remove a file from the index.
+
+        Parameters
+        ----------
+        path : str
+          The path to the file.
+
+        """
+        with self._lock:
+            self._remove(path)
+
+    def _remove(self, path):
+        if path in self._files:
+            key, subset = self._files.pop(path)
+            self._series[key].remove(path)
+
+    def overlaps(self, key, start, end):
+        """
+        Find the files in a series that overlap a time interval.
+
+        Parameters
+        ----------
+        key : tuple
+          The series key; see `key`.
+        start, end : datetime
+          The half-open interval.
+
+        Returns
+        -------
+        list of str
+          The paths of the overlapping files, by start time.
+
+        """
+        with self._lock:
+            series = self._series.get(key)
+            return [] if series is None else series.overlaps(start, end)
+
+    def gaps(self, key):
+        """
+        Find the missing periods between the files of a series.
+
+        Parameters
+        ----------
+        key : tuple
+          The series key; see `key`.
+
+        Returns
+        -------
+        list of tuple
+          The start and end of each gap.
+
+        """
+        with self._lock:
+            series = self._series.get(key)
+            return [] if series is None else series.gaps()
+
+    def covers(self, key, start, end):
+        """
+        Check whether the files of a series cover a time interval.
+
+        Parameters
+        ----------
+        key : tuple
+          The series key; see `key`.
+        start, end : datetime
+          The half-open interval.
+
+        """
+        with self._lock:
+            series = self._series.get(key)
+            return series is not None and series.covers(start, end)
+
+    def save(self):
+        """
+        Save the index to its JSON file.
+
+        """
+        with self._lock:
+            records = [list(key) + [path, subset] for path, (key, subset)
+                       in sorted(self._files.items())]
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as fp:
+            json.dump({'fields': key_fields, 'files': records}, fp)
+        os.rename(tmp, self.path)
+
+    def load(self):
+        """
+        Load the index from its JSON file.
+
+        """
+        with open(self.path, 'r') as fp:
+            data = json.load(fp)
+        for record in data['files']:
+            fields = dict(zip(data['fields'], record))
+            fields['temporal_subset'] = record[-1]
+            self.add(record[-2], fields)
@@ -2,9 +2,12 @@
 output files and benchmark data files in the PBS.
 
 """
-import markdown
+import os
+import time
 
 
+log_file = 'index.html'
+
 header = '''<!DOCTYPE html>
 <html>
 <head>
@@ -38,12 +41,28 @@ class IngestFile(object):
     data : str
       The name of the model (for a model output file) or of the
       variable in the file (for a benchmark dataset).
+    fields : dict
+      The fields parsed from the file during verification; e.g.,
+      `variable_name`.
+    timings : dict
+      Wall time, in seconds, taken by each verification check.
+    target : str or None
+      The path to the file in the PBS data store, once moved.
+    checksum : str or None
+      The hexadecimal checksum of the file, once moved.
+    checksum_type : str or None
+      The type of checksum; e.g., 'sha256'.
 
     """
     def __init__(self, filename=None):
         self.name = filename
         self.is_verified = False
         self.data = None
+        self.fields = {}
+        self.timings = {}
+        self.target = None
+        self.checksum = None
+        self.checksum_type = None
 
 
 class Logger(object):
@@ -54,16 +73,59 @@ class Logger(object):
     ----------
     title : str, optional
       The title of the log file.
+    flush_policy : str, optional
+      When rendered messages are appended to the log file: 'always'
+      (after every message, the default), 'count' (after
+      *flush_count* messages), 'time' (once *flush_interval* seconds
+      have passed since the last flush), or 'close' (only when
+      `flush` or `close` is called).
+    flush_count : int, optional
+      Number of messages to buffer under the 'count' policy.
+    flush_interval : float, optional
+      Seconds between flushes under the 'time' policy.
+    path : str, optional
+      Path to the log file (default is `index.html` in the current
+      directory).
 
     Attributes
     ----------
     data : str
-      The contents of the log.
+      The contents of the log, read back from the log file.
+    path : str
+      Path to the log file.
+
+    Notes
+    -----
+    Messages are rendered once, when they're added, and appended to
+    the log file in front of the HTML footer, so earlier entries are
+    never rewritten. Only the messages not yet flushed are kept in
+    memory. The final log file is the same as the one produced by
+    `write`.
 
     """
-    def __init__(self, title='Summary'):
-        self.data = markdown.markdown('# {}'.format(title))
-        self.write()
+    policies = ['always', 'count', 'time', 'close']
+
+    def __init__(self, title='Summary', flush_policy='always',
+                 flush_count=100, flush_interval=5.0, path=None):
+        if flush_policy not in self.policies:
+            raise ValueError('Unknown flush policy: {}'.format(flush_policy))
+        self.flush_policy = flush_policy
+        self.flush_count = flush_count
+        self.flush_interval = flush_interval
+        self.path = log_file if path is None else path
+        self._buffer = []
+        self._last_flush = time.time()
+        self._title = self.render('# {}'.format(title))
+        self._write(self._title)
+
+    @property
+    def data(self):
+        """The contents of the log."""
+        if not os.path.isfile(self.path):
+            return self._title + ''.join(self._buffer)
+        with open(self.path, 'rb') as fp:
+            contents = fp.read().decode('utf-8')
+        return contents[len(header):-len(footer)] + ''.join(self._buffer)
 
     def add(self, message):
         """
@@ -75,15 +137,68 @@ class Logger(object):
           A message.
 
         """
-        self.data += markdown.markdown(message)
-        self.write()
+        self._buffer.append(self.render(message))
+        if self._is_flush_due():
+            self.flush()
+
+    @staticmethod
+    def render(message):
+        """
+        Convert a Markdown message to HTML.
+
+        Parameters
+        ----------
+        message : str
+          A message.
+
+        """
+        import markdown
+        return markdown.markdown(message)
+
+    def _is_flush_due(self):
+        if self.flush_policy == 'always':
+            return True
+        if self.flush_policy == 'count':
+            return len(self._buffer) >= self.flush_count
+        if self.flush_policy == 'time':
+            return time.time() - self._last_flush >= self.flush_interval
+        return False
+
+    def flush(self):
+        """
+        Append buffered messages to the log file.
+
+        """
+        if len(self._buffer) > 0:
+            if os.path.isfile(self.path):
+                entries = ''.join(self._buffer)
+                with open(self.path, 'rb+') as fp:
+                    fp.seek(-len(footer), os.SEEK_END)
+                    fp.write(entries.encode('utf-8'))
+                    fp.write(footer.encode('utf-8'))
+            else:
+                self.write()
+        self._buffer = []
+        self._last_flush = time.time()
+
+    def close(self):
+        """
+        Flush any buffered messages.
+
+        """
+        self.flush()
 
     def write(self):
         """
-        Write the log file `index.html`.
+        Write the log file.
 
         """
-        with open('index.html', 'w') as fp:
+        self._write(self.data)
+
+    def _write(self, data):
+        with open(self.path, 'w') as fp:
             fp.write(header)
-            fp.write(self.data)
+            fp.write(data)
             fp.write(footer)
+        self._buffer = []
+        self._last_flush = time.time()
@@ -0,0 +1,200 @@
+"""The `filenames` module parses CMIP5 model output and ILAMB benchmark
+data file names without opening the files.
+
+"""
+import os
+import re
+
+
+model_fields = ['variable_name', 'mip_table', 'model_name', 'experiment',
+                'ensemble_member', 'temporal_subset']
+benchmark_fields = ['variable_name', 'resolution']
+
+model_pattern = re.compile(
+    r'^(?P<variable_name>[^_]+)_(?P<mip_table>[^_]+)_(?P<model_name>[^_]+)'
+    r'_(?P<experiment>[^_]+)_(?P<ensemble_member>r\d+i\d+p\d+)'
+    r'(?:_(?P<temporal_subset>(?P<start>\d+)-(?P<end>\d+)(?:-clim)?))?'
+    r'\.nc$')
+benchmark_pattern = re.compile(
+    r'^(?P<variable_name>[^_.]+)'
+    r'(?:_(?P<resolution>\d+(?:\.\d+)?x\d+(?:\.\d+)?))?\.nc$')
+ensemble_pattern = re.compile(r'^r\d+i\d+p\d+$')
+temporal_pattern = re.compile(r'^(?P<start>\d+)-(?P<end>\d+)(?:-clim)?$')
+date_lengths = (4, 6, 8, 10, 12)
+
+
+def is_temporal_subset(start, end):
+    """
+    Check the dates of a CMIP5 temporal subset; e.g., 185001-200512.
+
+    Both dates must have the same precision, from a year (YYYY) to a
+    minute (YYYYMMDDhhmm), and the end can't be before the start.
+
+    Parameters
+    ----------
+    start, end : str
+      The digits of the first and last dates.
+
+    """
+    return (len(start) == len(end) and len(start) in date_lengths and
+            start <= end)
+
+
+def parse_model(filename):
+    """
+    Parse a CMIP5 model output file name.
+
+    Parameters
+    ----------
+    filename : str
+      A file name or path, such as
+      `tas_Amon_HADCM3_historical_r1i1p1_185001-200512.nc`.
+
+    Returns
+    -------
+    dict or None
+      The value of each of `model_fields` (`temporal_subset` is None
+      if absent), or None if the name isn't CMIP5-compatible.
+
+    """
+    m = model_pattern.match(os.path.basename(filename))
+    if m is None:
+        return None
+    if m.group('start') is not None:
+        if not is_temporal_subset(m.group('start'), m.group('end')):
+            return None
+    fields = m.groupdict()
+    del fields['start'], fields['end']
+    return fields
+
+
+def parse_benchmark(filename):
+    """
+    Parse an ILAMB benchmark data file name.
+
+    Parameters
+    ----------
+    filename : str
+      A file name or path, such as `swe.nc` or `tas_0.5x0.5.nc`.
+
+    Returns
+    -------
+    dict or None
+      The value of each of `benchmark_fields` (`resolution` is None
+      for point data), or None if the name isn't ILAMB-compatible.
+
+    """
+    m = benchmark_pattern.match(os.path.basename(filename))
+    if m is None:
+        return None
+    return m.groupdict()
+
+
+def explain_model(filename):
+    """
+    Describe why a name isn't a CMIP5-compatible file name.
+
+    Parameters
+    ----------
+    filename : str
+      A file name or path.
+
+    Returns
+    -------
+    str or None
+      A human-readable message, or None if the name is valid.
+
+    """
+    if parse_model(filename) is not None:
+        return None
+    base, ext = os.path.splitext(os.path.basename(filename))
+    parts = base.split('_')
+    if ext != '.nc':
+        return 'File extension must be .nc, not {!r}'.format(ext)
+    if len(parts) < 5 or len(parts) > 6:
+        return 'Expected 5 or 6 fields separated by "_", found {}'.format(
+            len(parts))
+    if not all(parts):
+        return 'Empty field in file name'
+    if ensemble_pattern.match(parts[4]) is None:
+        return 'Ensemble member {!r} does not match r<N>i<M>p<L>'.format(
+            parts[4])
+    if len(parts) == 6:
+        m = temporal_pattern.match(parts[5])
+        if (m is None or
+                not is_temporal_subset(m.group('start'), m.group('end'))):
+            return 'Temporal subset {!r} is not valid'.format(parts[5])
+    return 'File name is not CMIP5-compatible'
+
+
+def parse_many(filenames, kind='model'):
+    """
+    Parse many file names.
+
+    Parameters
+    ----------
+    filenames : iterable of str
+      File names or paths.
+    kind : str, optional
+      'model' for CMIP5 model output or 'benchmark' for ILAMB
+      benchmark data (default is 'model').
+
+    Returns
+    -------
+    list
+      The fields parsed from each name, or None for names that don't
+      parse, in the order of *filenames*.
+
+    """
+    if kind == 'model':
+        pattern, fields = model_pattern, model_fields
+    elif kind == 'benchmark':
+        pattern, fields = benchmark_pattern, benchmark_fields
+    else:
+        raise ValueError('Unknown kind: {}'.format(kind))
+    match = pattern.match
+    basename = os.path.basename
+    results = []
+    for filename in filenames:
+        m = match(basename(filename))
+        if m is None:
+            results.append(None)
+        elif kind == 'model' and m.group('start') is not None and \
+                not is_temporal_subset(m.group('start'), m.group('end')):
+            results.append(None)
+        else:
+            results.append(dict(zip(fields, m.group(*fields))))
+    return results
+
+
+def classify(filenames):
+    """
+    Sort file names into model output, benchmark data and invalid names.
+
+    A name that is both a valid CMIP5 and a valid ILAMB name is
+    classified as model output.
+
+    Parameters
+    ----------
+    filenames : iterable of str
+      File names or paths.
+
+    Returns
+    -------
+    dict
+      Lists of the names under the keys 'model', 'benchmark' and
+      'invalid', in the order of *filenames*.
+
+    """
+    filenames = list(filenames)
+    groups = {'model': [], 'benchmark': [], 'invalid': []}
+    models = parse_many(filenames, kind='model')
+    benchmarks = parse_many(filenames, kind='benchmark')
+    for filename, model, benchmark in zip(filenames, models, benchmarks):
+        if model is not None:
+            groups['model'].append(filename)
+        elif benchmark is not None:
+            groups['benchmark'].append(filename)
+        else:
+            groups['invalid'].append(filename)
+    return groups
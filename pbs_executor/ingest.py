@@ -4,11 +4,18 @@ PBS.
 """
 import os
 import shutil
-import yaml
+import threading
 from .file import IngestFile, Logger
 from .verify import (ModelVerificationTool, BenchmarkVerificationTool,
                      VerificationError)
-from .utils import makedirs
+from .links import Linker, find_files, list_dir
+from .journal import file_identity
+from .metrics import Metrics, load_hook
+from .pipeline import Pipeline
+from .placement import Placement, place_file
+from .sources import FileStream, is_expandable
+from .store import BlobStore
+from .utils import DirectoryCache, batches
 
 
 file_exists = '''## File Exists\n
@@ -23,6 +30,62 @@ The file has not been updated.
 file_moved = '''## File Moved\n
 The file `{}` has been moved to `{}` in the PBS data store.
 '''
+file_unchanged = '''## File Unchanged\n
+The file `{}` is identical to `{}` in the PBS data store.
+'''
+file_resumed = '''## File Move Resumed\n
+The file `{}` had been moved to `{}` in the PBS data store before the
+ingest was interrupted.
+'''
+file_lost = '''## File Lost\n
+The file `{}` was being moved to `{}` when the ingest was interrupted,
+and neither copy can be found.
+'''
+file_placed = '''
+Placed by `{}`: {} bytes in {:.3f} s ({:.1f} MB/s).
+'''
+file_checksum = '''
+Checksum (`{}`): `{}`
+'''
+coverage_overlap = '''
+The period `{}` overlaps the files {} in the PBS data store.
+'''
+coverage_invalid = '''
+The period `{}` is not a valid date range.
+'''
+coverage_gaps = '''## Coverage Gaps\n
+The files of `{}` don't cover these periods:\n
+{}
+'''
+region_summary = '''
+Regional means of `{}`:\n
+{}'''
+region_error = '''
+Warning: the regional means of `{}` could not be computed. Error
+message:\n
+    {}
+'''
+link_failed = '''## Link Failed\n
+The file `{}` could not be linked as `{}`. Error message:\n
+    {}
+'''
+links_rebuilt = '''## Links Rebuilt\n
+{} links to {} files in `{}` were created or updated, and {} stale
+links were removed.
+'''
+file_transformed = '''## File Transformed\n
+The file `{}` has been rewritten as compressed NETCDF4_CLASSIC:
+{} bytes to {} bytes ({:.1%} smaller) in {:.3f} s.
+'''
+file_not_transformed = '''## File Not Transformed\n
+The file `{}` could not be rewritten as NETCDF4_CLASSIC, and will be
+ingested unchanged. Error message:\n
+    {}
+'''
+ingest_resumed = '''## Ingest Resumed\n
+{} files had finished, {} were verified but not moved, {} were being
+moved, {} were moved but not linked, and {} had not been started.
+'''
 file_not_verified = '''## File Verification Error\n
 The file `{}` cannot be ingested into the PBS data store.
 Error message:\n
@@ -30,6 +93,38 @@ Error message:\n
 '''
 
 
+def verify_file(args):
+    """
+    Verify a single file.
+
+    This is a module-level function so that it can be sent to a
+    process pool.
+
+    Parameters
+    ----------
+    args : tuple
+      A VerificationTool subclass, the name of the file to verify and
+      whether to run the deep checks.
+
+    Returns
+    -------
+    dict
+      The fields parsed by the tool, an error message (None if the
+      file is verified), and the timings of the checks that were run.
+
+    """
+    tool, filename, deep = args
+    v = tool(IngestFile(filename), deep=deep)
+    result = {'error': None}
+    try:
+        v.verify()
+    except VerificationError as e:
+        result['error'] = e.msg
+    result['fields'] = v.fields()
+    result['timings'] = dict(v.timings)
+    return result
+
+
 class IngestTool(object):
     """
     Toolbase for ingesting files into the PBS.
@@ -52,15 +147,120 @@ class IngestTool(object):
     source_name : str
       A name under which uploaded files can be grouped. Required for 
       grouping uploaded benchmark datasets.
-    ingest_files : list
-      List of files to ingest.
+    ingest_files : list or FileStream
+      The files to ingest. In the configuration file, an entry may be
+      a file, a glob pattern, a directory or '@'
+      followed by the path to a manifest file with one entry per line;
+      if any entry is more than a file, the files are found lazily, as
+      a FileStream, as `ingest` consumes them.
+    ingest_batch_size : int
+      Number of files verified and moved together by `ingest`, which
+      bounds the memory it uses (default is 1000).
     make_public : bool
       Set to True to allow others to see and use ingested files.
     overwrite_files : bool
       Set to True to allow users to overwrite uploaded files. Only an
       administrator can overwrite files distributed with ILAMB.
+    deep_verify : bool
+      Set to True to also check the contents of each file: units,
+      coordinate monotonicity, fill and NaN fractions and value
+      ranges (default is False).
+    verify_cache : bool
+      Set to True to reuse the results of verifying files that
+      haven't changed since an earlier run (default is False).
+    verify_cache_file : str
+      Path relative to ILAMB_ROOT of the verification cache database
+      (default is '.pbs_verify_cache.sqlite').
+    verify_cache_size : int
+      Maximum number of results kept in the verification cache
+      (default is 100000).
+    jobs : int
+      Number of workers used to verify files (default is 1).
+    pool_type : str
+      Type of worker pool used when *jobs* > 1; either 'thread' or
+      'process' (default is 'thread').
+    placement : str
+      How files are placed in the data store: 'auto', 'rename',
+      'hardlink', 'reflink' or 'copy' (default is 'auto').
+    dedup : bool
+      Set to True to keep one copy of identical files in a
+      content-addressed store (default is False).
+    store_dir : str
+      Directory relative to ILAMB_ROOT that holds the
+      content-addressed store (default is '.pbs_store').
+    checksum : str or None
+      Hash algorithm used to compute a checksum of each moved file;
+      e.g., 'sha256' (default is None, for no checksum).
+    checksum_jobs : int
+      Number of threads used to hash a file that is renamed or linked
+      rather than copied (default is 1).
+    catalog : bool
+      Set to True to record ingested files in a SQLite catalog and to
+      check for existing files against it (default is False).
+    catalog_file : str
+      Path relative to ILAMB_ROOT of the catalog database (default is
+      '.pbs_catalog.sqlite').
+    coverage : bool
+      Set to True to index the periods covered by ingested files, and
+      to report overlapping and missing periods (default is False).
+    coverage_file : str
+      Path relative to ILAMB_ROOT of the coverage index (default is
+      '.pbs_coverage.json').
+    regions : bool
+      Set to True to log the area-weighted mean of each gridded file
+      over each region (default is False).
+    regions_file : str or None
+      Path to an ILAMB region file (default is None, for the regions
+      in `data/tropics.txt`).
+    transform : bool
+      Set to True to rewrite verified netCDF3 files as compressed,
+      chunked NETCDF4_CLASSIC files before they're moved (default is
+      False).
+    transform_complevel : int
+      The zlib compression level used by `transform` (default is 4).
+    transform_chunk_bytes : int
+      The target size of a chunk, in bytes, used by `transform`
+      (default is 1 MiB).
+    transform_memory : int
+      The target amount of data, in bytes, held in memory while a
+      file is rewritten (default is 64 MiB).
+    journal : bool
+      Set to True to record each file's progress through the ingest
+      in a journal, so that an interrupted ingest can be finished with
+      `resume` (default is False). Each `ingest` starts a new journal.
+    journal_file : str
+      Path relative to ILAMB_ROOT of the journal (default is
+      '.pbs_journal.jsonl').
+    journal_sync : bool
+      Set to True to fsync the journal after each record (default is
+      True).
+    pipeline : bool
+      Set to True to run `ingest` as concurrent verify, transform,
+      place and link stages (default is False).
+    pipeline_jobs : dict
+      Number of worker threads for each pipeline stage; e.g.,
+      ``{'verify': 2, 'transform': 1, 'place': 2, 'link': 1}``.
+    pipeline_queue_size : int
+      Maximum number of files waiting between pipeline stages
+      (default is 16).
+    metrics : Metrics
+      Timings, bytes and counts for each stage and file. Set the
+      `metrics_file` configuration key to write them as JSON lines,
+      and `metrics_hooks` to a list of 'module:function' names to
+      forward them.
+
+    Notes
+    -----
+    The optional configuration keys `log_flush`, `log_flush_count`
+    and `log_flush_interval` set the flush policy of the Logger.
 
     """
+    kind = None
+    verification_tool = None
+    data_field = None
+    append_source_name = False
+    store_depth = 1
+
     def __init__(self, ingest_file=None):
         self.ilamb_root = ''
         self.dest_dir = ''
@@ -68,8 +268,47 @@ class IngestTool(object):
         self.project_name = ''
         self.source_name = ''
         self.ingest_files = []
+        self._expanded = None
+        self.ingest_batch_size = 1000
         self.make_public = True
         self.overwrite_files = False
+        self.deep_verify = False
+        self.verify_cache = False
+        self.verify_cache_file = '.pbs_verify_cache.sqlite'
+        self.verify_cache_size = 100000
+        self._verify_cache = None
+        self._init_lock = threading.RLock()
+        self.jobs = 1
+        self.pool_type = 'thread'
+        self.placement = 'auto'
+        self.dedup = False
+        self.store_dir = '.pbs_store'
+        self.checksum = None
+        self.checksum_jobs = 1
+        self.catalog = False
+        self.catalog_file = '.pbs_catalog.sqlite'
+        self._catalog = None
+        self.coverage = False
+        self.coverage_file = '.pbs_coverage.json'
+        self._coverage = None
+        self._coverage_keys = set()
+        self.regions = False
+        self.regions_file = None
+        self._region_masks = None
+        self.transform = False
+        self.transform_complevel = 4
+        self.transform_chunk_bytes = 2**20
+        self.transform_memory = 64 * 2**20
+        self.journal = False
+        self.journal_file = '.pbs_journal.jsonl'
+        self.journal_sync = True
+        self._journal = None
+        self.pipeline = False
+        self.pipeline_jobs = {}
+        self.pipeline_queue_size = 16
+        self.metrics = Metrics()
+        self._dirs = DirectoryCache()
+        self._linker = Linker(dirs=self._dirs)
 
     def load(self, ingest_file):
         """
@@ -81,6 +320,7 @@ class IngestTool(object):
           Path to the configuration file.
 
         """
+        import yaml
         with open(ingest_file, 'r') as fp:
             cfg = yaml.safe_load(fp)
         self.ilamb_root = cfg['ilamb_root']
@@ -88,11 +328,996 @@ class IngestTool(object):
         self.link_dir = cfg['link_dir']
         self.project_name = cfg['project_name']
         self.source_name = cfg['source_name']
-        for f in cfg['ingest_files']:
-            self.ingest_files.append(IngestFile(f))
+        sources = cfg['ingest_files']
+        if any(source and (is_expandable(source) or os.path.isdir(source))
+               for source in sources):
+            self.ingest_files = FileStream(sources)
+        else:
+            for f in sources:
+                self.ingest_files.append(IngestFile(f))
+        self.ingest_batch_size = cfg.get('ingest_batch_size',
+                                         self.ingest_batch_size)
         self.make_public = cfg['make_public']
         self.overwrite_files = cfg['overwrite_files']
+        self.deep_verify = cfg.get('deep_verify', self.deep_verify)
+        self.verify_cache = cfg.get('verify_cache', self.verify_cache)
+        self.verify_cache_file = cfg.get('verify_cache_file',
+                                         self.verify_cache_file)
+        self.verify_cache_size = cfg.get('verify_cache_size',
+                                         self.verify_cache_size)
+        self.jobs = cfg.get('jobs', self.jobs)
+        self.pool_type = cfg.get('pool_type', self.pool_type)
+        self.placement = cfg.get('placement', self.placement)
+        self.dedup = cfg.get('dedup', self.dedup)
+        self.store_dir = cfg.get('store_dir', self.store_dir)
+        self.checksum = cfg.get('checksum', self.checksum)
+        self.checksum_jobs = cfg.get('checksum_jobs', self.checksum_jobs)
+        self.catalog = cfg.get('catalog', self.catalog)
+        self.catalog_file = cfg.get('catalog_file', self.catalog_file)
+        self.coverage = cfg.get('coverage', self.coverage)
+        self.coverage_file = cfg.get('coverage_file', self.coverage_file)
+        self.regions = cfg.get('regions', self.regions)
+        self.regions_file = cfg.get('regions_file', self.regions_file)
+        self.transform = cfg.get('transform', self.transform)
+        self.transform_complevel = cfg.get('transform_complevel',
+                                           self.transform_complevel)
+        self.transform_chunk_bytes = cfg.get('transform_chunk_bytes',
+                                             self.transform_chunk_bytes)
+        self.transform_memory = cfg.get('transform_memory',
+                                        self.transform_memory)
+        self.journal = cfg.get('journal', self.journal)
+        self.journal_file = cfg.get('journal_file', self.journal_file)
+        self.journal_sync = cfg.get('journal_sync', self.journal_sync)
+        self.pipeline = cfg.get('pipeline', self.pipeline)
+        self.pipeline_jobs = cfg.get('pipeline_jobs', self.pipeline_jobs)
+        self.pipeline_queue_size = cfg.get('pipeline_queue_size',
+                                           self.pipeline_queue_size)
+        self.metrics.path = cfg.get('metrics_file', self.metrics.path)
+        for name in cfg.get('metrics_hooks', []):
+            self.metrics.add_hook(load_hook(name))
+        self.log.flush_policy = cfg.get('log_flush', self.log.flush_policy)
+        self.log.flush_count = cfg.get('log_flush_count',
+                                       self.log.flush_count)
+        self.log.flush_interval = cfg.get('log_flush_interval',
+                                          self.log.flush_interval)
+
+    def map(self, func, iterable):
+        """
+        Apply a function to each item, in order, using a worker pool.
+
+        Parameters
+        ----------
+        func : callable
+          A function of one argument. It must be defined at module
+          level when *pool_type* is 'process'.
+        iterable : iterable
+          The items to process.
+
+        Returns
+        -------
+        generator
+          The results of *func*, in the order of *iterable*.
+
+        """
+        if self.jobs <= 1:
+            for item in iterable:
+                yield func(item)
+            return
+        if self.pool_type == 'process':
+            from multiprocessing import Pool
+            pool = Pool(self.jobs)
+        elif self.pool_type == 'thread':
+            from multiprocessing.pool import ThreadPool
+            pool = ThreadPool(self.jobs)
+        else:
+            raise ValueError('Unknown pool type: {}'.format(self.pool_type))
+        try:
+            for result in pool.imap(func, iterable):
+                yield result
+        finally:
+            pool.close()
+            pool.join()
+
+    def default_files(self):
+        """
+        Get the files that `verify`, `transform_files` and `move` use.
+
+        If `ingest_files` is a FileStream, it's expanded once and the
+        same IngestFile objects are returned until it's replaced, so
+        the files verified by `verify` are the ones placed by `move`.
+        `ingest` doesn't use this; it reads the stream in batches.
+
+        Returns
+        -------
+        list of IngestFile
+          The ingest files.
+
+        """
+        if isinstance(self.ingest_files, list):
+            return self.ingest_files
+        if self._expanded is None or self._expanded[0] is not \
+                self.ingest_files:
+            self._expanded = (self.ingest_files, list(self.ingest_files))
+        return self._expanded[1]
+
+    def verify(self, files=None):
+        """
+        Verify ingest files with the tool's verification tool.
+
+        Files that fail verification are removed. Log entries are
+        written in the order of the files. Files with bad names are
+        rejected before any are opened, and if `verify_cache` is set,
+        files with a cached result aren't opened.
+
+        Parameters
+        ----------
+        files : list of IngestFile, optional
+          The files to verify (default is `ingest_files`).
+
+        """
+        if files is None:
+            files = self.default_files()
+        files = list(files)
+        results = [self.cached_verification(f) for f in files]
+        errors = self.verification_tool.check_filenames(
+            [f.name for f in files])
+        for i, error in enumerate(errors):
+            if results[i] is None and error is not None:
+                results[i] = {'error': VerificationError(error).msg,
+                              'fields': {}, 'timings': {}}
+        todo = [i for i, result in enumerate(results) if result is None]
+        args = [(self.verification_tool, files[i].name,
+                 self.deep_verify) for i in todo]
+        for i, result in zip(todo, self.map(verify_file, args)):
+            results[i] = result
+        if self.verify_cache and len(todo) > 0:
+            rules = self.verification_tool.rules(self.deep_verify)
+            self.get_verify_cache().put_many(
+                [(files[i].name, rules, results[i])
+                 for i in todo])
+        for f, result in zip(files, results):
+            msg = self.record_verification(f, result)
+            if msg is not None:
+                self.log_message(msg)
+        self.log.flush()
+
+    def log_message(self, message):
+        """
+        Add a message to the log and record the time it takes.
+
+        Parameters
+        ----------
+        message : str
+          A Markdown message.
+
+        """
+        with self.metrics.timer('log'):
+            self.log.add(message)
+
+    def verify_file(self, ingest_file):
+        """
+        Verify a single ingest file.
+
+        Parameters
+        ----------
+        ingest_file : IngestFile
+          The file to verify.
+
+        Returns
+        -------
+        str or None
+          A log message if the file failed verification, else None.
+
+        """
+        result = self.cached_verification(ingest_file)
+        if result is None:
+            result = verify_file((self.verification_tool, ingest_file.name,
+                                  self.deep_verify))
+            if self.verify_cache:
+                self.get_verify_cache().put(
+                    ingest_file.name,
+                    self.verification_tool.rules(self.deep_verify), result)
+        return self.record_verification(ingest_file, result)
+
+    def cached_verification(self, ingest_file):
+        """
+        Get the cached result of verifying a file.
+
+        Parameters
+        ----------
+        ingest_file : IngestFile
+          The file to verify.
+
+        Returns
+        -------
+        dict or None
+          The result, with empty timings, or None if `verify_cache` is
+          not set or the file has no valid cached result.
+
+        """
+        if not self.verify_cache:
+            return None
+        result = self.get_verify_cache().get(
+            ingest_file.name, self.verification_tool.rules(self.deep_verify))
+        if result is not None:
+            result['timings'] = {}
+        return result
+
+    def get_verify_cache(self):
+        """
+        Get the verification cache, opening it if needed.
+
+        Returns
+        -------
+        VerificationCache
+          The cache at `verify_cache_file` under `ilamb_root`.
+
+        """
+        with self._init_lock:
+            if self._verify_cache is None:
+                from .cache import VerificationCache
+                self._verify_cache = VerificationCache(
+                    os.path.join(self.ilamb_root, self.verify_cache_file),
+                    max_entries=self.verify_cache_size)
+        return self._verify_cache
+
+    def record_verification(self, ingest_file, result):
+        """
+        Store the result of verifying a file.
+
+        A file that fails verification is removed; a directory never is.
+
+        Parameters
+        ----------
+        ingest_file : IngestFile
+          The file that was verified.
+        result : dict
+          The result returned by `verify_file`.
+
+        Returns
+        -------
+        str or None
+          A log message if the file failed verification, else None.
+
+        """
+        f = ingest_file
+        f.timings = result['timings']
+        f.fields = result['fields']
+        self.metrics.record('verify', sum(f.timings.values()), file=f.name,
+                            checks=f.timings)
+        if result['error'] is not None:
+            self.journal_record(f, 'rejected', error=result['error'])
+            if os.path.isfile(f.name):
+                os.remove(f.name)
+            return file_not_verified.format(f.name, result['error'])
+        f.data = f.fields[self.data_field]
+        f.is_verified = True
+        self.journal_record(f, 'verified', fields=f.fields, data=f.data)
+
+    def ingest(self):
+        """
+        Verify ingest files and move them to the PBS data store.
+
+        The files are verified, transformed if `transform` is set, and
+        then moved, `ingest_batch_size` files at a time, unless
+        `pipeline` is set, in which case the steps run concurrently.
+        Either way, `ingest_files` is read as a stream.
+
+        """
+        self.run_stages()
+        self.log.add(self.metrics.summary())
+        self.log.flush()
+
+    def run_stages(self):
+        """
+        Verify, transform and move the ingest files, without a summary.
+
+        If `journal` is set, the journal of any earlier ingest is
+        cleared first.
+
+        """
+        if self.journal:
+            self.get_journal().clear()
+        if self.pipeline:
+            Pipeline(self, jobs=self.pipeline_jobs,
+                     queue_size=self.pipeline_queue_size).run()
+            self.save_coverage()
+        else:
+            for files in batches(self.ingest_files, self.ingest_batch_size):
+                self.verify(files)
+                if self.transform:
+                    self.transform_files(files)
+                self.place_files(files)
+            self.save_coverage()
+            self.log.flush()
+
+    def transform_files(self, files=None):
+        """
+        Rewrite verified netCDF3 ingest files as NETCDF4_CLASSIC.
+
+        Parameters
+        ----------
+        files : list of IngestFile, optional
+          The files to transform (default is `ingest_files`).
+
+        """
+        if files is None:
+            files = self.default_files()
+        for f in files:
+            msg = self.transform_file(f)
+            if msg is not None:
+                self.log_message(msg)
+        self.log.flush()
+
+    def transform_file(self, ingest_file):
+        """
+        Rewrite a verified netCDF3 file as compressed NETCDF4_CLASSIC.
+
+        The file is replaced only once the new file is complete. Files
+        that aren't verified or aren't netCDF3 are left alone.
+
+        Parameters
+        ----------
+        ingest_file : IngestFile
+          A verified file.
+
+        Returns
+        -------
+        str or None
+          A log message, or None if the file wasn't rewritten.
+
+        """
+        from .transform import transform_in_place
+        f = ingest_file
+        if not f.is_verified:
+            return None
+        try:
+            t = transform_in_place(f.name,
+                                   complevel=self.transform_complevel,
+                                   chunk_bytes=self.transform_chunk_bytes,
+                                   max_memory=self.transform_memory)
+        except (IOError, OSError, RuntimeError, ValueError) as e:
+            return file_not_transformed.format(f.name, e)
+        if t is None:
+            return None
+        self.journal_record(f, 'verified')
+        self.metrics.record('transform', t.seconds, nbytes=t.in_bytes,
+                            file=f.name, out_bytes=t.out_bytes)
+        return file_transformed.format(f.name, t.in_bytes, t.out_bytes,
+                                       t.reduction, t.seconds)
+
+    def get_journal(self):
+        """
+        Get the ingest journal, opening it if needed.
 
+        Returns
+        -------
+        Journal
+          The journal at `journal_file` under `ilamb_root`.
+
+        """
+        with self._init_lock:
+            if self._journal is None:
+                from .journal import Journal
+                self._journal = Journal(os.path.join(self.ilamb_root,
+                                                     self.journal_file),
+                                        sync=self.journal_sync)
+        return self._journal
+
+    def journal_record(self, ingest_file, stage, **values):
+        """
+        Record a stage transition of a file, if `journal` is set.
+
+        Parameters
+        ----------
+        ingest_file : IngestFile
+          The file.
+        stage : str
+          The stage reached; see `journal.stages`.
+        **values
+          Other values to record; e.g., `target`.
+
+        Notes
+        -----
+        The identity of the upload (see `journal.file_identity`) is
+        recorded with the 'verified' and 'rejected' stages, so that
+        `resume` can tell a new upload from the one journaled.
+
+        """
+        if self.journal:
+            if stage in ['verified', 'rejected']:
+                values.setdefault('upload', file_identity(ingest_file.name))
+            self.get_journal().record(ingest_file.name, stage, **values)
+
+    def resume(self):
+        """
+        Finish an interrupted ingest of the ingest files.
+
+        The journal is replayed to find how far each file got. Files
+        that finished, or were rejected, are skipped without being
+        touched; files that were verified are moved and linked
+        without being verified again; moves that were cut off are
+        completed, or redone if the file never reached the data
+        store; and files that were moved are linked. Files not in the
+        journal, and uploads whose size, modification time or inode
+        differ from those journaled, are ingested from the start.
+
+        """
+        from .journal import final_stages
+        journal = self.get_journal()
+        state = journal.state()
+        finished, todo, to_place, to_finish, to_link = 0, [], [], [], []
+        for f in self.ingest_files:
+            rec = state.get(os.path.abspath(f.name))
+            if rec is None or self.is_new_upload(f, rec):
+                todo.append(f)
+                continue
+            if rec['stage'] in final_stages:
+                finished += 1
+                continue
+            f.fields = rec.get('fields', {})
+            f.data = rec.get('data')
+            f.is_verified = True
+            if rec['stage'] == 'verified':
+                to_place.append(f)
+            elif rec['stage'] == 'placed':
+                f.target = rec['target']
+                to_link.append(f)
+            else:
+                to_finish.append((f, rec['target'],
+                                  rec.get('replaces', False)))
+        self.log_message(ingest_resumed.format(finished, len(to_place),
+                                               len(to_finish), len(to_link),
+                                               len(todo)))
+        for f, target, replaces in to_finish:
+            msg = self.finish_move(f, target, to_place, replaces=replaces)
+            if msg:
+                self.log_message(msg)
+        msg = self.link_files(to_link + [f for f, target, replaces
+                                         in to_finish
+                                         if f.target is not None])
+        if msg:
+            self.log_message(msg)
+        self.verify(todo)
+        to_place += [f for f in todo if f.is_verified]
+        if self.transform:
+            self.transform_files(to_place)
+        self.move(to_place)
+        self.log.add(self.metrics.summary())
+        self.log.flush()
+        journal.compact()
+
+    def is_new_upload(self, ingest_file, record):
+        """
+        Check whether a file was uploaded after it was journaled.
+
+        Parameters
+        ----------
+        ingest_file : IngestFile
+          An ingest file.
+        record : dict
+          The file's state in the journal.
+
+        Returns
+        -------
+        bool
+          True if the upload exists and its identity differs from the
+          journaled one.
+
+        """
+        upload = record.get('upload')
+        if upload is None:
+            return False
+        current = file_identity(ingest_file.name)
+        return current is not None and current != upload
+
+    def finish_move(self, ingest_file, target, to_place, replaces=False):
+        """
+        Complete a move that was cut off by an interruption.
+
+        Parameters
+        ----------
+        ingest_file : IngestFile
+          A verified file that was being moved.
+        target : str
+          The path it was being moved to.
+        to_place : list of IngestFile
+          The files still to be moved, to which the file is added if
+          it never reached the data store.
+        replaces : bool, optional
+          Set to True if a file was already at *target* when the move
+          started, in which case a file there doesn't show that the
+          move finished unless the upload is gone (default is False).
+
+        Returns
+        -------
+        str
+          A log message, or an empty string if the file will be moved
+          again.
+
+        """
+        f = ingest_file
+        head, tail = os.path.split(target)
+        prefix = '.{}.'.format(tail)
+        if os.path.isdir(head):
+            for name, p, is_dir in list_dir(head):
+                if name.startswith(prefix) and name.endswith('.tmp'):
+                    os.remove(p)
+        moved = not (replaces and os.path.exists(f.name))
+        if os.path.exists(target) and moved:
+            p = Placement('resumed', os.path.getsize(target), 0.0)
+            return self.finish_placement(f, target, p)
+        if os.path.exists(f.name):
+            to_place.append(f)
+            return ''
+        self.journal_record(f, 'failed', error='lost')
+        return file_lost.format(f.name, target)
+
+    def get_catalog(self):
+        """
+        Get the catalog of the PBS data store, opening it if needed.
+
+        Returns
+        -------
+        Catalog
+          The catalog at `catalog_file` under `ilamb_root`.
+
+        """
+        with self._init_lock:
+            if self._catalog is None:
+                from .catalog import Catalog
+                self._catalog = Catalog(os.path.join(self.ilamb_root,
+                                                     self.catalog_file))
+        return self._catalog
+
+    def get_coverage(self):
+        """
+        Get the coverage index of the PBS data store, loading it if needed.
+
+        Returns
+        -------
+        CoverageIndex
+          The index at `coverage_file` under `ilamb_root`.
+
+        """
+        with self._init_lock:
+            if self._coverage is None:
+                from .coverage import CoverageIndex
+                self._coverage = CoverageIndex(
+                    os.path.join(self.ilamb_root, self.coverage_file))
+        return self._coverage
+
+    def add_to_coverage(self, ingest_file):
+        """
+        Record the period covered by a placed file.
+
+        Parameters
+        ----------
+        ingest_file : IngestFile
+          A file that has been placed in the data store.
+
+        Returns
+        -------
+        str
+          A log message about overlapping or invalid periods, or an
+          empty string.
+
+        """
+        f = ingest_file
+        fields = dict(f.fields)
+        subset = fields.get('temporal_subset')
+        if not subset:
+            return ''
+        index = self.get_coverage()
+        try:
+            overlaps = index.add(f.target, fields)
+        except ValueError:
+            return coverage_invalid.format(subset)
+        self._coverage_keys.add(index.key(fields))
+        if overlaps:
+            return coverage_overlap.format(subset, ', '.join(
+                '`{}`'.format(os.path.basename(p)) for p in overlaps))
+        return ''
+
+    def get_region_masks(self):
+        """
+        Get the region mask engine, loading the regions if needed.
+
+        Returns
+        -------
+        RegionMasks
+          Masks for the regions in `regions_file`.
+
+        """
+        with self._init_lock:
+            if self._region_masks is None:
+                from .regions import RegionMasks, load_regions
+                regions = None
+                if self.regions_file is not None:
+                    regions = load_regions(self.regions_file)
+                self._region_masks = RegionMasks(regions)
+        return self._region_masks
+
+    def summarize_regions(self, ingest_file):
+        """
+        Describe the regional means of a placed file's variable.
+
+        Parameters
+        ----------
+        ingest_file : IngestFile
+          A file that has been placed in the data store.
+
+        Returns
+        -------
+        str
+          A log message, or an empty string if the file's variable
+          isn't on a latitude-longitude grid. The file has already been
+          placed, so a failure to read it is reported as a warning.
+
+        """
+        from .regions import summarize_file
+        name = ingest_file.fields.get('variable_name')
+        try:
+            means = summarize_file(ingest_file.target, name,
+                                   self.get_region_masks())
+        except (IOError, OSError, RuntimeError, ValueError, IndexError,
+                KeyError) as e:
+            return region_error.format(name, e)
+        if means is None:
+            return ''
+        table = ''.join('    {:<12s} {:>14.6g}\n'.format(label, mean)
+                        for label, mean in means.items())
+        return region_summary.format(name, table)
+
+    def save_coverage(self):
+        """
+        Save the coverage index and log the gaps in the updated series.
+
+        """
+        if self._coverage is None:
+            return
+        from .coverage import format_period
+        for key in sorted(self._coverage_keys):
+            gaps = self._coverage.gaps(key)
+            if gaps:
+                periods = ''.join('* {}\n'.format(format_period(*gap))
+                                  for gap in gaps)
+                self.log_message(coverage_gaps.format(
+                    '_'.join(str(k) for k in key), periods))
+        self._coverage_keys = set()
+        self._coverage.save()
+
+    def target_dir(self, ingest_file):
+        """
+        Get the directory where a verified file is stored.
+
+        Parameters
+        ----------
+        ingest_file : IngestFile
+          A verified file.
+
+        """
+        raise NotImplementedError('target_dir')
+
+    def move(self, files=None):
+        """
+        Move verified ingest files to the PBS data store.
+
+        The files are placed one by one and then linked as a batch.
+
+        Parameters
+        ----------
+        files : list of IngestFile, optional
+          The files to move (default is `ingest_files`).
+
+        """
+        if files is None:
+            files = self.default_files()
+        self.place_files(files)
+        self.save_coverage()
+        self.log.flush()
+
+    def place_files(self, files):
+        """
+        Place verified files in the PBS data store and link them.
+
+        The files are placed one by one and then linked as a batch,
+        and a log message is written for each.
+
+        Parameters
+        ----------
+        files : list of IngestFile
+          The files to place. Files that aren't verified are skipped.
+
+        """
+        files = [f for f in files if f.is_verified]
+        for f in files:
+            self.log_message(self.place(f))
+        msg = self.link_files(files)
+        if msg is not None:
+            self.log_message(msg)
+
+    def place(self, ingest_file):
+        """
+        Place a verified file in the PBS data store.
+
+        On success, `IngestFile.target` is set to the file's new path.
+
+        Parameters
+        ----------
+        ingest_file : IngestFile
+          A verified file.
+
+        Returns
+        -------
+        str
+          A log message.
+
+        """
+        f = ingest_file
+        filename = os.path.basename(f.name)
+        target_dir = self.target_dir(f)
+        target = os.path.join(target_dir, filename)
+        try:
+            if (self.catalog and not self.overwrite_files and
+                    self.get_catalog().contains(target)):
+                raise shutil.Error(
+                    "Destination path '{}' already exists".format(target))
+            if self.journal:
+                self.journal_record(f, 'placing', target=target,
+                                    replaces=os.path.lexists(target))
+            with self.metrics.timer('makedirs', file=f.name):
+                self._dirs.ensure(target_dir)
+            if self.dedup:
+                store = BlobStore(os.path.join(self.ilamb_root,
+                                               self.store_dir),
+                                  dirs=self._dirs)
+                p = store.add(f.name, target, strategy=self.placement,
+                              overwrite=self.overwrite_files)
+            else:
+                p = place_file(f.name, target, strategy=self.placement,
+                               overwrite=self.overwrite_files,
+                               checksum=self.checksum,
+                               checksum_jobs=self.checksum_jobs)
+        except shutil.Error:
+            msg = file_exists.format(filename, target_dir)
+            self.journal_record(f, 'failed', error='exists')
+            if os.path.exists(f.name):
+                os.remove(f.name)
+        except IOError:
+            msg = file_protected.format(target)
+            self.journal_record(f, 'failed', error='protected')
+            if os.path.exists(f.name):
+                os.remove(f.name)
+        else:
+            msg = self.finish_placement(f, target, p)
+        return msg
+
+    def finish_placement(self, ingest_file, target, placement):
+        """
+        Record a file that has been placed in the PBS data store.
+
+        `IngestFile.target` is set, the file is added to the catalog,
+        coverage index and region summary if they're enabled, and the
+        placement is journaled.
+
+        Parameters
+        ----------
+        ingest_file : IngestFile
+          A verified file.
+        target : str
+          The path to the file in the data store.
+        placement : Placement
+          The record of the placement.
+
+        Returns
+        -------
+        str
+          A log message.
+
+        """
+        f, p = ingest_file, placement
+        self.metrics.record('place', p.seconds, nbytes=p.nbytes,
+                            file=f.name, strategy=p.strategy)
+        f.target = target
+        f.checksum = p.checksum
+        f.checksum_type = p.checksum_type
+        if p.strategy == 'resumed':
+            msg = file_resumed.format(f.name, target)
+        else:
+            if p.strategy == 'unchanged':
+                msg = file_unchanged.format(f.name, target)
+            else:
+                msg = file_moved.format(f.name, target)
+            msg += file_placed.format(p.strategy, p.nbytes, p.seconds,
+                                      p.throughput)
+        if p.checksum is not None:
+            msg += file_checksum.format(p.checksum_type, p.checksum)
+        if self.catalog:
+            with self.metrics.timer('catalog', file=f.name):
+                self.add_to_catalog(f, p)
+        if self.coverage:
+            with self.metrics.timer('coverage', file=f.name):
+                msg += self.add_to_coverage(f)
+        if self.regions:
+            with self.metrics.timer('regions', file=f.name):
+                msg += self.summarize_regions(f)
+        self.journal_record(f, 'placed', target=target)
+        return msg
+
+    def link(self, ingest_file):
+        """
+        Link a placed file into the PBS project directory, if enabled.
+
+        Parameters
+        ----------
+        ingest_file : IngestFile
+          A file that has been placed in the data store.
+
+        Returns
+        -------
+        str or None
+          A log message if the file couldn't be linked, else None.
+
+        """
+        return self.link_files([ingest_file])
+
+    def link_files(self, ingest_files):
+        """
+        Link placed files into the PBS project directory, if enabled.
+
+        The links are made as one batch: each link directory is
+        created once and existing links are replaced atomically. A
+        file that can't be linked stays placed in the journal, so a
+        resumed ingest links it again.
+
+        Parameters
+        ----------
+        ingest_files : list of IngestFile
+          Files that have been placed in the data store.
+
+        Returns
+        -------
+        str or None
+          A log message for the files that couldn't be linked, or
+          None if all were linked.
+
+        """
+        files = [f for f in ingest_files if f.target is not None]
+        if len(files) == 0:
+            return
+        errors = []
+        if len(self.link_dir) > 0:
+            name = files[0].name if len(files) == 1 else None
+            with self.metrics.timer('symlink', file=name):
+                for f in files:
+                    self._linker.add(f.target, self.link_path(f.target))
+                self._linker.commit(errors)
+        failed = set(src for src, dst, e in errors)
+        for f in files:
+            if f.target not in failed:
+                self.journal_record(f, 'linked')
+        if errors:
+            return ''.join(link_failed.format(src, dst, e)
+                           for src, dst, e in errors)
+
+    def link_path(self, target, project_name=None):
+        """
+        Get the path of the project link to a file in the data store.
+
+        Parameters
+        ----------
+        target : str
+          The path to a file in the data store.
+        project_name : str, optional
+          The project (default is `project_name`).
+
+        """
+        filename = os.path.basename(target)
+        if self.append_source_name:
+            filename += '.' + os.path.basename(os.path.dirname(target))
+        return os.path.join(self.ilamb_root, self.link_dir,
+                            project_name or self.project_name, filename)
+
+    def rebuild_links(self, jobs=4):
+        """
+        Regenerate the project links from the files in the data store.
+
+        The data store is scanned in parallel. If `catalog` is set,
+        each file is linked into the directory of the project it was
+        ingested under; files not in the catalog, and all files if it
+        isn't set, are linked under `project_name`. Links in the
+        project directories that point to files missing from the data
+        store are removed.
+
+        Parameters
+        ----------
+        jobs : int, optional
+          Number of threads used to scan the data store (default is
+          4).
+
+        Returns
+        -------
+        str
+          A log message.
+
+        """
+        root = os.path.join(self.ilamb_root, self.dest_dir)
+        files = find_files(root, self.store_depth, jobs=jobs)
+        projects = {}
+        if self.catalog:
+            projects = dict((r['path'], r['project']) for r in
+                            self.get_catalog().find(kind=self.kind))
+        wanted = set()
+        project_dirs = set([os.path.join(self.ilamb_root, self.link_dir,
+                                         self.project_name)])
+        for path in files:
+            project = projects.get(path) or self.project_name
+            dst = self.link_path(path, project)
+            self._linker.add(path, dst)
+            wanted.add(dst)
+            project_dirs.add(os.path.dirname(dst))
+        count = self._linker.commit()
+        removed = 0
+        prefix = os.path.join(root, '')
+        for d in project_dirs:
+            if not os.path.isdir(d):
+                continue
+            for name, p, is_dir in list_dir(d):
+                if p in wanted or not os.path.islink(p):
+                    continue
+                if (os.readlink(p).startswith(prefix) and
+                        not os.path.exists(p)):
+                    os.remove(p)
+                    removed += 1
+        return links_rebuilt.format(count, len(wanted), self.link_dir, removed)
+
+    def add_to_catalog(self, ingest_file, placement):
+        """
+        Record a moved file in the catalog.
+
+        Parameters
+        ----------
+        ingest_file : IngestFile
+          A file that has been moved to the data store.
+        placement : Placement
+          The record of the move.
+
+        """
+        self.get_catalog().add_many([self.catalog_record(ingest_file,
+                                                         placement)])
+
+    def catalog_record(self, ingest_file, placement=None):
+        """
+        Get the catalog columns of a file in the data store.
+
+        Parameters
+        ----------
+        ingest_file : IngestFile
+          A file that has been moved to the data store.
+        placement : Placement, optional
+          The record of the move. If it's not given, the file's size
+          is read from the filesystem.
+
+        Returns
+        -------
+        dict
+          The column values, including `path`.
+
+        """
+        fields = dict(ingest_file.fields)
+        fields[self.data_field] = ingest_file.data
+        record = {'path': ingest_file.target,
+                  'kind': self.kind,
+                  'variable': fields.get('variable_name'),
+                  'model': fields.get('model_name'),
+                  'source': self.source_name or None,
+                  'project': self.project_name or None,
+                  'checksum': ingest_file.checksum}
+        if placement is not None:
+            record['size'] = placement.nbytes
+            record['checksum'] = placement.checksum
+        return record
 
     def symlink(self, src_dir, ingest_file, append_source_name=False):
         """
@@ -108,49 +1333,39 @@ class IngestTool(object):
           Set to True to append group name to path (default is False).
 
         """
-        src = os.path.join(src_dir, ingest_file.name)
+        filename = os.path.basename(ingest_file.name)
+        src = os.path.join(src_dir, filename)
         dst_dir = os.path.join(self.ilamb_root, self.link_dir,
                                self.project_name)
-        if not os.path.isdir(dst_dir):
-            makedirs(dst_dir, mode=0775)
-        dst_filename = ingest_file.name
+        dst_filename = filename
         if append_source_name:
             dst_filename += '.' + self.source_name
-        dst = os.path.join(dst_dir, dst_filename)
-        if os.path.islink(dst):
-            os.remove(dst)
-        os.symlink(src, dst)
+        self._linker.add(src, os.path.join(dst_dir, dst_filename))
+        self._linker.commit()
 
 
 class ModelIngestTool(IngestTool):
 
     """Tool for adding CMIP5-compatible model outputs to the PBS."""
 
+    kind = 'model'
+    verification_tool = ModelVerificationTool
+    data_field = 'model_name'
+
     def __init__(self, ingest_file=None):
         super(ModelIngestTool, self).__init__(ingest_file=None)
         self.log = Logger(title='Model Ingest Tool Summary')
         if ingest_file is not None:
             self.load(ingest_file)
 
-    def verify(self):
+    def verify(self, files=None):
         """
         Check whether ingest files use the CMIP5 standard format.
 
         """
-        for f in self.ingest_files:
-            v = ModelVerificationTool(f)
-            try:
-                v.verify()
-            except VerificationError as e:
-                msg = file_not_verified.format(f.name, e.msg)
-                self.log.add(msg)
-                if os.path.exists(f.name):
-                    os.remove(f.name)
-            else:
-                f.data = v.model_name
-                f.is_verified = True
+        super(ModelIngestTool, self).verify(files)
 
-    def move(self):
+    def move(self, files=None):
         """
         Move ingest files to the ILAMB MODELS directory.
 
@@ -174,61 +1389,45 @@ class ModelIngestTool(IngestTool):
                  +-- test_model_output.txt -> MODELS/SibCASA/test_model_output.txt
 
         """
-        models_dir = os.path.join(self.ilamb_root, self.dest_dir)
-        for f in self.ingest_files:
-            if f.is_verified:
-                target = target_dir = os.path.join(models_dir, f.data)
-                if not os.path.isdir(target_dir):
-                    makedirs(target_dir, mode=0775)
-                if self.overwrite_files:
-                    target = os.path.join(target_dir, f.name)
-                msg = file_moved.format(f.name, target)
-                try:
-                    shutil.move(f.name, target)
-                except IOError:
-                    msg = file_protected.format(target)
-                    if os.path.exists(f.name):
-                        os.remove(f.name)
-                except shutil.Error:
-                    msg = file_exists.format(f.name, target)
-                    if os.path.exists(f.name):
-                        os.remove(f.name)
-                else:
-                    if len(self.link_dir) > 0:
-                        self.symlink(target_dir, f)
-                finally:
-                    self.log.add(msg)
+        super(ModelIngestTool, self).move(files)
+
+    def target_dir(self, ingest_file):
+        """
+        Get the directory where a verified model output file is stored.
+
+        Parameters
+        ----------
+        ingest_file : IngestFile
+          A verified file.
+
+        """
+        return os.path.join(self.ilamb_root, self.dest_dir, ingest_file.data)
 
 
 class BenchmarkIngestTool(IngestTool):
 
     """Tool for adding benchmark datasets to the PBS."""
 
+    kind = 'benchmark'
+    verification_tool = BenchmarkVerificationTool
+    data_field = 'variable_name'
+    append_source_name = True
+    store_depth = 2
+
     def __init__(self, ingest_file=None):
         super(BenchmarkIngestTool, self).__init__(ingest_file=None)
         self.log = Logger(title='Benchmark Ingest Tool Summary')
         if ingest_file is not None:
             self.load(ingest_file)
 
-    def verify(self):
+    def verify(self, files=None):
         """
         Check whether ingest files use an ILAMB-compatible format.
 
         """
-        for f in self.ingest_files:
-            v = BenchmarkVerificationTool(f)
-            try:
-                v.verify()
-            except VerificationError as e:
-                msg = file_not_verified.format(f.name, e.msg)
-                self.log.add(msg)
-                if os.path.exists(f.name):
-                    os.remove(f.name)
-            else:
-                f.data = v.variable_name
-                f.is_verified = True
+        super(BenchmarkIngestTool, self).verify(files)
 
-    def move(self):
+    def move(self, files=None):
         """Move ingest files to the ILAMB DATA directory.
 
         Notes
@@ -253,28 +1452,17 @@ class BenchmarkIngestTool(IngestTool):
                  +-- test_benchmark.txt.CSDMS -> DATA/lai/CSDMS/test_benchmark.txt
 
         """
-        data_dir = os.path.join(self.ilamb_root, self.dest_dir)
-        for f in self.ingest_files:
-            if f.is_verified:
-                target = target_dir = os.path.join(data_dir, f.data,
-                                                   self.source_name)
-                if not os.path.isdir(target_dir):
-                    makedirs(target_dir, mode=0775)
-                if self.overwrite_files:
-                    target = os.path.join(target_dir, f.name)
-                msg = file_moved.format(f.name, target)
-                try:
-                    shutil.move(f.name, target)
-                except IOError:
-                    msg = file_protected.format(target)
-                    if os.path.exists(f.name):
-                        os.remove(f.name)
-                except shutil.Error:
-                    msg = file_exists.format(f.name, target)
-                    if os.path.exists(f.name):
-                        os.remove(f.name)
-                else:
-                    if len(self.link_dir) > 0:
-                        self.symlink(target_dir, f, append_source_name=True)
-                finally:
-                    self.log.add(msg)
+        super(BenchmarkIngestTool, self).move(files)
+
+    def target_dir(self, ingest_file):
+        """
+        Get the directory where a verified benchmark data file is stored.
+
+        Parameters
+        ----------
+        ingest_file : IngestFile
+          A verified file.
+
+        """
+        return os.path.join(self.ilamb_root, self.dest_dir, ingest_file.data,
+                            self.source_name)
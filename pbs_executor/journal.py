@@ -0,0 +1,173 @@
+"""The `journal` module records the progress of each file through an
+ingest, so that an interrupted ingest can be resumed.
+
+"""
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+
+
+stages = ['verified', 'rejected', 'placing', 'placed', 'failed', 'linked']
+final_stages = ['rejected', 'failed', 'linked']
+
+
+def file_identity(path):
+    """
+    Get the size, modification time and inode of a file.
+
+    Parameters
+    ----------
+    path : str
+      The path to the file.
+
+    Returns
+    -------
+    list or None
+      The identity, as stored in a journal record, or None if the
+      file doesn't exist.
+
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime, st.st_ino]
+
+
+class Journal(object):
+    """
+    A write-ahead log of the stage transitions of ingest files.
+
+    Each transition is appended to a JSON-lines file, and flushed to
+    disk, before the ingest goes on, so the journal always shows how
+    far each file got. A partly written last line, left by a crash,
+    is ignored when the journal is read.
+
+    Parameters
+    ----------
+    path : str
+      The path to the journal file.
+    sync : bool, optional
+      Set to True to fsync the file after each record (default is
+      True).
+
+    Attributes
+    ----------
+    path : str
+      The path to the journal file.
+    sync : bool
+      Whether each record is fsynced.
+
+    Examples
+    --------
+    >>> journal = Journal('.pbs_journal.jsonl')
+    >>> journal.record('/uploads/a.nc', 'verified', data='M')
+    >>> journal.state()['/uploads/a.nc']['stage']
+    'verified'
+
+    """
+    def __init__(self, path, sync=True):
+        self.path = path
+        self.sync = sync
+        self._fp = None
+        self._lock = threading.Lock()
+
+    def record(self, filename, stage, **values):
+        """
+        Append a stage transition of a file.
+
+        Parameters
+        ----------
+        filename : str
+          The path of the uploaded file.
+        stage : str
+          One of `stages`.
+        **values
+          Other values to store; e.g., `target`. They're merged with
+          those of earlier records of the file.
+
+        """
+        if stage not in stages:
+            raise ValueError('Unknown stage: {}'.format(stage))
+        rec = {'file': os.path.abspath(filename), 'stage': stage,
+               'time': time.time()}
+        rec.update(values)
+        line = json.dumps(rec, sort_keys=True) + '\n'
+        with self._lock:
+            if self._fp is None:
+                self._fp = open(self.path, 'a')
+            self._fp.write(line)
+            self._fp.flush()
+            if self.sync:
+                os.fsync(self._fp.fileno())
+
+    def records(self):
+        """
+        Read the records of the journal, in order.
+
+        Returns
+        -------
+        generator of dict
+          Each complete record.
+
+        """
+        if not os.path.isfile(self.path):
+            return
+        with open(self.path, 'r') as fp:
+            for line in fp:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+    def state(self):
+        """
+        Replay the journal to find the last state of each file.
+
+        Returns
+        -------
+        OrderedDict
+          The merged values of the records of each file, by path, in
+          the order the files were first recorded.
+
+        """
+        files = OrderedDict()
+        for rec in self.records():
+            files.setdefault(rec['file'], {}).update(rec)
+        return files
+
+    def compact(self):
+        """
+        Rewrite the journal with one record for each file.
+
+        """
+        files = self.state()
+        self.close()
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as fp:
+            for rec in files.values():
+                fp.write(json.dumps(rec, sort_keys=True) + '\n')
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.rename(tmp, self.path)
+
+    def clear(self):
+        """
+        Remove every record, to start the journal of a new ingest.
+
+        """
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def close(self):
+        """
+        Close the journal file, if open.
+
+        """
+        with self._lock:
+            if self._fp is not None:
+                self._fp.close()
+                self._fp = None
@@ -0,0 +1,268 @@
+"""The `links` module creates and rebuilds the symlinks that group
+files in the PBS data store by project.
+
+"""
+import os
+import sys
+import errno
+import argparse
+import threading
+from .utils import DirectoryCache
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+
+def iter_dir(path):
+    """
+    Iterate over the entries of a directory without listing it first.
+
+    Uses ``scandir`` where available, so that entries are read as
+    they're needed and no extra ``stat`` is needed to tell files from
+    directories.
+
+    Parameters
+    ----------
+    path : str
+      The path to a directory.
+
+    Returns
+    -------
+    generator of tuple
+      The name, path and whether it's a directory for each entry, in
+      the order the filesystem returns them.
+
+    """
+    if scandir is not None:
+        for e in scandir(path):
+            yield e.name, e.path, e.is_dir()
+    else:
+        for name in os.listdir(path):
+            p = os.path.join(path, name)
+            yield name, p, os.path.isdir(p)
+
+
+def list_dir(path):
+    """
+    List the entries of a directory.
+
+    Parameters
+    ----------
+    path : str
+      The path to a directory.
+
+    Returns
+    -------
+    list of tuple
+      The name, path and whether it's a directory for each entry,
+      sorted by name.
+
+    """
+    return sorted(iter_dir(path))
+
+
+def find_files(root, depth, jobs=4):
+    """
+    Find the files at a fixed depth below a directory.
+
+    The subdirectories of *root* are scanned in parallel.
+
+    Parameters
+    ----------
+    root : str
+      The directory to scan.
+    depth : int
+      The number of directory levels between *root* and the files;
+      e.g., 1 for MODELS/<model>/<file>.
+    jobs : int, optional
+      Number of threads used to scan (default is 4).
+
+    Returns
+    -------
+    list of str
+      The paths of the files, sorted.
+
+    """
+    def scan(path, level):
+        found = []
+        for name, p, is_dir in list_dir(path):
+            if name.startswith('.'):
+                continue
+            if level == 0 and not is_dir:
+                found.append(p)
+            elif level > 0 and is_dir:
+                found.extend(scan(p, level - 1))
+        return found
+
+    if not os.path.isdir(root):
+        return []
+    if depth == 0:
+        return scan(root, 0)
+    subdirs = [p for name, p, is_dir in list_dir(root)
+               if is_dir and not name.startswith('.')]
+    from multiprocessing.pool import ThreadPool
+    pool = ThreadPool(max(1, jobs))
+    try:
+        results = pool.map(lambda p: scan(p, depth - 1), subdirs)
+    finally:
+        pool.close()
+        pool.join()
+    return sorted(p for found in results for p in found)
+
+
+def replace_symlink(src, dst):
+    """
+    Point a symlink at a file, replacing any existing link atomically.
+
+    The link is made under a temporary name and renamed over *dst*,
+    so readers always see either the old link or the new one. Only a
+    symlink is ever replaced.
+
+    Parameters
+    ----------
+    src : str
+      The path the link points to.
+    dst : str
+      The path of the link.
+
+    Returns
+    -------
+    bool
+      True if the link was created or changed.
+
+    Raises
+    ------
+    OSError
+      If *dst* exists and isn't a symlink.
+
+    """
+    try:
+        if os.readlink(dst) == src:
+            return False
+    except OSError:
+        if os.path.lexists(dst):
+            raise OSError(errno.EEXIST, 'File exists and is not a symlink',
+                          dst)
+    tmp = '{}.{}-{}.tmp'.format(dst, os.getpid(),
+                                threading.current_thread().ident)
+    try:
+        os.symlink(src, tmp)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+        os.remove(tmp)
+        os.symlink(src, tmp)
+    os.rename(tmp, dst)
+    return True
+
+
+class Linker(object):
+    """
+    Create symlinks in batches.
+
+    Links are queued with `add` and made by `commit`, which creates
+    each link directory once and replaces existing links atomically.
+    Directories known to exist are remembered between batches.
+
+    Parameters
+    ----------
+    dirs : DirectoryCache, optional
+      The directories known to exist (default is a new cache).
+
+    Attributes
+    ----------
+    links : list of tuple
+      The source and link paths queued for the next commit.
+
+    """
+    def __init__(self, dirs=None):
+        self.links = []
+        self._dirs = dirs or DirectoryCache()
+        self._lock = threading.Lock()
+
+    def add(self, src, dst):
+        """
+        Queue a link.
+
+        Parameters
+        ----------
+        src : str
+          The path the link points to.
+        dst : str
+          The path of the link.
+
+        """
+        with self._lock:
+            self.links.append((src, dst))
+
+    def commit(self, errors=None):
+        """
+        Create the queued links.
+
+        A link that can't be made doesn't stop the others.
+
+        Parameters
+        ----------
+        errors : list, optional
+          A list to which the source, link path and error of each
+          failed link are appended. If not given, the first error is
+          raised once all the other links are made.
+
+        Returns
+        -------
+        int
+          The number of links created or changed.
+
+        """
+        with self._lock:
+            links, self.links = self.links, []
+        for d in sorted(set(os.path.dirname(dst) for src, dst in links)):
+            self._dirs.ensure(d)
+        count = 0
+        failed = []
+        for src, dst in links:
+            try:
+                count += replace_symlink(src, dst)
+            except OSError as e:
+                failed.append((src, dst, e))
+        if errors is not None:
+            errors.extend(failed)
+        elif failed:
+            raise failed[0][2]
+        return count
+
+
+def main(argv=None):
+    """
+    Rebuild the project links of a data store from the command line.
+
+    """
+    from .ingest import ModelIngestTool, BenchmarkIngestTool
+    tools = {
+        'model': ModelIngestTool,
+        'benchmark': BenchmarkIngestTool,
+    }
+    parser = argparse.ArgumentParser(
+        description='Rebuild the project links of the PBS data store.')
+    parser.add_argument('tool', choices=sorted(tools),
+                        help='Type of files to link')
+    parser.add_argument('config_file', help='Ingest configuration file')
+    parser.add_argument('--jobs', type=int, default=4,
+                        help='Number of threads used to scan the store')
+    args = parser.parse_args(argv)
+    tool = tools[args.tool]()
+    tool.load(args.config_file)
+    msg = tool.rebuild_links(jobs=args.jobs)
+    tool.log.add(msg)
+    tool.log.close()
+    sys.stdout.write(msg)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""The `metrics` module collects timings, byte counts and file counts
+for the stages of an ingest.
+
+"""
+import json
+import time
+import threading
+import importlib
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+summary_header = '''## Timing Summary\n
+'''
+
+
+def load_hook(name):
+    """
+    Import a metrics hook given as 'package.module:function'.
+
+    Parameters
+    ----------
+    name : str
+      The import path of a callable.
+
+    """
+    module_name, func_name = name.split(':')
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+class Metrics(object):
+    """
+    A collector of per-stage and per-file ingest metrics.
+
+    Each record holds a stage name, the file it applies to, the wall
+    time taken and the number of bytes processed. Records are added to
+    running totals for each stage, optionally written to a JSON-lines
+    file, and passed to any registered hooks.
+
+    Parameters
+    ----------
+    path : str, optional
+      Path to a JSON-lines file to which records are appended.
+
+    Attributes
+    ----------
+    path : str or None
+      Path to the JSON-lines file.
+    hooks : list
+      Callables that are passed each record, as a dict.
+    totals : OrderedDict
+      The count, seconds and bytes for each stage, in the order the
+      stages were first seen.
+
+    Examples
+    --------
+    Forward records to a monitoring system:
+
+    >>> metrics = Metrics()
+    >>> metrics.add_hook(lambda record: statsd.timing(record['stage'],
+    ...                                               record['seconds']))
+
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self.hooks = []
+        self.totals = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook):
+        """
+        Register a callable that is passed each record.
+
+        Parameters
+        ----------
+        hook : callable
+          A function of one argument, a dict.
+
+        """
+        self.hooks.append(hook)
+
+    def record(self, stage, seconds, nbytes=0, file=None, **extra):
+        """
+        Record a measurement.
+
+        Parameters
+        ----------
+        stage : str
+          The name of the stage; e.g., 'place'.
+        seconds : float
+          The wall time taken.
+        nbytes : int, optional
+          The number of bytes processed.
+        file : str, optional
+          The file the measurement applies to.
+        **extra
+          Other values to include in the record.
+
+        """
+        rec = {'stage': stage, 'file': file, 'seconds': seconds,
+               'bytes': nbytes, 'time': time.time()}
+        rec.update(extra)
+        with self._lock:
+            total = self.totals.setdefault(
+                stage, {'count': 0, 'seconds': 0.0, 'bytes': 0})
+            total['count'] += 1
+            total['seconds'] += seconds
+            total['bytes'] += nbytes
+            if self.path is not None:
+                with open(self.path, 'a') as fp:
+                    fp.write(json.dumps(rec, sort_keys=True) + '\n')
+        for hook in self.hooks:
+            hook(rec)
+
+    def merge(self, totals):
+        """
+        Add the totals of another collector to this one's.
+
+        Parameters
+        ----------
+        totals : dict
+          The count, seconds and bytes for each stage; e.g., the
+          `totals` of a Metrics from another process.
+
+        """
+        with self._lock:
+            for stage, other in totals.items():
+                total = self.totals.setdefault(
+                    stage, {'count': 0, 'seconds': 0.0, 'bytes': 0})
+                for key in ['count', 'seconds', 'bytes']:
+                    total[key] += other[key]
+
+    @contextmanager
+    def timer(self, stage, file=None, nbytes=0):
+        """
+        Time a block of code and record it.
+
+        Parameters
+        ----------
+        stage : str
+          The name of the stage.
+        file : str, optional
+          The file the measurement applies to.
+        nbytes : int, optional
+          The number of bytes processed.
+
+        """
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.record(stage, time.time() - start, nbytes=nbytes, file=file)
+
+    def summary(self):
+        """
+        Format the totals for each stage as a Markdown message.
+
+        Returns
+        -------
+        str
+          A table of counts, times and bytes for each stage.
+
+        """
+        lines = ['{:<12s} {:>8s} {:>12s} {:>12s} {:>14s}'.format(
+            'Stage', 'Count', 'Total (s)', 'Mean (ms)', 'Bytes')]
+        with self._lock:
+            for stage, total in self.totals.items():
+                mean = 1000.0 * total['seconds'] / max(total['count'], 1)
+                lines.append('{:<12s} {:>8d} {:>12.3f} {:>12.3f} {:>14d}'
+                             .format(stage, total['count'], total['seconds'],
+                                     mean, total['bytes']))
+        return summary_header + ''.join(['    ' + line + '\n'
+                                         for line in lines])
@@ -0,0 +1,168 @@
+"""The `pipeline` module runs an ingest as a set of concurrent stages
+connected by bounded queues.
+
+"""
+import sys
+import threading
+try:
+    from queue import Queue
+except ImportError:
+    from Queue import Queue
+
+
+_done = object()
+
+
+class Pipeline(object):
+    """
+    Ingest files through concurrent verify, transform, place, link and
+    log stages.
+
+    Each stage has its own pool of worker threads and passes files to
+    the next stage through a bounded queue, so small files are placed
+    and linked while large ones are still being verified or copied.
+    The work of each stage is done by the tool's own methods, so the
+    outcome for each file is the same as with `verify`,
+    `transform_files` (if the tool's `transform` is set) and `move`.
+    Log entries are written in the order of the input files.
+
+    Parameters
+    ----------
+    tool : IngestTool
+      A configured ModelIngestTool or BenchmarkIngestTool.
+    jobs : dict, optional
+      Number of worker threads for the 'verify', 'transform', 'place'
+      and 'link' stages (defaults are 2, 1, 2 and 1).
+    queue_size : int, optional
+      Maximum number of files waiting between two stages (default is
+      16).
+
+    Attributes
+    ----------
+    tool : IngestTool
+      The tool that does the work of each stage.
+    jobs : dict
+      Number of worker threads for each stage.
+    queue_size : int
+      Maximum number of files waiting between two stages.
+
+    """
+    stages = ['verify', 'transform', 'place', 'link']
+    default_jobs = {'verify': 2, 'transform': 1, 'place': 2, 'link': 1}
+
+    def __init__(self, tool, jobs=None, queue_size=16):
+        self.tool = tool
+        self.jobs = dict(self.default_jobs)
+        self.jobs.update(jobs or {})
+        self.queue_size = queue_size
+        self._error = None
+
+    def _verify(self, f):
+        return self.tool.verify_file(f)
+
+    def _transform(self, f):
+        if self.tool.transform:
+            return self.tool.transform_file(f)
+
+    def _place(self, f):
+        if f.is_verified:
+            return self.tool.place(f)
+
+    def _link(self, f):
+        return self.tool.link(f)
+
+    def _work(self, func, inq, outq):
+        while True:
+            item = inq.get()
+            if item is _done:
+                break
+            index, f, msgs = item
+            if self._error is None:
+                try:
+                    msg = func(f)
+                except Exception:
+                    self._error = sys.exc_info()
+                    msg = None
+                if msg is not None:
+                    msgs.append(msg)
+            outq.put((index, f, msgs))
+
+    def _start_stage(self, func, inq, outq, njobs, nnext):
+        workers = [threading.Thread(target=self._work,
+                                    args=(func, inq, outq))
+                   for i in range(njobs)]
+        for w in workers:
+            w.daemon = True
+            w.start()
+
+        def finish():
+            for w in workers:
+                w.join()
+            for i in range(nnext):
+                outq.put(_done)
+
+        t = threading.Thread(target=finish)
+        t.daemon = True
+        t.start()
+
+    def _feed(self, files, outq, nnext):
+        try:
+            for index, f in enumerate(files):
+                outq.put((index, f, []))
+        except Exception:
+            self._error = sys.exc_info()
+        finally:
+            for i in range(nnext):
+                outq.put(_done)
+
+    def run(self, files=None):
+        """
+        Ingest files through the pipeline.
+
+        Parameters
+        ----------
+        files : iterable of IngestFile, optional
+          The files to ingest (default is the tool's `ingest_files`).
+
+        Raises
+        ------
+        Exception
+          The first error raised by a stage, or by iterating *files*.
+
+        """
+        if files is None:
+            files = self.tool.ingest_files
+        self._error = None
+        funcs = {'verify': self._verify, 'transform': self._transform,
+                 'place': self._place, 'link': self._link}
+        queues = [Queue(self.queue_size) for i in range(len(self.stages) + 1)]
+        feeder = threading.Thread(target=self._feed,
+                                  args=(files, queues[0],
+                                        self.jobs[self.stages[0]]))
+        feeder.daemon = True
+        feeder.start()
+        for i, stage in enumerate(self.stages):
+            if i + 1 < len(self.stages):
+                nnext = self.jobs[self.stages[i + 1]]
+            else:
+                nnext = 1
+            self._start_stage(funcs[stage], queues[i], queues[i + 1],
+                              self.jobs[stage], nnext)
+        self._log(queues[-1])
+        if self._error is not None:
+            exc_type, exc_value, tb = self._error
+            raise exc_value
+
+    def _log(self, inq):
+        pending = {}
+        next_index = 0
+        while True:
+            item = inq.get()
+            if item is _done:
+                break
+            pending[item[0]] = item[2]
+            while next_index in pending:
+                for msg in pending.pop(next_index):
+                    self.tool.log_message(msg)
+                next_index += 1
+        self.tool.log.flush()
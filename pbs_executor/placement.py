@@ -0,0 +1,280 @@
+"""The `placement` module contains functions for placing ingested files
+in the PBS data store.
+
+"""
+import os
+import errno
+import hashlib
+import shutil
+import time
+from .checksum import hash_file, hash_file_chunked, chunked_type
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+strategies = ['auto', 'rename', 'hardlink', 'reflink', 'copy']
+same_filesystem_strategies = ['rename', 'hardlink', 'reflink']
+
+FICLONE = 0x40049409
+chunk_size = 1024 * 1024
+unsupported = (errno.EXDEV, errno.EOPNOTSUPP, errno.EINVAL, errno.ENOTTY,
+               errno.EPERM)
+
+
+class Placement(object):
+    """
+    A record of a file placed in the PBS data store.
+
+    Parameters
+    ----------
+    strategy : str
+      The strategy used to place the file.
+    nbytes : int
+      The size of the file, in bytes.
+    seconds : float
+      The wall time taken to place the file.
+    checksum : str or None, optional
+      The hexadecimal digest of the file, if computed.
+    checksum_type : str or None, optional
+      The type of checksum; e.g., 'sha256'.
+
+    Attributes
+    ----------
+    strategy : str
+      The strategy used to place the file.
+    nbytes : int
+      The size of the file, in bytes.
+    seconds : float
+      The wall time taken to place the file.
+    checksum : str or None
+      The hexadecimal digest of the file, if computed.
+    checksum_type : str or None
+      The type of checksum; e.g., 'sha256'.
+
+    """
+    def __init__(self, strategy, nbytes, seconds, checksum=None,
+                 checksum_type=None):
+        self.strategy = strategy
+        self.nbytes = nbytes
+        self.seconds = seconds
+        self.checksum = checksum
+        self.checksum_type = checksum_type
+
+    @property
+    def throughput(self):
+        """Placement rate, in MB/s."""
+        if self.seconds <= 0:
+            return float('inf')
+        return self.nbytes / self.seconds / 1.0e6
+
+
+def is_same_filesystem(src, dst_dir):
+    """
+    Determine whether a file and a directory are on the same filesystem.
+
+    Parameters
+    ----------
+    src : str
+      The path to a file.
+    dst_dir : str
+      The path to an existing directory.
+
+    """
+    src_dir = os.path.dirname(os.path.abspath(src))
+    return os.stat(src_dir).st_dev == os.stat(dst_dir).st_dev
+
+
+def choose_strategy(src, dst_dir, strategy='auto'):
+    """
+    Choose the cheapest valid strategy for placing a file.
+
+    A rename, hardlink or reflink is only possible when the source
+    and destination are on the same filesystem; otherwise the file is
+    copied.
+
+    Parameters
+    ----------
+    src : str
+      The path to the file to place.
+    dst_dir : str
+      The path to an existing destination directory.
+    strategy : str, optional
+      The requested strategy (default is 'auto').
+
+    Returns
+    -------
+    str
+      The strategy to use.
+
+    """
+    if strategy not in strategies:
+        raise ValueError('Unknown placement strategy: {}'.format(strategy))
+    same = is_same_filesystem(src, dst_dir)
+    if strategy == 'auto':
+        return 'rename' if same else 'copy'
+    if strategy in same_filesystem_strategies and not same:
+        return 'copy'
+    return strategy
+
+
+def _tmp_name(dst):
+    head, tail = os.path.split(dst)
+    return os.path.join(head, '.{}.{}.tmp'.format(tail, os.getpid()))
+
+
+def _commit(tmp, dst, overwrite):
+    """Move a finished temporary file to its destination."""
+    if overwrite:
+        os.rename(tmp, dst)
+    else:
+        try:
+            os.link(tmp, dst)
+        finally:
+            os.remove(tmp)
+
+
+def _rename(src, dst, overwrite):
+    if overwrite:
+        os.rename(src, dst)
+    else:
+        os.link(src, dst)
+        os.remove(src)
+
+
+def _hardlink(src, dst, overwrite):
+    if overwrite:
+        tmp = _tmp_name(dst)
+        os.link(src, tmp)
+        _commit(tmp, dst, overwrite)
+    else:
+        os.link(src, dst)
+    os.remove(src)
+
+
+def _reflink(src, dst, overwrite):
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, 'Reflinks are not supported')
+    tmp = _tmp_name(dst)
+    with open(src, 'rb') as fsrc:
+        with open(tmp, 'wb') as fdst:
+            try:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            except (IOError, OSError):
+                fdst.close()
+                os.remove(tmp)
+                raise
+    shutil.copystat(src, tmp)
+    _commit(tmp, dst, overwrite)
+    os.remove(src)
+
+
+def _copy(src, dst, overwrite, hasher=None):
+    tmp = _tmp_name(dst)
+    try:
+        with open(src, 'rb') as fsrc:
+            with open(tmp, 'wb') as fdst:
+                while True:
+                    buf = fsrc.read(chunk_size)
+                    if not buf:
+                        break
+                    fdst.write(buf)
+                    if hasher is not None:
+                        hasher.update(buf)
+        shutil.copystat(src, tmp)
+    except:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    _commit(tmp, dst, overwrite)
+    os.remove(src)
+
+
+_placers = {
+    'rename': _rename,
+    'hardlink': _hardlink,
+    'reflink': _reflink,
+    'copy': _copy,
+}
+
+
+def place_file(src, dst, strategy='auto', overwrite=False, checksum=None,
+               checksum_jobs=1):
+    """
+    Move a file to its destination in the PBS data store.
+
+    Parameters
+    ----------
+    src : str
+      The path to the file to place.
+    dst : str
+      The destination path. Its directory must exist.
+    strategy : str, optional
+      One of 'auto', 'rename', 'hardlink', 'reflink' or 'copy'
+      (default is 'auto'). The cheapest valid strategy is used when
+      the requested one isn't possible.
+    overwrite : bool, optional
+      Set to True to replace an existing destination file (default
+      is False).
+    checksum : str or None, optional
+      A hash algorithm provided by `hashlib`; e.g., 'sha256'. If
+      given, the checksum of the file is computed (default is None).
+    checksum_jobs : int, optional
+      Number of threads used to compute a chunked checksum of a file
+      that wasn't copied (default is 1, for a plain checksum).
+
+    Returns
+    -------
+    Placement
+      The strategy used, the number of bytes placed, the time taken
+      and the checksum.
+
+    Notes
+    -----
+    A copied file is hashed as its bytes stream through, so it's read
+    only once. A renamed or linked file is hashed after it's placed.
+
+    Raises
+    ------
+    shutil.Error
+      If the destination exists and *overwrite* is False.
+    IOError
+      If the file can't be read, or the destination can't be written.
+
+    """
+    start = time.time()
+    if not overwrite and os.path.lexists(dst):
+        raise shutil.Error("Destination path '{}' already exists".format(dst))
+    hasher = None if checksum is None else hashlib.new(checksum)
+    try:
+        nbytes = os.stat(src).st_size
+        used = choose_strategy(src, os.path.dirname(os.path.abspath(dst)),
+                               strategy)
+        try:
+            if used == 'copy':
+                _copy(src, dst, overwrite, hasher)
+            else:
+                _placers[used](src, dst, overwrite)
+        except (IOError, OSError) as e:
+            if used == 'copy' or e.errno not in unsupported:
+                raise
+            used = 'copy'
+            _copy(src, dst, overwrite, hasher)
+    except OSError as e:
+        if e.errno == errno.EEXIST:
+            raise shutil.Error(
+                "Destination path '{}' already exists".format(dst))
+        raise IOError(e.errno, e.strerror, dst)
+    digest = None
+    if checksum is None:
+        pass
+    elif used == 'copy':
+        digest = hasher.hexdigest()
+    elif checksum_jobs > 1:
+        digest = hash_file_chunked(dst, checksum, jobs=checksum_jobs)
+        checksum = chunked_type(checksum)
+    else:
+        digest = hash_file(dst, checksum)
+    return Placement(used, nbytes, time.time() - start, digest, checksum)
@@ -0,0 +1,347 @@
+"""The `regions` module builds masks and area weights for the
+latitude-longitude regions defined in ILAMB region files, such as
+`data/tropics.txt`.
+
+"""
+import os
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+from . import data_directory
+
+
+regions_file = os.path.join(data_directory, 'tropics.txt')
+lat_names = ['lat', 'latitude']
+lon_names = ['lon', 'longitude']
+
+Region = namedtuple('Region', ['label', 'name', 'lat_min', 'lat_max',
+                               'lon_min', 'lon_max'])
+
+
+def load_regions(path=regions_file):
+    """
+    Read region definitions from an ILAMB region file.
+
+    Each line holds a label, a name and the latitude and longitude
+    bounds of a box, separated by commas; e.g.,
+    ``tropics,Tropics,-23.5,23.5,-180,180``.
+
+    Parameters
+    ----------
+    path : str, optional
+      The path to the file (default is `data/tropics.txt`).
+
+    Returns
+    -------
+    OrderedDict
+      The Region for each label, in the order of the file.
+
+    """
+    regions = OrderedDict()
+    with open(path, 'r') as fp:
+        for line in fp:
+            line = line.strip()
+            if len(line) == 0 or line.startswith('#'):
+                continue
+            parts = [p.strip() for p in line.split(',')]
+            if len(parts) != 6:
+                raise ValueError('Bad region definition: {}'.format(line))
+            regions[parts[0]] = Region(parts[0], parts[1],
+                                       *[float(p) for p in parts[2:]])
+    return regions
+
+
+def grid_fingerprint(lat, lon):
+    """
+    Get a key that identifies a latitude-longitude grid.
+
+    Parameters
+    ----------
+    lat, lon : array_like
+      The cell-center coordinates of the grid, in degrees.
+
+    Returns
+    -------
+    str
+      A hexadecimal digest of the coordinates.
+
+    """
+    import numpy as np
+    h = hashlib.sha1()
+    for x in [lat, lon]:
+        x = np.ascontiguousarray(x, dtype='f8')
+        h.update(str(x.shape).encode('utf-8'))
+        h.update(x.tobytes())
+    return h.hexdigest()
+
+
+def cell_bounds(x):
+    """
+    Estimate the cell edges of a 1-D grid from its cell centers.
+
+    """
+    import numpy as np
+    x = np.asarray(x, dtype='f8')
+    if x.size == 1:
+        return np.array([x[0] - 0.5, x[0] + 0.5])
+    mid = 0.5 * (x[1:] + x[:-1])
+    return np.concatenate(([2 * x[0] - mid[0]], mid, [2 * x[-1] - mid[-1]]))
+
+
+def _overlap(lo, hi, box_lo, box_hi):
+    import numpy as np
+    return np.clip(np.minimum(hi, box_hi) - np.maximum(lo, box_lo), 0, None)
+
+
+class RegionMasks(object):
+    """
+    Build and cache masks and weights of regions on model grids.
+
+    Masks and weights are computed with array operations over the
+    whole grid, and cached by region and grid fingerprint, so files
+    on the same grid share them.
+
+    Parameters
+    ----------
+    regions : dict, optional
+      Region definitions, by label (default is the regions in
+      `data/tropics.txt`).
+    cache_size : int, optional
+      The maximum number of masks and weights kept (default is 64).
+
+    Attributes
+    ----------
+    regions : OrderedDict
+      Region definitions, by label.
+
+    Examples
+    --------
+    Find the area-weighted mean of a field over the tropics:
+
+    >>> masks = RegionMasks()
+    >>> w = masks.weights('tropics', lat, lon)
+    >>> mean = (w * field).sum()
+
+    """
+    def __init__(self, regions=None, cache_size=64):
+        if regions is None:
+            regions = load_regions()
+        self.regions = OrderedDict(regions)
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cached(self, key, build):
+        with self._lock:
+            if key in self._cache:
+                value = self._cache.pop(key)
+                self._cache[key] = value
+                return value
+        value = build()
+        with self._lock:
+            self._cache[key] = value
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return value
+
+    def mask(self, label, lat, lon):
+        """
+        Get the cells of a grid whose centers lie in a region.
+
+        Parameters
+        ----------
+        label : str
+          The region label; e.g., 'tropics'.
+        lat, lon : array_like
+          The cell-center coordinates of the grid, in degrees.
+          Longitudes may be in [-180, 180] or [0, 360].
+
+        Returns
+        -------
+        numpy.ndarray
+          A read-only boolean (lat, lon) array that is True inside the
+          region.
+
+        """
+        key = (label, 'mask', grid_fingerprint(lat, lon))
+        return self._cached(key, lambda: self._build_mask(label, lat, lon))
+
+    def weights(self, label, lat, lon):
+        """
+        Get the area weights of the cells of a grid in a region.
+
+        Cells that straddle the region boundary are weighted by the
+        fraction of their area inside it.
+
+        Parameters
+        ----------
+        label : str
+          The region label; e.g., 'tropics'.
+        lat, lon : array_like
+          The cell-center coordinates of the grid, in degrees.
+
+        Returns
+        -------
+        numpy.ndarray
+          A read-only (lat, lon) array of weights that sum to 1, or to
+          0 if the region doesn't intersect the grid.
+
+        """
+        key = (label, 'weights', grid_fingerprint(lat, lon))
+        return self._cached(key,
+                            lambda: self._build_weights(label, lat, lon))
+
+    def _build_mask(self, label, lat, lon):
+        import numpy as np
+        r = self.regions[label]
+        lat = np.asarray(lat, dtype='f8')
+        lon = np.asarray(lon, dtype='f8')
+        in_lat = (lat >= r.lat_min) & (lat <= r.lat_max)
+        in_lon = np.mod(lon - r.lon_min, 360.0) <= r.lon_max - r.lon_min
+        mask = np.outer(in_lat, in_lon)
+        mask.flags.writeable = False
+        return mask
+
+    def _build_weights(self, label, lat, lon):
+        import numpy as np
+        r = self.regions[label]
+        lat_edges = np.clip(cell_bounds(lat), -90.0, 90.0)
+        lon_edges = cell_bounds(lon)
+        lat_lo = np.minimum(lat_edges[:-1], lat_edges[1:])
+        lat_hi = np.maximum(lat_edges[:-1], lat_edges[1:])
+        lon_lo = np.minimum(lon_edges[:-1], lon_edges[1:])
+        lon_hi = np.maximum(lon_edges[:-1], lon_edges[1:])
+        lo = np.radians(np.maximum(lat_lo, r.lat_min))
+        hi = np.radians(np.minimum(lat_hi, r.lat_max))
+        lat_w = np.clip(np.sin(hi) - np.sin(lo), 0, None)
+        lon_w = sum(_overlap(lon_lo, lon_hi, r.lon_min + k, r.lon_max + k)
+                    for k in (-360.0, 0.0, 360.0))
+        lon_w = np.minimum(lon_w, lon_hi - lon_lo)
+        w = np.outer(lat_w, lon_w)
+        total = w.sum()
+        if total > 0:
+            w /= total
+        w.flags.writeable = False
+        return w
+
+    def means(self, data, lat, lon, labels=None):
+        """
+        Get the area-weighted mean of a field in each region.
+
+        Missing values, given as a masked array or as NaN, are left
+        out, and the weights of the remaining cells are renormalized.
+
+        Parameters
+        ----------
+        data : array_like
+          A field whose last two dimensions are (lat, lon); e.g., a
+          (time, lat, lon) array.
+        lat, lon : array_like
+          The cell-center coordinates of the grid, in degrees.
+        labels : list of str, optional
+          The regions (default is all regions).
+
+        Returns
+        -------
+        OrderedDict
+          The means for each region label, with the shape of the
+          leading dimensions of *data*. Regions with no valid data
+          have a mean of NaN.
+
+        """
+        import numpy as np
+        if labels is None:
+            labels = list(self.regions)
+        w = np.array([self.weights(label, lat, lon) for label in labels])
+        data = np.ma.masked_invalid(np.ma.asarray(data, dtype='f8'))
+        valid = (~np.ma.getmaskarray(data)).astype('f8')
+        values = np.ma.filled(data, 0.0)
+        total = np.tensordot(values, w, axes=([-2, -1], [1, 2]))
+        count = np.tensordot(valid, w, axes=([-2, -1], [1, 2]))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result = np.where(count > 0, total / count, np.nan)
+        return OrderedDict((label, result[..., i])
+                           for i, label in enumerate(labels))
+
+
+def find_grid(dataset, variable_name):
+    """
+    Find the latitude and longitude coordinates of a gridded variable.
+
+    Parameters
+    ----------
+    dataset : netCDF4.Dataset
+      An open file.
+    variable_name : str
+      The name of the variable.
+
+    Returns
+    -------
+    tuple or None
+      The latitude and longitude variables, or None if the variable
+      isn't on a latitude-longitude grid.
+
+    """
+    v = dataset.variables.get(variable_name)
+    if v is None or v.ndim < 2:
+        return None
+    lat_dim, lon_dim = v.dimensions[-2:]
+    lat = dataset.variables.get(lat_dim)
+    lon = dataset.variables.get(lon_dim)
+    if lat is None or lon is None:
+        return None
+    if lat_dim not in lat_names or lon_dim not in lon_names:
+        return None
+    return lat, lon
+
+
+def summarize_file(path, variable_name, masks, chunk_size=12):
+    """
+    Get the regional means of a variable, averaged over time.
+
+    The variable is read *chunk_size* records at a time. Only (lat,
+    lon) and (time, lat, lon) variables are summarized; a variable
+    with vertical levels is skipped rather than averaged over them.
+
+    Parameters
+    ----------
+    path : str
+      The path to a netCDF file.
+    variable_name : str
+      The name of a variable with (lat, lon) as its last dimensions.
+    masks : RegionMasks
+      The regions.
+    chunk_size : int, optional
+      Number of records read at a time (default is 12).
+
+    Returns
+    -------
+    OrderedDict or None
+      The mean for each region label, or None if the variable isn't
+      on a latitude-longitude grid or has more than three dimensions.
+
+    """
+    import numpy as np
+    from netCDF4 import Dataset
+    with Dataset(path) as dataset:
+        grid = find_grid(dataset, variable_name)
+        if grid is None:
+            return None
+        lat, lon = grid[0][:], grid[1][:]
+        v = dataset.variables[variable_name]
+        if v.ndim > 3:
+            return None
+        if v.ndim == 2:
+            return OrderedDict((label, float(mean)) for label, mean
+                               in masks.means(v[:], lat, lon).items())
+        sums = OrderedDict()
+        counts = OrderedDict()
+        for i in range(0, v.shape[0], chunk_size):
+            chunk = v[i:i + chunk_size]
+            for label, means in masks.means(chunk, lat, lon).items():
+                ok = ~np.isnan(means)
+                sums[label] = sums.get(label, 0.0) + means[ok].sum()
+                counts[label] = counts.get(label, 0) + ok.sum()
+        return OrderedDict((label, sums[label] / counts[label]
+                            if counts[label] > 0 else float('nan'))
+                           for label in sums)
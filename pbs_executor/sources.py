@@ -0,0 +1,212 @@
+"""The `sources` module expands the `ingest_files` of a configuration
+file, which may name glob patterns, directories and manifest files, into
+a stream of files.
+
+"""
+import os
+import re
+import fnmatch
+from .file import IngestFile
+from .links import iter_dir
+
+
+magic_pattern = re.compile(r'[*?[]')
+manifest_prefix = '@'
+
+
+def has_magic(path):
+    """
+    Check whether a path is a glob pattern.
+
+    """
+    return magic_pattern.search(path) is not None
+
+
+def is_expandable(source):
+    """
+    Check whether an `ingest_files` entry names more than one file.
+
+    Only the entry's text is checked, so the filesystem isn't touched
+    until the entries are expanded. A directory is recognized by a
+    trailing path separator.
+
+    Parameters
+    ----------
+    source : str
+      An entry: a file, a glob pattern, a directory or '@' followed
+      by the path to a manifest file.
+
+    """
+    return (source.startswith(manifest_prefix) or has_magic(source) or
+            source.endswith(os.sep))
+
+
+def walk_files(directory):
+    """
+    Find the files below a directory, as they're scanned.
+
+    Hidden files and directories are skipped.
+
+    Parameters
+    ----------
+    directory : str
+      The path to a directory.
+
+    Returns
+    -------
+    generator of str
+      The paths of the files.
+
+    """
+    for name, p, is_dir in iter_dir(directory):
+        if name.startswith('.'):
+            continue
+        if is_dir:
+            for path in walk_files(p):
+                yield path
+        else:
+            yield p
+
+
+def iglob(pattern):
+    """
+    Find the paths that match a glob pattern, as they're scanned.
+
+    Unlike ``glob.iglob``, no directory is listed in full before its
+    matches are returned. Hidden files match only a pattern that
+    starts with '.'.
+
+    Parameters
+    ----------
+    pattern : str
+      A pattern such as 'uploads/*/tas_*.nc'.
+
+    Returns
+    -------
+    generator of str
+      The matching paths.
+
+    """
+    head, tail = os.path.split(pattern)
+    if not has_magic(pattern):
+        if os.path.lexists(pattern):
+            yield pattern
+        return
+    if has_magic(head):
+        dirs = (d for d in iglob(head) if os.path.isdir(d))
+    else:
+        dirs = [head]
+    for d in dirs:
+        if not has_magic(tail):
+            p = os.path.join(d, tail)
+            if os.path.lexists(p):
+                yield p
+            continue
+        try:
+            entries = iter_dir(d or os.curdir)
+            for name, p, is_dir in entries:
+                if name.startswith('.') and not tail.startswith('.'):
+                    continue
+                if fnmatch.fnmatch(name, tail):
+                    yield os.path.join(d, name)
+        except OSError:
+            continue
+
+
+def read_manifest(path):
+    """
+    Read the entries of a manifest file, one at a time.
+
+    Each line holds an entry; blank lines and lines that start with
+    '#' are skipped. Relative entries are taken relative to the
+    manifest's directory.
+
+    Parameters
+    ----------
+    path : str
+      The path to the manifest file.
+
+    Returns
+    -------
+    generator of str
+      The entries.
+
+    """
+    base = os.path.dirname(path)
+    with open(path, 'r') as fp:
+        for line in fp:
+            line = line.strip()
+            if len(line) == 0 or line.startswith('#'):
+                continue
+            if line.startswith(manifest_prefix):
+                yield manifest_prefix + os.path.join(base, line[1:])
+            else:
+                yield os.path.join(base, line)
+
+
+def expand(sources):
+    """
+    Expand `ingest_files` entries into file paths, lazily.
+
+    Parameters
+    ----------
+    sources : iterable of str
+      Entries, each a file, a glob pattern, a directory (whose files
+      are found recursively) or '@' followed by the path to a
+      manifest file, whose lines are themselves entries.
+
+    Returns
+    -------
+    generator of str
+      The paths of the files, in the order of *sources*. A path that
+      matches more than one entry is returned once for each.
+
+    """
+    for source in sources:
+        if source.startswith(manifest_prefix):
+            for path in expand(read_manifest(source[1:])):
+                yield path
+        elif has_magic(source):
+            for path in iglob(source):
+                if not os.path.isdir(path):
+                    yield path
+        elif os.path.isdir(source):
+            for path in walk_files(source):
+                yield path
+        else:
+            yield source
+
+
+class FileStream(object):
+    """
+    The ingest files named by `ingest_files` entries, expanded lazily.
+
+    Each iteration scans the sources again and yields new IngestFile
+    objects, so memory use doesn't grow with the number of files.
+
+    Parameters
+    ----------
+    sources : list of str
+      The entries; see `expand`.
+
+    Attributes
+    ----------
+    sources : list of str
+      The entries.
+
+    Examples
+    --------
+    >>> files = FileStream(['uploads/*.nc', '@more_uploads.txt'])
+    >>> for f in files:
+    ...     print(f.name)
+
+    """
+    def __init__(self, sources):
+        self.sources = list(sources)
+
+    def __iter__(self):
+        for path in expand(self.sources):
+            yield IngestFile(path)
+
+    def __repr__(self):
+        return 'FileStream({!r})'.format(self.sources)
@@ -0,0 +1,172 @@
+"""The `store` module contains a content-addressed store that keeps a
+single copy of identical files ingested into the PBS.
+
+"""
+import os
+import errno
+import shutil
+import time
+from .checksum import hash_file
+from .placement import Placement, place_file
+from .utils import DirectoryCache
+
+
+class BlobStore(object):
+    """
+    A store of files addressed by the checksum of their contents.
+
+    Each unique file is kept once, as a blob, under *root*. Entries in
+    the DATA and MODELS trees are hardlinks to blobs, so the store
+    must be on the same filesystem as those trees.
+
+    Parameters
+    ----------
+    root : str
+      The directory that holds the blobs.
+    algorithm : str, optional
+      The hash algorithm used to address blobs (default is 'sha256').
+    dirs : DirectoryCache, optional
+      The directories known to exist (default is a new cache).
+
+    Attributes
+    ----------
+    root : str
+      The directory that holds the blobs.
+    algorithm : str
+      The hash algorithm used to address blobs.
+
+    Notes
+    -----
+    Blobs are laid out as:
+
+    .. code-block:: bash
+
+       <root>/<algorithm>/<digest[:2]>/<digest[2:4]>/<digest>
+
+    """
+    def __init__(self, root, algorithm='sha256', dirs=None):
+        self.root = root
+        self.algorithm = algorithm
+        self._dirs = dirs or DirectoryCache()
+
+    def path(self, digest):
+        """
+        Get the path to the blob with a given digest.
+
+        Parameters
+        ----------
+        digest : str
+          The hexadecimal digest of a file.
+
+        """
+        return os.path.join(self.root, self.algorithm, digest[:2],
+                            digest[2:4], digest)
+
+    def add(self, src, dst, strategy='auto', overwrite=False, digest=None):
+        """
+        Move a file to its destination and keep a blob of its contents.
+
+        If the store already holds a blob with the same contents, *dst*
+        is linked to that blob and the source file is removed.
+        Otherwise, the file is placed at *dst* and then hardlinked into
+        the store. The source file is removed only once *dst* exists.
+
+        Parameters
+        ----------
+        src : str
+          The path to the file to add.
+        dst : str
+          The destination path in the DATA or MODELS tree. Its
+          directory must exist.
+        strategy : str, optional
+          The placement strategy for a new file (default is 'auto').
+        overwrite : bool, optional
+          Set to True to replace an existing destination (default is
+          False).
+        digest : str, optional
+          The checksum of *src*, if already known.
+
+        Returns
+        -------
+        Placement
+          The placement, with strategy 'dedup' if the blob existed or
+          'unchanged' if *dst* already links to it.
+
+        Raises
+        ------
+        shutil.Error
+          If the destination exists and *overwrite* is False.
+        IOError
+          If the destination can't be written, or isn't on the same
+          filesystem as the store.
+
+        """
+        start = time.time()
+        if not overwrite and os.path.lexists(dst):
+            raise shutil.Error(
+                "Destination path '{}' already exists".format(dst))
+        try:
+            nbytes = os.stat(src).st_size
+            if digest is None:
+                digest = hash_file(src, self.algorithm)
+            blob = self.path(digest)
+            self._dirs.ensure(os.path.dirname(blob))
+            dst_dir = os.path.dirname(os.path.abspath(dst))
+            if os.stat(os.path.dirname(blob)).st_dev != \
+                    os.stat(dst_dir).st_dev:
+                raise OSError(errno.EXDEV, 'The store is on another '
+                              'filesystem', self.root)
+        except OSError as e:
+            raise IOError(e.errno, e.strerror, e.filename)
+        if os.path.exists(blob):
+            if os.path.exists(dst) and os.path.samefile(blob, dst):
+                strategy = 'unchanged'
+            else:
+                self._link(blob, dst, overwrite)
+                strategy = 'dedup'
+            os.remove(src)
+        else:
+            strategy = place_file(src, dst, strategy=strategy,
+                                  overwrite=overwrite).strategy
+            try:
+                os.link(dst, blob)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise IOError(e.errno, e.strerror, blob)
+                self._link(blob, dst, True)
+                strategy = 'dedup'
+        return Placement(strategy, nbytes, time.time() - start, digest,
+                         self.algorithm)
+
+    def _link(self, blob, dst, overwrite):
+        try:
+            if overwrite:
+                tmp = '{}.{}.link'.format(dst, os.getpid())
+                os.link(blob, tmp)
+                os.rename(tmp, dst)
+            else:
+                os.link(blob, dst)
+        except OSError as e:
+            if e.errno == errno.EEXIST:
+                raise shutil.Error(
+                    "Destination path '{}' already exists".format(dst))
+            raise IOError(e.errno, e.strerror, dst)
+
+    def prune(self):
+        """
+        Remove blobs that are no longer linked from the data store.
+
+        Returns
+        -------
+        int
+          The number of blobs removed.
+
+        """
+        count = 0
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                if os.stat(path).st_nlink == 1:
+                    os.remove(path)
+                    count += 1
+        return count
@@ -0,0 +1,114 @@
+"""Tests for the basins module."""
+
+import os
+import shutil
+import numpy as np
+from nose.tools import raises, assert_true, assert_equal, assert_almost_equal
+from netCDF4 import Dataset
+from pbs_executor.basins import BasinIndex, basins_file
+
+
+cache = 'test_basins_cache'
+grid_file = 'test_basins.nc'
+ids = np.ma.masked_less(np.array([[0, 0, 1],
+                                  [2, 1, -1]]), 0)
+
+
+def setup_module():
+    with Dataset(grid_file, 'w') as dataset:
+        dataset.createDimension('lat', 2)
+        dataset.createDimension('lon', 3)
+        dataset.createDimension('n', 4)
+        dataset.createVariable('lat', 'f8', ('lat',))[:] = [-0.5, 0.5]
+        dataset.createVariable('lon', 'f8', ('lon',))[:] = [0.5, 1.5, 2.5]
+        v = dataset.createVariable('basin_index', 'i4', ('lat', 'lon'),
+                                   fill_value=-1)
+        v.labels = 'label'
+        v[:] = ids
+        label = dataset.createVariable('label', str, ('n',))
+        for i, name in enumerate(['a', 'b', 'c', 'd']):
+            label[i] = name
+
+
+def teardown_module():
+    if os.path.exists(cache):
+        shutil.rmtree(cache)
+    if os.path.exists(grid_file):
+        os.remove(grid_file)
+
+
+def test_build():
+    x = BasinIndex.build(grid_file)
+    assert_equal(x.labels, ['a', 'b', 'c', 'd'])
+    assert_equal(x.shape, (2, 3))
+    assert_equal(list(x.cells), [0, 1, 2, 4, 3])
+    assert_equal(list(x.offsets), [0, 2, 4, 5, 5])
+    assert_equal(list(x.cells_of('b')), [2, 4])
+    assert_equal(list(x.cells_of(3)), [])
+
+
+def test_reduce():
+    x = BasinIndex.build(grid_file)
+    field = np.array([[1.0, 3.0, 5.0],
+                      [7.0, np.nan, 100.0]])
+    means = x.reduce(field)
+    assert_equal(means['a'], 2.0)
+    assert_equal(means['b'], 5.0)
+    assert_equal(means['c'], 7.0)
+    assert_true(np.isnan(means['d']))
+    assert_equal(x.reduce(field, how='sum')['a'], 4.0)
+    assert_equal(x.reduce(field, how='max')['a'], 3.0)
+    assert_equal(x.reduce(field, how='min')['b'], 5.0)
+    assert_equal(x.reduce(field, how='count')['b'], 1)
+    assert_equal(x.reduce(field, how='count')['d'], 0)
+
+
+def test_reduce_weighted_time_series():
+    x = BasinIndex.build(grid_file)
+    field = np.ma.array([[[1.0, 3.0, 5.0], [7.0, 9.0, 0.0]],
+                         [[2.0, 4.0, 6.0], [8.0, 10.0, 0.0]]])
+    field[1, 0, 0] = np.ma.masked
+    weights = np.array([[1.0, 3.0, 1.0], [1.0, 1.0, 1.0]])
+    means = x.reduce(field, weights=weights)
+    assert_equal(means['a'].shape, (2,))
+    assert_almost_equal(means['a'][0], 2.5)
+    assert_almost_equal(means['a'][1], 4.0)
+    assert_almost_equal(means['b'][1], 8.0)
+
+
+@raises(ValueError)
+def test_reduce_wrong_grid():
+    BasinIndex.build(grid_file).reduce(np.zeros((3, 2)))
+
+
+@raises(ValueError)
+def test_reduce_unknown():
+    BasinIndex.build(grid_file).reduce(np.zeros((2, 3)), how='median')
+
+
+def test_load_reuses_cache():
+    x = BasinIndex.load(grid_file, cache=cache)
+    assert_true(os.path.isfile(os.path.join(cache, 'test_basins.basins',
+                                            'cells.npy')))
+    y = BasinIndex.load(grid_file, cache=cache)
+    assert_true(isinstance(y.cells, np.memmap))
+    assert_equal(list(y.cells), list(x.cells))
+    assert_equal(y.labels, x.labels)
+    assert_equal(y.reduce(np.ones((2, 3)), how='count')['a'], 2)
+
+
+def test_load_rebuilds_stale_cache():
+    BasinIndex.load(grid_file, cache=cache)
+    st = os.stat(grid_file)
+    os.utime(grid_file, (st.st_atime, st.st_mtime + 10))
+    y = BasinIndex.load(grid_file, cache=cache)
+    assert_true(not isinstance(y.cells, np.memmap))
+
+
+def test_basins_file():
+    x = BasinIndex.load(basins_file, cache=cache)
+    assert_equal(x.shape, (360, 720))
+    assert_equal(len(x.labels), 50)
+    assert_true('Amazon' in x.labels)
+    counts = x.reduce(np.ones(x.shape), how='count')
+    assert_equal(sum(counts.values()), 360 * 720 - 234145)
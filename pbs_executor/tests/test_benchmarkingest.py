@@ -10,6 +10,7 @@ from . import (ingest_file, benchmark_file, log_file, data_dir,
 
 
 variable_name = 'lai'
+catalog_file = 'test_ingest_catalog.sqlite'
 permissions = '775'
 
 
@@ -22,7 +23,7 @@ def teardown_module():
     shutil.rmtree(data_dir)
     if os.path.exists(data_link_dir):
         shutil.rmtree(data_link_dir)
-    for f in [ingest_file, benchmark_file, log_file]:
+    for f in [ingest_file, benchmark_file, log_file, catalog_file]:
         try:
             os.remove(f)
         except:
@@ -129,3 +130,35 @@ def test_move_file_exists_overwrite():
                                             link_name)))
     assert_true(os.path.isfile(log_file))
     assert_false(is_in_file(log_file, 'File Exists'))
+
+
+def test_move_catalog():
+    make_benchmark_files()
+    x = BenchmarkIngestTool()
+    x.load(ingest_file)
+    x.overwrite_files = True
+    x.catalog = True
+    x.catalog_file = catalog_file
+    f = x.ingest_files[0]
+    f.is_verified = True
+    f.data = variable_name
+    x.move()
+    records = x.get_catalog().find(variable=variable_name)
+    assert_equal(len(records), 1)
+    assert_equal(records[0]['path'], f.target)
+    assert_equal(records[0]['source'], x.source_name)
+    assert_equal(records[0]['kind'], 'benchmark')
+
+
+def test_move_catalog_file_exists():
+    make_benchmark_files()
+    x = BenchmarkIngestTool()
+    x.load(ingest_file)
+    x.catalog = True
+    x.catalog_file = catalog_file
+    f = x.ingest_files[0]
+    f.is_verified = True
+    f.data = variable_name
+    x.move()
+    assert_false(os.path.isfile(benchmark_file))
+    assert_true(is_in_file(log_file, 'File Exists'))
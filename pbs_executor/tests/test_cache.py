@@ -0,0 +1,88 @@
+"""Tests for the cache module."""
+
+import os
+import time
+from nose.tools import assert_true, assert_equal
+from pbs_executor.cache import VerificationCache, identity
+
+
+cache_file = 'test_cache.sqlite'
+files = ['test_cache_{}.nc'.format(i) for i in range(3)]
+rules = 'ModelVerificationTool/1/is_netcdf'
+result = {'error': None, 'fields': {'model_name': 'SiBCASA'}, 'timings': {}}
+
+
+def setup_module():
+    for name in files:
+        with open(name, 'w') as fp:
+            fp.write('This is a test file.\n')
+
+
+def teardown_module():
+    for name in files + [cache_file]:
+        if os.path.exists(name):
+            os.remove(name)
+
+
+def test_identity():
+    key = identity(files[0])
+    assert_equal(key[0], os.path.abspath(files[0]))
+    assert_equal(key[1], os.path.getsize(files[0]))
+
+
+def test_identity_missing_file():
+    assert_true(identity('not_a_file.nc') is None)
+
+
+def test_put_get():
+    x = VerificationCache(cache_file)
+    x.clear()
+    x.put(files[0], rules, result)
+    assert_equal(x.get(files[0], rules), result)
+    assert_true(x.get(files[1], rules) is None)
+    x.close()
+
+
+def test_persistence():
+    x = VerificationCache(cache_file)
+    x.clear()
+    x.put(files[0], rules, result)
+    x.close()
+    x = VerificationCache(cache_file)
+    assert_equal(x.get(files[0], rules), result)
+    x.close()
+
+
+def test_rules_changed():
+    x = VerificationCache(cache_file)
+    x.clear()
+    x.put(files[0], rules, result)
+    assert_true(x.get(files[0], rules + ',has_units') is None)
+    assert_equal(x.count(), 0)
+    x.close()
+
+
+def test_file_changed():
+    x = VerificationCache(cache_file)
+    x.clear()
+    x.put(files[1], rules, result)
+    with open(files[1], 'a') as fp:
+        fp.write('More data.\n')
+    assert_true(x.get(files[1], rules) is None)
+    x.close()
+
+
+def test_eviction():
+    x = VerificationCache(cache_file, max_entries=2)
+    x.clear()
+    x.put(files[0], rules, result)
+    time.sleep(0.01)
+    x.put(files[1], rules, result)
+    time.sleep(0.01)
+    x.get(files[0], rules)
+    time.sleep(0.01)
+    x.put(files[2], rules, result)
+    assert_equal(x.count(), 2)
+    assert_true(x.get(files[1], rules) is None)
+    assert_equal(x.get(files[0], rules), result)
+    x.close()
@@ -0,0 +1,77 @@
+"""Tests for the catalog module."""
+
+import os
+import shutil
+from nose.tools import raises, assert_true, assert_false, assert_equal
+from pbs_executor.catalog import Catalog
+
+
+catalog_file = 'test_catalog.sqlite'
+models_dir = 'test_catalog_models'
+model_name = 'SiBCASA'
+model_file = 'gpp_Lmon_SiBCASA_historical_r1i1p1.nc'
+
+
+def setup_module():
+    os.makedirs(os.path.join(models_dir, model_name))
+    with open(os.path.join(models_dir, model_name, model_file), 'w') as fp:
+        fp.write('This is a test model output file.\n')
+
+
+def teardown_module():
+    shutil.rmtree(models_dir)
+    os.remove(catalog_file)
+
+
+def test_init():
+    x = Catalog(catalog_file)
+    assert_true(os.path.isfile(catalog_file))
+    x.close()
+
+
+def test_add():
+    x = Catalog(catalog_file)
+    x.add('foo.nc', model='foo', size=1, mtime=0.0)
+    assert_true(x.contains('foo.nc'))
+    assert_false(x.contains('bar.nc'))
+    x.close()
+
+
+def test_persistence():
+    x = Catalog(catalog_file)
+    assert_true(x.contains('foo.nc'))
+    x.close()
+
+
+@raises(ValueError)
+def test_add_unknown_field():
+    x = Catalog(catalog_file)
+    x.add('foo.nc', color='blue', size=1, mtime=0.0)
+
+
+def test_find():
+    x = Catalog(catalog_file)
+    x.add('bar.nc', model='bar', variable='gpp', size=1, mtime=0.0)
+    records = x.find(model='bar')
+    assert_equal(len(records), 1)
+    assert_equal(records[0]['path'], 'bar.nc')
+    assert_equal(records[0]['variable'], 'gpp')
+    assert_equal(len(x.find()), x.count())
+    x.close()
+
+
+def test_remove():
+    x = Catalog(catalog_file)
+    x.remove('bar.nc')
+    assert_false(x.contains('bar.nc'))
+    x.close()
+
+
+def test_scan():
+    x = Catalog(catalog_file)
+    assert_equal(x.scan(models_dir, 'model', project='PBS'), 1)
+    records = x.find(model=model_name)
+    assert_equal(len(records), 1)
+    assert_equal(records[0]['variable'], 'gpp')
+    assert_equal(records[0]['project'], 'PBS')
+    x.close()
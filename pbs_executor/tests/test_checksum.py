@@ -0,0 +1,46 @@
+"""Tests for the checksum module."""
+
+import os
+import hashlib
+from nose.tools import assert_equal, assert_not_equal
+from pbs_executor.checksum import hash_file, hash_file_chunked, chunked_type
+
+
+src_file = 'test_checksum.txt'
+contents = b'0123456789' * 1000
+digest = hashlib.sha256(contents).hexdigest()
+
+
+def setup_module():
+    with open(src_file, 'wb') as fp:
+        fp.write(contents)
+
+
+def teardown_module():
+    os.remove(src_file)
+
+
+def test_hash_file():
+    assert_equal(hash_file(src_file), digest)
+
+
+def test_hash_file_md5():
+    assert_equal(hash_file(src_file, 'md5'), hashlib.md5(contents).hexdigest())
+
+
+def test_hash_file_chunked():
+    size = 3000
+    parts = [contents[i:i + size] for i in range(0, len(contents), size)]
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(hashlib.sha256(part).digest())
+    assert_equal(hash_file_chunked(src_file, jobs=3, size=size),
+                 h.hexdigest())
+
+
+def test_hash_file_chunked_differs():
+    assert_not_equal(hash_file_chunked(src_file, jobs=2), digest)
+
+
+def test_chunked_type():
+    assert_equal(chunked_type('sha256'), 'sha256-chunked-64M')
@@ -0,0 +1,125 @@
+"""Tests for the coverage module."""
+
+import os
+import shutil
+from datetime import datetime
+from nose.tools import raises, assert_true, assert_false, assert_equal
+from pbs_executor.coverage import CoverageIndex, parse_period
+from pbs_executor.filenames import parse_model
+from pbs_executor.ingest import ModelIngestTool
+from pbs_executor.file import IngestFile
+from pbs_executor.utils import is_in_file
+from pbs_executor import data_directory
+from . import log_file, models_dir
+
+
+coverage_file = 'test_coverage.json'
+nc_model_file = 'sftlf_fx_PBS-test_historical_r9i0p0.nc'
+template = 'tas_Amon_M_historical_r1i1p1_{}.nc'
+
+
+def teardown_module():
+    if os.path.exists(models_dir):
+        shutil.rmtree(models_dir)
+    for f in [coverage_file, log_file]:
+        if os.path.exists(f):
+            os.remove(f)
+
+
+def make_index(*periods):
+    x = CoverageIndex()
+    for period in periods:
+        name = template.format(period)
+        x.add(name, parse_model(name))
+    return x, CoverageIndex.key(parse_model(template.format(periods[0])))
+
+
+def test_parse_period():
+    assert_equal(parse_period('185001-200512'),
+                 (datetime(1850, 1, 1), datetime(2006, 1, 1)))
+    assert_equal(parse_period('1850-1851'),
+                 (datetime(1850, 1, 1), datetime(1852, 1, 1)))
+    assert_equal(parse_period('18500101-18501231'),
+                 (datetime(1850, 1, 1), datetime(1851, 1, 1)))
+    assert_equal(parse_period('1980-2000-clim')[1], datetime(2001, 1, 1))
+
+
+@raises(ValueError)
+def test_parse_period_invalid():
+    parse_period('185013-200512')
+
+
+def test_contiguous():
+    x, key = make_index('190001-194912', '185001-189912', '195001-200512')
+    assert_equal(len(x), 3)
+    assert_equal(x.gaps(key), [])
+    assert_true(x.covers(key, datetime(1850, 1, 1), datetime(2006, 1, 1)))
+
+
+def test_gaps():
+    x, key = make_index('185001-189912', '195001-200512')
+    assert_equal(x.gaps(key), [(datetime(1900, 1, 1), datetime(1950, 1, 1))])
+    assert_false(x.covers(key, datetime(1890, 1, 1), datetime(1960, 1, 1)))
+    name = template.format('190001-194912')
+    assert_equal(x.add(name, parse_model(name)), [])
+    assert_equal(x.gaps(key), [])
+
+
+def test_overlaps():
+    x, key = make_index('185001-189912', '190001-194912', '195001-200512')
+    name = template.format('189501-195412')
+    assert_equal(x.add(name, parse_model(name)),
+                 [template.format(p) for p in
+                  ['185001-189912', '190001-194912', '195001-200512']])
+    assert_equal(x.overlaps(key, datetime(2000, 1, 1), datetime(2010, 1, 1)),
+                 [template.format('195001-200512')])
+
+
+def test_readd_same_file():
+    x, key = make_index('185001-189912')
+    name = template.format('185001-189912')
+    assert_equal(x.add(name, parse_model(name)), [])
+    assert_equal(len(x), 1)
+
+
+def test_remove():
+    x, key = make_index('185001-189912', '190001-194912', '195001-200512')
+    x.remove(template.format('190001-194912'))
+    assert_equal(x.gaps(key), [(datetime(1900, 1, 1), datetime(1950, 1, 1))])
+
+
+def test_no_temporal_subset():
+    x = CoverageIndex()
+    assert_true(x.add(nc_model_file, parse_model(nc_model_file)) is None)
+    assert_equal(len(x), 0)
+
+
+def test_save_load():
+    x, key = make_index('185001-189912', '195001-200512')
+    x.path = coverage_file
+    x.save()
+    y = CoverageIndex(coverage_file)
+    assert_equal(len(y), 2)
+    assert_equal(y.gaps(key), x.gaps(key))
+    os.remove(coverage_file)
+
+
+def test_ingest():
+    periods = ['185001-189912', '195001-200512', '199001-200012']
+    names = ['sftlf_fx_PBS-test_historical_r9i0p0_{}.nc'.format(p)
+             for p in periods]
+    for name in names:
+        shutil.copy(os.path.join(data_directory, nc_model_file), name)
+    x = ModelIngestTool()
+    x.ilamb_root = os.getcwd()
+    x.dest_dir = models_dir
+    x.link_dir = ''
+    x.project_name = 'PBS'
+    x.coverage = True
+    x.coverage_file = coverage_file
+    x.ingest_files = [IngestFile(name) for name in names]
+    x.ingest()
+    assert_true(os.path.isfile(coverage_file))
+    assert_equal(len(x.get_coverage()), 3)
+    assert_true(is_in_file(log_file, 'Coverage Gaps'))
+    assert_true(is_in_file(log_file, 'overlaps the files'))
@@ -1,12 +1,13 @@
 """Tests for the file module."""
 
 import os
-from nose.tools import assert_true
+from nose.tools import raises, assert_true, assert_false, assert_equal
 from pbs_executor.file import IngestFile, Logger
 from . import log_file
 
 
 regions_file_nc = 'basins_0.5x0.5.nc'
+other_log_file = 'test_file_log.html'
 
 
 def setup_module():
@@ -14,7 +15,7 @@ def setup_module():
 
 
 def teardown_module():
-    for f in [log_file]:
+    for f in [log_file, other_log_file]:
         try:
             os.remove(f)
         except:
@@ -55,3 +56,68 @@ def test_logger_write():
     x = Logger()
     x.write()
     assert_true(os.path.isfile(log_file))
+
+
+def _read_log():
+    with open(log_file, 'r') as fp:
+        return fp.read()
+
+
+@raises(ValueError)
+def test_logger_bad_flush_policy():
+    Logger(flush_policy='never')
+
+
+def test_logger_flush_count():
+    x = Logger(flush_policy='count', flush_count=2)
+    x.add('foo')
+    assert_false('foo' in _read_log())
+    x.add('bar')
+    assert_true('foo' in _read_log())
+    assert_true('bar' in _read_log())
+
+
+def test_logger_flush_close():
+    x = Logger(flush_policy='close')
+    x.add('foo')
+    assert_false('foo' in _read_log())
+    x.close()
+    assert_true('foo' in _read_log())
+
+
+def test_logger_flush_time():
+    x = Logger(flush_policy='time', flush_interval=0.0)
+    x.add('foo')
+    assert_true('foo' in _read_log())
+
+
+def test_logger_same_output():
+    messages = ['## Heading', 'foo `bar`', 'baz']
+    x = Logger(title='Test')
+    for msg in messages:
+        x.add(msg)
+    expected = _read_log()
+    x = Logger(title='Test', flush_policy='count', flush_count=2)
+    for msg in messages:
+        x.add(msg)
+    x.close()
+    assert_equal(_read_log(), expected)
+    x.write()
+    assert_equal(_read_log(), expected)
+
+
+def test_logger_path():
+    x = Logger(path=other_log_file)
+    x.add('A message')
+    with open(other_log_file, 'r') as fp:
+        assert_true('A message' in fp.read())
+
+
+def test_logger_keeps_only_buffer():
+    x = Logger(flush_policy='count', flush_count=2)
+    x.add('foo')
+    assert_true('foo' in x.data)
+    x.add('bar')
+    assert_equal(x._buffer, [])
+    assert_false('data' in vars(x))
+    assert_true('foo' in x.data and 'bar' in x.data)
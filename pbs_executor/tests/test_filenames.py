@@ -0,0 +1,86 @@
+"""Tests for the filenames module."""
+
+from nose.tools import assert_true, assert_equal
+from pbs_executor.filenames import (parse_model, parse_benchmark,
+                                    explain_model, parse_many, classify,
+                                    is_temporal_subset)
+
+
+model_file = 'tas_Amon_HADCM3_historical_r1i1p1_185001-200512.nc'
+fx_file = 'sftlf_fx_PBS-test_historical_r9i0p0.nc'
+
+
+def test_parse_model():
+    fields = parse_model('/tmp/uploads/' + model_file)
+    assert_equal(fields, {'variable_name': 'tas', 'mip_table': 'Amon',
+                          'model_name': 'HADCM3',
+                          'experiment': 'historical',
+                          'ensemble_member': 'r1i1p1',
+                          'temporal_subset': '185001-200512'})
+
+
+def test_parse_model_no_temporal_subset():
+    fields = parse_model(fx_file)
+    assert_equal(fields['model_name'], 'PBS-test')
+    assert_true(fields['temporal_subset'] is None)
+
+
+def test_parse_model_climatology():
+    fields = parse_model('tas_Amon_HADCM3_historical_r1i1p1_1980-2000-clim.nc')
+    assert_equal(fields['temporal_subset'], '1980-2000-clim')
+
+
+def test_parse_model_invalid():
+    for name in ['tas_Amon_HADCM3_historical_1_185001-200512.nc',
+                 'tas_Amon_HADCM3_historical_r1i1p1_185001-2005.nc',
+                 'tas_Amon_HADCM3_historical_r1i1p1_200512-185001.nc',
+                 'tas_Amon_HADCM3_historical_r1i1p1.txt',
+                 'tas_Amon_HADCM3.nc',
+                 'test_model.txt']:
+        assert_true(parse_model(name) is None, name)
+        assert_true(explain_model(name) is not None, name)
+
+
+def test_explain_model():
+    assert_true(explain_model(model_file) is None)
+    msg = explain_model('tas_Amon_HADCM3_historical_run1.nc')
+    assert_true('Ensemble member' in msg)
+    msg = explain_model('tas_Amon_HADCM3_historical_r1i1p1_18500-20051.nc')
+    assert_true('Temporal subset' in msg)
+
+
+def test_is_temporal_subset():
+    assert_true(is_temporal_subset('1850', '2005'))
+    assert_true(is_temporal_subset('185001010000', '200512312359'))
+    assert_true(not is_temporal_subset('18500', '20051'))
+
+
+def test_parse_benchmark():
+    assert_equal(parse_benchmark('swe.nc'),
+                 {'variable_name': 'swe', 'resolution': None})
+    assert_equal(parse_benchmark('tas_0.5x0.5.nc')['resolution'], '0.5x0.5')
+    assert_true(parse_benchmark('tas_000001.nc') is None)
+
+
+def test_parse_many():
+    names = [model_file, 'bad.nc', fx_file]
+    results = parse_many(names)
+    assert_equal(results[0], parse_model(model_file))
+    assert_true(results[1] is None)
+    assert_equal(results[2], parse_model(fx_file))
+
+
+def test_classify():
+    names = [model_file, 'swe.nc', 'tropics.txt', 'tas_0.5x0.5.nc']
+    groups = classify(names)
+    assert_equal(groups['model'], [model_file])
+    assert_equal(groups['benchmark'], ['swe.nc', 'tas_0.5x0.5.nc'])
+    assert_equal(groups['invalid'], ['tropics.txt'])
+
+
+def test_parse_many_large():
+    names = ['tas_Amon_M{}_historical_r{}i1p1_185001-200512.nc'.format(
+        i % 50, i) for i in range(20000)]
+    results = parse_many(names)
+    assert_true(all(r is not None for r in results))
+    assert_equal(results[-1]['ensemble_member'], 'r19999i1p1')
@@ -0,0 +1,24 @@
+"""Tests that heavy dependencies are loaded only when used."""
+
+import sys
+import subprocess
+from nose.tools import assert_equal
+
+
+heavy = ['netCDF4', 'numpy', 'yaml', 'markdown', 'sqlite3']
+
+
+def loaded_by(module):
+    code = ('import sys; import {}; '
+            'print(",".join(n for n in {!r} if n in sys.modules))'
+            .format(module, heavy))
+    out = subprocess.check_output([sys.executable, '-c', code])
+    return [name for name in out.decode('utf-8').strip().split(',') if name]
+
+
+def test_import_ingest():
+    assert_equal(loaded_by('pbs_executor.ingest'), [])
+
+
+def test_import_watch():
+    assert_equal(loaded_by('pbs_executor.watch'), [])
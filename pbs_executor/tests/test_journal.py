@@ -0,0 +1,226 @@
+"""Tests for the journal module."""
+
+import os
+import shutil
+from nose.tools import raises, assert_true, assert_false, assert_equal
+from pbs_executor.journal import Journal
+from pbs_executor.ingest import ModelIngestTool
+from pbs_executor.file import IngestFile
+from pbs_executor import data_directory
+from . import log_file, models_dir, models_link_dir
+
+
+journal_file = 'test_journal.jsonl'
+nc_model_file = 'sftlf_fx_PBS-test_historical_r9i0p0.nc'
+names = ['sftlf_fx_PBS-test_historical_r{}i0p0.nc'.format(i)
+         for i in range(6)]
+model_name = 'PBS-test'
+
+
+def teardown_module():
+    for d in [models_dir, models_link_dir]:
+        if os.path.exists(d):
+            shutil.rmtree(d)
+    for f in names + [journal_file, log_file]:
+        if os.path.exists(f):
+            os.remove(f)
+
+
+def reset():
+    teardown_module()
+    for name in names:
+        shutil.copy(os.path.join(data_directory, nc_model_file), name)
+
+
+def make_tool():
+    x = ModelIngestTool()
+    x.ilamb_root = os.getcwd()
+    x.dest_dir = models_dir
+    x.link_dir = models_link_dir
+    x.project_name = 'PBS'
+    x.journal = True
+    x.journal_file = journal_file
+    x.journal_sync = False
+    x.ingest_files = [IngestFile(name) for name in names]
+    return x
+
+
+def target_of(name):
+    return os.path.join(os.getcwd(), models_dir, model_name, name)
+
+
+def link_of(name):
+    return os.path.join(models_link_dir, 'PBS', name)
+
+
+def test_record_and_state():
+    if os.path.exists(journal_file):
+        os.remove(journal_file)
+    j = Journal(journal_file, sync=False)
+    j.record('a.nc', 'verified', data='M')
+    j.record('b.nc', 'rejected', error='bad')
+    j.record('a.nc', 'placing', target='/store/a.nc')
+    j.close()
+    state = j.state()
+    assert_equal(list(state), [os.path.abspath('a.nc'),
+                               os.path.abspath('b.nc')])
+    a = state[os.path.abspath('a.nc')]
+    assert_equal(a['stage'], 'placing')
+    assert_equal(a['data'], 'M')
+    assert_equal(a['target'], '/store/a.nc')
+
+
+@raises(ValueError)
+def test_record_unknown_stage():
+    Journal(journal_file).record('a.nc', 'copied')
+
+
+def test_partial_line_ignored():
+    if os.path.exists(journal_file):
+        os.remove(journal_file)
+    j = Journal(journal_file)
+    j.record('a.nc', 'verified')
+    j.close()
+    with open(journal_file, 'a') as fp:
+        fp.write('{"file": "b.nc", "sta')
+    assert_equal(len(j.state()), 1)
+
+
+def test_compact():
+    if os.path.exists(journal_file):
+        os.remove(journal_file)
+    j = Journal(journal_file)
+    for stage in ['verified', 'placing', 'placed', 'linked']:
+        j.record('a.nc', stage)
+    j.compact()
+    assert_equal(len(list(j.records())), 1)
+    assert_equal(j.state()[os.path.abspath('a.nc')]['stage'], 'linked')
+
+
+def test_ingest_journals_stages():
+    reset()
+    x = make_tool()
+    x.ingest_files = x.ingest_files[:1]
+    x.ingest()
+    stages = [r['stage'] for r in x.get_journal().records()]
+    assert_equal(stages, ['verified', 'placing', 'placed', 'linked'])
+
+
+def test_resume():
+    reset()
+    x = make_tool()
+    x.ingest_files[5].name = 'not_a_model_file.nc'
+    j = x.get_journal()
+    # 0 finished, 1 verified, 2 cut off after the copy, 3 cut off
+    # before the copy, 4 placed but not linked, 5 rejected.
+    for i in range(5):
+        j.record(names[i], 'verified', fields={}, data=model_name)
+    j.record(names[0], 'placing', target=target_of(names[0]))
+    j.record(names[0], 'placed', target=target_of(names[0]))
+    j.record(names[0], 'linked')
+    os.makedirs(os.path.join(models_dir, model_name))
+    shutil.move(names[0], target_of(names[0]))
+    j.record(names[2], 'placing', target=target_of(names[2]))
+    shutil.move(names[2], target_of(names[2]))
+    tmp = os.path.join(models_dir, model_name, '.{}.1.tmp'.format(names[3]))
+    open(tmp, 'w').close()
+    j.record(names[3], 'placing', target=target_of(names[3]))
+    j.record(names[4], 'placing', target=target_of(names[4]))
+    shutil.move(names[4], target_of(names[4]))
+    j.record(names[4], 'placed', target=target_of(names[4]))
+    j.record(x.ingest_files[5].name, 'rejected', error='bad name')
+    j.close()
+
+    x = make_tool()
+    x.ingest_files[5].name = 'not_a_model_file.nc'
+    x.resume()
+    for name in names[1:5]:
+        assert_true(os.path.isfile(target_of(name)))
+        assert_true(os.path.islink(link_of(name)))
+    assert_false(os.path.islink(link_of(names[0])))
+    assert_false(os.path.exists(tmp))
+    assert_equal(x.metrics.totals.get('verify'), None)
+    with open(log_file, 'r') as fp:
+        log = fp.read()
+    assert_true('2 files had finished, 1 were verified but not moved, '
+                '2 were being\nmoved, 1 were moved but not linked, and 0 '
+                'had not been started.' in log)
+    assert_true('File Move Resumed' in log)
+    state = x.get_journal().state()
+    assert_equal(len(list(x.get_journal().records())), len(state))
+    assert_equal(state[os.path.abspath(names[3])]['stage'], 'linked')
+
+
+def test_resume_lost_and_new_files():
+    reset()
+    x = make_tool()
+    x.ingest_files = x.ingest_files[:2]
+    j = x.get_journal()
+    j.record(names[0], 'verified', fields={}, data=model_name)
+    j.record(names[0], 'placing', target=target_of(names[0]))
+    j.close()
+    os.remove(names[0])
+    x.resume()
+    with open(log_file, 'r') as fp:
+        log = fp.read()
+    assert_true('File Lost' in log)
+    assert_true(os.path.islink(link_of(names[1])))
+    state = x.get_journal().state()
+    assert_equal(state[os.path.abspath(names[0])]['stage'], 'failed')
+    assert_equal(state[os.path.abspath(names[1])]['stage'], 'linked')
+
+
+def test_ingest_starts_new_journal():
+    reset()
+    x = make_tool()
+    x.get_journal().record('old.nc', 'linked')
+    x.ingest_files = x.ingest_files[:1]
+    x.ingest()
+    state = x.get_journal().state()
+    assert_equal(list(state), [os.path.abspath(names[0])])
+    assert_true(state[os.path.abspath(names[0])]['upload'] is not None)
+
+
+def test_resume_new_upload():
+    reset()
+    x = make_tool()
+    x.ingest_files = x.ingest_files[:1]
+    x.ingest()
+    assert_false(os.path.exists(names[0]))
+    shutil.copy(os.path.join(data_directory, nc_model_file), names[0])
+    with open(names[0], 'ab') as fp:
+        fp.write(b'\0')
+    x = make_tool()
+    x.overwrite_files = True
+    x.ingest_files = x.ingest_files[:1]
+    x.resume()
+    with open(log_file, 'r') as fp:
+        log = fp.read()
+    assert_true('0 files had finished' in log)
+    assert_false(os.path.exists(names[0]))
+    assert_equal(os.path.getsize(target_of(names[0])),
+                 os.path.getsize(os.path.join(data_directory,
+                                              nc_model_file)) + 1)
+
+
+def test_resume_overwrite_not_finished():
+    reset()
+    os.makedirs(os.path.join(models_dir, model_name))
+    with open(target_of(names[0]), 'w') as fp:
+        fp.write('An old version.\n')
+    x = make_tool()
+    x.overwrite_files = True
+    x.ingest_files = x.ingest_files[:1]
+    j = x.get_journal()
+    j.record(names[0], 'verified', fields={}, data=model_name)
+    j.record(names[0], 'placing', target=target_of(names[0]),
+             replaces=True)
+    j.close()
+    x.resume()
+    with open(log_file, 'r') as fp:
+        log = fp.read()
+    assert_false('File Move Resumed' in log)
+    assert_false(os.path.exists(names[0]))
+    assert_equal(os.path.getsize(target_of(names[0])),
+                 os.path.getsize(os.path.join(data_directory,
+                                              nc_model_file)))
@@ -0,0 +1,159 @@
+"""Tests for the links module."""
+
+import os
+import shutil
+from nose.tools import raises, assert_true, assert_false, assert_equal
+from pbs_executor.links import list_dir, find_files, replace_symlink, Linker
+from pbs_executor.ingest import BenchmarkIngestTool
+
+
+store_dir = 'test_links_DATA'
+link_dir = 'test_links_DATA-by-project'
+files = [os.path.join(store_dir, 'lai', 'CSDMS', 'lai_0.5x0.5.nc'),
+         os.path.join(store_dir, 'lai', 'MODIS', 'lai_0.5x0.5.nc'),
+         os.path.join(store_dir, 'gpp', 'FLUXNET', 'gpp.nc')]
+
+
+def setup_module():
+    for name in files:
+        os.makedirs(os.path.dirname(name))
+        with open(name, 'w') as fp:
+            fp.write('This is a test benchmark data file.\n')
+
+
+def teardown_module():
+    for d in [store_dir, link_dir]:
+        if os.path.exists(d):
+            shutil.rmtree(d)
+
+
+def test_list_dir():
+    entries = list_dir(os.path.join(store_dir, 'lai'))
+    assert_equal([e[0] for e in entries], ['CSDMS', 'MODIS'])
+    assert_true(all(e[2] for e in entries))
+
+
+def test_find_files():
+    assert_equal(find_files(store_dir, 2, jobs=2), sorted(files))
+
+
+def test_find_files_missing_root():
+    assert_equal(find_files('not_a_directory', 1), [])
+
+
+def test_replace_symlink():
+    dst = os.path.join(store_dir, 'link.nc')
+    assert_true(replace_symlink(os.path.abspath(files[0]), dst))
+    assert_false(replace_symlink(os.path.abspath(files[0]), dst))
+    assert_true(replace_symlink(os.path.abspath(files[1]), dst))
+    assert_equal(os.readlink(dst), os.path.abspath(files[1]))
+    assert_equal([e[0] for e in list_dir(store_dir)],
+                 ['gpp', 'lai', 'link.nc'])
+    os.remove(dst)
+
+
+@raises(OSError)
+def test_replace_symlink_keeps_file():
+    dst = os.path.join(store_dir, 'not_a_link.nc')
+    with open(dst, 'w') as fp:
+        fp.write('Not a link.\n')
+    try:
+        replace_symlink(os.path.abspath(files[0]), dst)
+    finally:
+        assert_false(os.path.islink(dst))
+        os.remove(dst)
+
+
+def test_linker():
+    x = Linker()
+    for i, name in enumerate(files):
+        x.add(os.path.abspath(name),
+              os.path.join(link_dir, 'PBS', 'link{}.nc'.format(i)))
+    assert_equal(x.commit(), 3)
+    assert_equal(x.links, [])
+    assert_equal(len(os.listdir(os.path.join(link_dir, 'PBS'))), 3)
+    shutil.rmtree(link_dir)
+
+
+def test_linker_continues_past_error():
+    project_dir = os.path.join(link_dir, 'PBS')
+    os.makedirs(project_dir)
+    blocked = os.path.join(project_dir, 'link0.nc')
+    with open(blocked, 'w') as fp:
+        fp.write('Not a link.\n')
+    x = Linker()
+    for i, name in enumerate(files):
+        x.add(os.path.abspath(name),
+              os.path.join(project_dir, 'link{}.nc'.format(i)))
+    errors = []
+    assert_equal(x.commit(errors), 2)
+    assert_equal([dst for src, dst, e in errors], [blocked])
+    assert_false(os.path.islink(blocked))
+    assert_true(os.path.islink(os.path.join(project_dir, 'link2.nc')))
+    shutil.rmtree(link_dir)
+
+
+@raises(OSError)
+def test_linker_raises_after_links():
+    project_dir = os.path.join(link_dir, 'PBS')
+    os.makedirs(project_dir)
+    with open(os.path.join(project_dir, 'link0.nc'), 'w') as fp:
+        fp.write('Not a link.\n')
+    x = Linker()
+    for i, name in enumerate(files):
+        x.add(os.path.abspath(name),
+              os.path.join(project_dir, 'link{}.nc'.format(i)))
+    try:
+        x.commit()
+    finally:
+        assert_true(os.path.islink(os.path.join(project_dir, 'link2.nc')))
+        shutil.rmtree(link_dir)
+
+
+def test_rebuild_links():
+    x = BenchmarkIngestTool()
+    x.ilamb_root = os.getcwd()
+    x.dest_dir = store_dir
+    x.link_dir = link_dir
+    x.project_name = 'PBS'
+    project_dir = os.path.join(link_dir, 'PBS')
+    os.makedirs(project_dir)
+    stale = os.path.join(project_dir, 'old.nc.CSDMS')
+    os.symlink(os.path.join(os.getcwd(), store_dir, 'old.nc'), stale)
+    x.rebuild_links(jobs=2)
+    assert_false(os.path.lexists(stale))
+    assert_equal(sorted(os.listdir(project_dir)),
+                 ['gpp.nc.FLUXNET', 'lai_0.5x0.5.nc.CSDMS',
+                  'lai_0.5x0.5.nc.MODIS'])
+    assert_equal(os.readlink(os.path.join(project_dir, 'gpp.nc.FLUXNET')),
+                 os.path.join(os.getcwd(), files[2]))
+    shutil.rmtree(link_dir)
+
+
+def test_rebuild_links_catalog():
+    catalog_file = 'test_links_catalog.sqlite'
+    x = BenchmarkIngestTool()
+    x.ilamb_root = os.getcwd()
+    x.dest_dir = store_dir
+    x.link_dir = link_dir
+    x.project_name = 'PBS'
+    x.catalog = True
+    x.catalog_file = catalog_file
+    x.get_catalog().add(os.path.abspath(files[2]), kind=x.kind,
+                        project='OTHER')
+    project_dir = os.path.join(link_dir, 'PBS')
+    os.makedirs(project_dir)
+    renamed = os.path.join(project_dir, 'renamed.nc')
+    os.symlink(os.path.abspath(files[0]), renamed)
+    try:
+        x.rebuild_links(jobs=2)
+        assert_true(os.path.islink(renamed))
+        assert_equal(sorted(os.listdir(project_dir)),
+                     ['lai_0.5x0.5.nc.CSDMS', 'lai_0.5x0.5.nc.MODIS',
+                      'renamed.nc'])
+        assert_equal(os.listdir(os.path.join(link_dir, 'OTHER')),
+                     ['gpp.nc.FLUXNET'])
+    finally:
+        x.get_catalog().close()
+        os.remove(catalog_file)
+        shutil.rmtree(link_dir)
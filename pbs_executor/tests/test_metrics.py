@@ -0,0 +1,106 @@
+"""Tests for the metrics module."""
+
+import os
+import json
+import shutil
+from nose.tools import raises, assert_true, assert_equal
+from pbs_executor.metrics import Metrics, load_hook
+from pbs_executor.ingest import ModelIngestTool
+from pbs_executor.file import IngestFile
+from pbs_executor import data_directory
+from . import log_file, models_dir
+
+
+metrics_file = 'test_metrics.jsonl'
+nc_model_file = 'sftlf_fx_PBS-test_historical_r9i0p0.nc'
+
+
+def teardown_module():
+    if os.path.exists(models_dir):
+        shutil.rmtree(models_dir)
+    for f in [metrics_file, nc_model_file, log_file]:
+        if os.path.exists(f):
+            os.remove(f)
+
+
+def test_record():
+    x = Metrics()
+    x.record('place', 0.5, nbytes=100, file='a.nc')
+    x.record('place', 0.25, nbytes=50, file='b.nc')
+    assert_equal(x.totals['place'],
+                 {'count': 2, 'seconds': 0.75, 'bytes': 150})
+
+
+def test_path():
+    if os.path.exists(metrics_file):
+        os.remove(metrics_file)
+    x = Metrics(metrics_file)
+    x.record('verify', 0.1, file='a.nc', checks={'is_netcdf': 0.1})
+    x.record('place', 0.2, nbytes=10, file='a.nc')
+    with open(metrics_file, 'r') as fp:
+        records = [json.loads(line) for line in fp]
+    assert_equal([r['stage'] for r in records], ['verify', 'place'])
+    assert_equal(records[0]['checks'], {'is_netcdf': 0.1})
+    assert_equal(records[1]['bytes'], 10)
+
+
+def test_hook():
+    records = []
+    x = Metrics()
+    x.add_hook(records.append)
+    x.record('link', 0.1, file='a.nc')
+    assert_equal(len(records), 1)
+    assert_equal(records[0]['file'], 'a.nc')
+
+
+def test_timer():
+    x = Metrics()
+    with x.timer('makedirs', file='a.nc'):
+        pass
+    assert_equal(x.totals['makedirs']['count'], 1)
+    assert_true(x.totals['makedirs']['seconds'] >= 0.0)
+
+
+def test_merge():
+    x = Metrics()
+    x.record('place', 0.5, nbytes=100)
+    y = Metrics()
+    y.record('place', 0.25, nbytes=50)
+    y.record('verify', 1.0)
+    x.merge(y.totals)
+    assert_equal(x.totals['place'], {'count': 2, 'seconds': 0.75,
+                                     'bytes': 150})
+    assert_equal(x.totals['verify']['count'], 1)
+
+
+def test_summary():
+    x = Metrics()
+    x.record('place', 0.5, nbytes=100)
+    s = x.summary()
+    assert_true(s.startswith('## Timing Summary'))
+    assert_true('    place' in s)
+
+
+def test_load_hook():
+    assert_equal(load_hook('os.path:join'), os.path.join)
+
+
+@raises(ImportError)
+def test_load_hook_missing_module():
+    load_hook('pbs_executor.no_such_module:hook')
+
+
+def test_ingest():
+    shutil.copy(os.path.join(data_directory, nc_model_file), os.curdir)
+    x = ModelIngestTool()
+    x.ilamb_root = os.getcwd()
+    x.dest_dir = models_dir
+    x.link_dir = ''
+    x.project_name = 'PBS'
+    x.overwrite_files = True
+    x.ingest_files = [IngestFile(nc_model_file)]
+    x.ingest()
+    for stage in ['verify', 'makedirs', 'place', 'log']:
+        assert_equal(x.metrics.totals[stage]['count'], 1)
+    assert_equal(x.metrics.totals['place']['bytes'],
+                 os.path.getsize(x.ingest_files[0].target))
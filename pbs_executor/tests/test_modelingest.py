@@ -4,12 +4,17 @@ import os
 import shutil
 from nose.tools import assert_true, assert_false, assert_equal
 from pbs_executor.ingest import ModelIngestTool
+from pbs_executor.file import IngestFile
+from pbs_executor import data_directory
 from pbs_executor.utils import is_in_file, check_permissions
 from . import (ingest_file, model_file, log_file, models_dir,
                models_link_dir, make_model_files)
 
 
 model_name = 'SiBCASA'
+nc_model_file = 'sftlf_fx_PBS-test_historical_r9i0p0.nc'
+store_dir = 'STORE'
+cache_file = 'test_modelingest_cache.sqlite'
 permissions = '775'
 
 
@@ -20,9 +25,10 @@ def setup_module():
 
 def teardown_module():
     shutil.rmtree(models_dir)
-    if os.path.exists(models_link_dir):
-        shutil.rmtree(models_link_dir)
-    for f in [ingest_file, model_file, log_file]:
+    for d in [models_link_dir, store_dir]:
+        if os.path.exists(d):
+            shutil.rmtree(d)
+    for f in [ingest_file, model_file, log_file, nc_model_file, cache_file]:
         try:
             os.remove(f)
         except:
@@ -65,6 +71,46 @@ def test_verify():
     assert_true(os.path.isfile(log_file))
 
 
+def _verify_parallel(pool_type):
+    make_model_files()
+    shutil.copy(os.path.join(data_directory, nc_model_file), os.curdir)
+    x = ModelIngestTool()
+    x.jobs = 2
+    x.pool_type = pool_type
+    x.ingest_files = [IngestFile(nc_model_file), IngestFile(model_file)]
+    x.verify()
+    assert_true(x.ingest_files[0].is_verified)
+    assert_equal(x.ingest_files[0].data, 'PBS-test')
+    assert_false(x.ingest_files[1].is_verified)
+    assert_true(os.path.isfile(nc_model_file))
+    assert_false(os.path.isfile(model_file))
+    os.remove(nc_model_file)
+
+
+def test_verify_thread_pool():
+    _verify_parallel('thread')
+
+
+def test_verify_process_pool():
+    _verify_parallel('process')
+
+
+def test_verify_cache():
+    shutil.copy(os.path.join(data_directory, nc_model_file), os.curdir)
+    for i in range(2):
+        x = ModelIngestTool()
+        x.ilamb_root = os.getcwd()
+        x.verify_cache = True
+        x.verify_cache_file = cache_file
+        x.ingest_files = [IngestFile(nc_model_file)]
+        x.verify()
+        assert_true(x.ingest_files[0].is_verified)
+        assert_equal(x.ingest_files[0].data, 'PBS-test')
+    assert_equal(x.ingest_files[0].timings, {})
+    assert_equal(x.get_verify_cache().count(), 1)
+    os.remove(nc_model_file)
+
+
 def test_move_file_new():
     make_model_files()
     x = ModelIngestTool()
@@ -119,3 +165,43 @@ def test_move_file_exists_overwrite():
                                             x.project_name, f.name)))
     assert_true(os.path.isfile(log_file))
     assert_false(is_in_file(log_file, 'File Exists'))
+
+
+def test_move_dedup_unchanged():
+    for i in range(2):
+        make_model_files()
+        x = ModelIngestTool()
+        x.load(ingest_file)
+        x.overwrite_files = True
+        x.dedup = True
+        x.store_dir = store_dir
+        f = x.ingest_files[0]
+        f.is_verified = True
+        f.data = model_name
+        x.move()
+    assert_false(os.path.isfile(model_file))
+    assert_true(os.path.isfile(os.path.join(models_dir, model_name,
+                                            model_file)))
+    assert_true(is_in_file(log_file, 'File Unchanged'))
+
+
+def test_move_link_blocked():
+    make_model_files()
+    x = ModelIngestTool()
+    x.load(ingest_file)
+    x.overwrite_files = True
+    f = x.ingest_files[0]
+    f.is_verified = True
+    f.data = model_name
+    dst = x.link_path(os.path.join(models_dir, model_name, f.name))
+    if os.path.lexists(dst):
+        os.remove(dst)
+    with open(dst, 'w') as fp:
+        fp.write('Not a link.\n')
+    try:
+        x.move()
+    finally:
+        os.remove(dst)
+    assert_true(os.path.isfile(os.path.join(models_dir, model_name, f.name)))
+    assert_true(is_in_file(log_file, 'File Moved'))
+    assert_true(is_in_file(log_file, 'Link Failed'))
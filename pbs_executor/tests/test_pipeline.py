@@ -0,0 +1,118 @@
+"""Tests for the pipeline module."""
+
+import os
+import shutil
+import threading
+from nose.tools import raises, assert_true, assert_false, assert_equal
+from pbs_executor.pipeline import Pipeline
+from pbs_executor.ingest import ModelIngestTool
+from pbs_executor.file import IngestFile
+from pbs_executor.sources import FileStream
+from pbs_executor import data_directory
+from . import log_file, models_dir, models_link_dir
+
+
+nc_model_file = 'sftlf_fx_PBS-test_historical_r9i0p0.nc'
+model_name = 'PBS-test'
+bad_files = ['test_pipeline_{}.txt'.format(i) for i in range(5)]
+
+
+def make_tool():
+    shutil.copy(os.path.join(data_directory, nc_model_file), os.curdir)
+    for name in bad_files:
+        with open(name, 'w') as fp:
+            fp.write('This is not a netCDF file.\n')
+    x = ModelIngestTool()
+    x.ilamb_root = os.getcwd()
+    x.dest_dir = models_dir
+    x.link_dir = models_link_dir
+    x.project_name = 'PBS'
+    x.overwrite_files = True
+    x.ingest_files = [IngestFile(name) for name in bad_files]
+    x.ingest_files.insert(2, IngestFile(nc_model_file))
+    return x
+
+
+def teardown_module():
+    for d in [models_dir, models_link_dir]:
+        if os.path.exists(d):
+            shutil.rmtree(d)
+    for f in bad_files + [nc_model_file, log_file]:
+        if os.path.exists(f):
+            os.remove(f)
+
+
+def test_run():
+    x = make_tool()
+    Pipeline(x, jobs={'verify': 3, 'place': 2}, queue_size=2).run()
+    for f in x.ingest_files:
+        if f.name == nc_model_file:
+            assert_true(f.is_verified)
+            assert_equal(f.target, os.path.join(os.getcwd(), models_dir,
+                                                model_name, nc_model_file))
+        else:
+            assert_false(f.is_verified)
+            assert_true(f.target is None)
+        assert_false(os.path.exists(f.name))
+    assert_true(os.path.islink(os.path.join(models_link_dir, 'PBS',
+                                            nc_model_file)))
+
+
+def test_log_order():
+    x = make_tool()
+    Pipeline(x, jobs={'verify': 4}).run()
+    with open(log_file, 'r') as fp:
+        log = fp.read()
+    positions = [log.index(f.name) for f in x.ingest_files]
+    assert_equal(positions, sorted(positions))
+
+
+def test_ingest_with_pipeline():
+    x = make_tool()
+    x.pipeline = True
+    x.ingest()
+    assert_true(x.ingest_files[2].is_verified)
+    assert_true(x.ingest_files[2].target is not None)
+
+
+def test_ingest_with_pipeline_transform():
+    x = make_tool()
+    x.pipeline = True
+    x.transform = True
+    x.ingest()
+    assert_true(x.ingest_files[2].target is not None)
+    with open(log_file, 'r') as fp:
+        assert_true('File Transformed' in fp.read())
+
+
+class FailingTool(ModelIngestTool):
+
+    def place(self, ingest_file):
+        raise RuntimeError('place failed')
+
+
+@raises(RuntimeError)
+def test_run_raises_stage_error():
+    x = make_tool()
+    y = FailingTool()
+    y.ingest_files = x.ingest_files
+    Pipeline(y).run()
+
+
+@raises(IOError)
+def test_run_raises_input_error():
+    x = make_tool()
+    x.ingest_files = FileStream(['@test_pipeline_missing.txt'])
+    Pipeline(x).run()
+
+
+def test_lazy_resources_created_once():
+    x = make_tool()
+    found = []
+    threads = [threading.Thread(target=lambda: found.append(x.get_coverage()))
+               for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert_equal(len(set(id(c) for c in found)), 1)
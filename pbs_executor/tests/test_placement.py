@@ -0,0 +1,108 @@
+"""Tests for the placement module."""
+
+import os
+import shutil
+import hashlib
+from nose.tools import raises, assert_true, assert_false, assert_equal
+from pbs_executor.placement import (place_file, choose_strategy,
+                                    is_same_filesystem, Placement)
+
+
+src_file = 'test_placement.txt'
+dst_dir = 'placement'
+dst_file = os.path.join(dst_dir, src_file)
+contents = 'This is a test file.\n'
+
+
+def make_src_file():
+    with open(src_file, 'w') as fp:
+        fp.write(contents)
+
+
+def setup_module():
+    make_src_file()
+    os.mkdir(dst_dir)
+
+
+def teardown_module():
+    shutil.rmtree(dst_dir)
+    if os.path.exists(src_file):
+        os.remove(src_file)
+
+
+def test_is_same_filesystem():
+    make_src_file()
+    assert_true(is_same_filesystem(src_file, dst_dir))
+
+
+def test_choose_strategy_auto():
+    make_src_file()
+    assert_equal(choose_strategy(src_file, dst_dir), 'rename')
+
+
+@raises(ValueError)
+def test_choose_strategy_unknown():
+    make_src_file()
+    choose_strategy(src_file, dst_dir, strategy='teleport')
+
+
+def _place(strategy, expected):
+    make_src_file()
+    p = place_file(src_file, dst_file, strategy=strategy, overwrite=True)
+    assert_true(isinstance(p, Placement))
+    assert_true(p.strategy in expected)
+    assert_equal(p.nbytes, len(contents))
+    assert_false(os.path.exists(src_file))
+    with open(dst_file, 'r') as fp:
+        assert_equal(fp.read(), contents)
+
+
+def test_place_rename():
+    _place('rename', ['rename'])
+
+
+def test_place_hardlink():
+    _place('hardlink', ['hardlink', 'copy'])
+
+
+def test_place_reflink():
+    _place('reflink', ['reflink', 'copy'])
+
+
+def test_place_copy():
+    _place('copy', ['copy'])
+    assert_equal(os.listdir(dst_dir), [src_file])
+
+
+@raises(shutil.Error)
+def test_place_file_exists():
+    _place('auto', ['rename'])
+    make_src_file()
+    place_file(src_file, dst_file)
+
+
+def test_throughput():
+    p = Placement('copy', 2000000, 2.0)
+    assert_equal(p.throughput, 1.0)
+
+
+def test_place_copy_checksum():
+    make_src_file()
+    p = place_file(src_file, dst_file, strategy='copy', overwrite=True,
+                   checksum='sha256')
+    assert_equal(p.checksum_type, 'sha256')
+    assert_equal(p.checksum,
+                 hashlib.sha256(contents.encode('utf-8')).hexdigest())
+
+
+def test_place_rename_chunked_checksum():
+    make_src_file()
+    p = place_file(src_file, dst_file, strategy='rename', overwrite=True,
+                   checksum='sha256', checksum_jobs=2)
+    assert_equal(p.checksum_type, 'sha256-chunked-64M')
+    assert_true(p.checksum is not None)
+
+
+@raises(IOError)
+def test_place_missing_source():
+    place_file('not_a_file.txt', dst_file, overwrite=True)
@@ -0,0 +1,163 @@
+"""Tests for the regions module."""
+
+import os
+import shutil
+import numpy as np
+from nose.tools import raises, assert_true, assert_equal, assert_almost_equal
+from pbs_executor.regions import (load_regions, grid_fingerprint,
+                                  cell_bounds, RegionMasks, Region,
+                                  summarize_file)
+from pbs_executor.ingest import ModelIngestTool
+from pbs_executor.file import IngestFile
+from pbs_executor.utils import is_in_file
+from pbs_executor import data_directory
+from . import log_file, models_dir
+
+
+nc_model_file = 'sftlf_fx_PBS-test_historical_r9i0p0.nc'
+regions_file = 'test_regions.txt'
+levels_file = 'test_regions_levels.nc'
+lat = np.arange(-89.5, 90.0, 1.0)
+lon = np.arange(0.5, 360.0, 1.0)
+
+
+def teardown_module():
+    if os.path.exists(models_dir):
+        shutil.rmtree(models_dir)
+    for f in [regions_file, levels_file, nc_model_file, log_file]:
+        if os.path.exists(f):
+            os.remove(f)
+
+
+def test_load_regions():
+    regions = load_regions()
+    assert_equal(list(regions), ['tropics', 'afritrop'])
+    assert_equal(regions['afritrop'].name, 'Tropical Africa')
+    assert_equal(regions['tropics'].lat_min, -23.5)
+
+
+@raises(ValueError)
+def test_load_regions_bad_line():
+    with open(regions_file, 'w') as fp:
+        fp.write('tropics,Tropics,-23.5,23.5\n')
+    load_regions(regions_file)
+
+
+def test_grid_fingerprint():
+    assert_equal(grid_fingerprint(lat, lon), grid_fingerprint(lat, lon))
+    assert_true(grid_fingerprint(lat, lon) != grid_fingerprint(lat, lon - 180))
+
+
+def test_cell_bounds():
+    assert_equal(list(cell_bounds([0.5, 1.5, 2.5])), [0, 1, 2, 3])
+
+
+def test_mask():
+    x = RegionMasks()
+    m = x.mask('tropics', lat, lon)
+    assert_equal(m.shape, (180, 360))
+    assert_equal(m.sum(), 48 * 360)
+    assert_true(x.mask('tropics', lat, lon) is m)
+
+
+def test_mask_wraps_longitude():
+    x = RegionMasks()
+    assert_equal(x.mask('afritrop', lat, lon).sum(), 48 * 90)
+    assert_equal(x.mask('afritrop', lat, lon - 180).sum(), 48 * 90)
+
+
+def test_weights():
+    x = RegionMasks()
+    for label in ['tropics', 'afritrop']:
+        w = x.weights(label, lat, lon)
+        assert_almost_equal(w.sum(), 1.0)
+        assert_equal(w[0, 0], 0.0)
+    w = x.weights('afritrop', lat, lon)
+    assert_true(w[90, 10] > 0)
+    assert_equal(w[90, 100], 0.0)
+
+
+def test_means():
+    x = RegionMasks()
+    field = np.ones((3, 180, 360)) * np.arange(3)[:, None, None]
+    means = x.means(field, lat, lon)
+    assert_true(np.allclose(means['tropics'], [0, 1, 2]))
+    field = np.ma.masked_array(np.ones((180, 360)))
+    field[:, :180] = np.ma.masked
+    field[:, 180:] = 2.0
+    assert_almost_equal(float(x.means(field, lat, lon)['tropics']), 2.0)
+
+
+def test_means_no_region_data():
+    x = RegionMasks({'arctic': Region('arctic', 'Arctic', 66.5, 90,
+                                      -180, 180)})
+    field = np.full((180, 360), np.nan)
+    assert_true(np.isnan(x.means(field, lat, lon)['arctic']))
+
+
+def test_summarize_file():
+    means = summarize_file(os.path.join(data_directory, nc_model_file),
+                           'sftlf', RegionMasks())
+    assert_equal(list(means), ['tropics', 'afritrop'])
+    assert_true(0 < means['tropics'] < 100)
+
+
+def test_summarize_file_not_gridded():
+    means = summarize_file(os.path.join(data_directory, 'nep.nc'), 'nep',
+                           RegionMasks())
+    assert_true(means is None)
+
+
+def test_ingest():
+    shutil.copy(os.path.join(data_directory, nc_model_file), os.curdir)
+    x = ModelIngestTool()
+    x.ilamb_root = os.getcwd()
+    x.dest_dir = models_dir
+    x.link_dir = ''
+    x.project_name = 'PBS'
+    x.overwrite_files = True
+    x.regions = True
+    x.ingest_files = [IngestFile(nc_model_file)]
+    x.ingest()
+    assert_true(is_in_file(log_file, 'Regional means'))
+    assert_true(is_in_file(log_file, 'afritrop'))
+
+
+def test_summarize_file_with_levels():
+    from netCDF4 import Dataset
+    with Dataset(levels_file, 'w') as dataset:
+        for name, n in [('time', 2), ('lev', 3), ('lat', 4), ('lon', 8)]:
+            dataset.createDimension(name, n)
+        dataset.createVariable('lat', 'f8', ('lat',))[:] = \
+            np.linspace(-22.5, 22.5, 4)
+        dataset.createVariable('lon', 'f8', ('lon',))[:] = \
+            np.arange(0.0, 360.0, 45.0)
+        ta = dataset.createVariable('ta', 'f4', ('time', 'lev', 'lat', 'lon'))
+        ta[:] = 1.0
+    assert_true(summarize_file(levels_file, 'ta', RegionMasks()) is None)
+
+
+class BadMasks(object):
+    def means(self, field, lat, lon):
+        raise ValueError('Unexpected shape')
+
+
+class BadRegionsTool(ModelIngestTool):
+    def get_region_masks(self):
+        return BadMasks()
+
+
+def test_ingest_region_error():
+    shutil.copy(os.path.join(data_directory, nc_model_file), os.curdir)
+    x = BadRegionsTool()
+    x.ilamb_root = os.getcwd()
+    x.dest_dir = models_dir
+    x.link_dir = ''
+    x.project_name = 'PBS'
+    x.overwrite_files = True
+    x.regions = True
+    x.ingest_files = [IngestFile(nc_model_file)]
+    x.ingest()
+    assert_true(x.ingest_files[0].target is not None)
+    assert_true(os.path.isfile(x.ingest_files[0].target))
+    assert_true(is_in_file(log_file, 'could not be computed'))
@@ -0,0 +1,235 @@
+"""Tests for the sources module."""
+
+import os
+import shutil
+import yaml
+from nose.tools import assert_true, assert_false, assert_equal
+from pbs_executor.sources import (has_magic, is_expandable, walk_files,
+                                  iglob, read_manifest, expand, FileStream)
+from pbs_executor.ingest import ModelIngestTool
+from pbs_executor.file import IngestFile
+from pbs_executor.utils import batches
+from pbs_executor import data_directory
+from . import ingest_file, log_file, models_dir, models_link_dir
+
+
+uploads_dir = 'test_uploads'
+manifest_file = os.path.join(uploads_dir, 'manifest.txt')
+nested_manifest_file = os.path.join(uploads_dir, 'sub', 'more.txt')
+nc_model_file = 'sftlf_fx_PBS-test_historical_r9i0p0.nc'
+names = ['sftlf_fx_PBS-test_historical_r{}i0p0.nc'.format(i)
+         for i in range(4)]
+
+
+def setup_module():
+    teardown_module()
+    os.makedirs(os.path.join(uploads_dir, 'sub'))
+    os.makedirs(os.path.join(uploads_dir, '.hidden'))
+    for i, name in enumerate(names):
+        d = uploads_dir if i < 2 else os.path.join(uploads_dir, 'sub')
+        shutil.copy(os.path.join(data_directory, nc_model_file),
+                    os.path.join(d, name))
+    for path in [os.path.join(uploads_dir, '.notes.nc'),
+                 os.path.join(uploads_dir, '.hidden', 'a.nc')]:
+        with open(path, 'w') as fp:
+            fp.write('hidden\n')
+    with open(manifest_file, 'w') as fp:
+        fp.write('# uploads\n\n{}\n@sub/more.txt\n'.format(names[0]))
+    with open(nested_manifest_file, 'w') as fp:
+        fp.write('{}\n'.format(names[2]))
+
+
+def teardown_module():
+    for d in [uploads_dir, models_dir, models_link_dir]:
+        if os.path.exists(d):
+            shutil.rmtree(d)
+    for f in [ingest_file, log_file]:
+        if os.path.exists(f):
+            os.remove(f)
+
+
+def in_uploads(*parts):
+    return os.path.join(uploads_dir, *parts)
+
+
+def test_has_magic():
+    assert_true(has_magic('uploads/*.nc'))
+    assert_true(has_magic('uploads/r[0-9].nc'))
+    assert_false(has_magic('uploads/r0.nc'))
+
+
+def test_is_expandable():
+    assert_true(is_expandable(in_uploads('*.nc')))
+    assert_true(is_expandable(uploads_dir + os.sep))
+    assert_false(is_expandable(uploads_dir))
+    assert_true(is_expandable('@' + manifest_file))
+    assert_false(is_expandable(in_uploads(names[0])))
+
+
+def test_walk_files_skips_hidden():
+    found = sorted(walk_files(uploads_dir))
+    expected = sorted([in_uploads(names[0]), in_uploads(names[1]),
+                       in_uploads('manifest.txt'),
+                       in_uploads('sub', names[2]),
+                       in_uploads('sub', names[3]),
+                       in_uploads('sub', 'more.txt')])
+    assert_equal(found, expected)
+
+
+def test_iglob():
+    found = sorted(iglob(in_uploads('*.nc')))
+    assert_equal(found, [in_uploads(names[0]), in_uploads(names[1])])
+
+
+def test_iglob_directory_pattern():
+    found = sorted(iglob(os.path.join('test_upload?', '*', '*.nc')))
+    assert_equal(found, [in_uploads('sub', names[2]),
+                         in_uploads('sub', names[3])])
+
+
+def test_iglob_hidden():
+    assert_equal(list(iglob(in_uploads('.*.nc'))), [in_uploads('.notes.nc')])
+
+
+def test_iglob_is_lazy():
+    found = iglob(in_uploads('*.nc'))
+    assert_false(isinstance(found, list))
+    assert_true(next(found).endswith('.nc'))
+
+
+def test_read_manifest():
+    entries = list(read_manifest(manifest_file))
+    assert_equal(entries, [in_uploads(names[0]),
+                           '@' + in_uploads('sub', 'more.txt')])
+
+
+def test_expand_manifest():
+    found = list(expand(['@' + manifest_file]))
+    assert_equal(found, [in_uploads(names[0]), in_uploads('sub', names[2])])
+
+
+def test_expand_plain_file():
+    assert_equal(list(expand(['missing.nc'])), ['missing.nc'])
+
+
+def test_expand_keeps_order():
+    found = list(expand([in_uploads('sub'), in_uploads(names[1])]))
+    assert_equal(sorted(found[:-1]), sorted([in_uploads('sub', names[2]),
+                                             in_uploads('sub', names[3]),
+                                             in_uploads('sub', 'more.txt')]))
+    assert_equal(found[-1], in_uploads(names[1]))
+
+
+def test_file_stream():
+    files = FileStream([in_uploads('*.nc')])
+    first = [f.name for f in files]
+    second = [f.name for f in files]
+    assert_equal(len(first), 2)
+    assert_equal(first, second)
+    assert_true(all(isinstance(f, IngestFile) for f in files))
+
+
+def test_batches():
+    assert_equal(list(batches(iter(range(5)), 2)), [[0, 1], [2, 3], [4]])
+    assert_equal(list(batches([], 2)), [])
+
+
+def write_config(entries, batch_size=None):
+    cfg = dict()
+    cfg['ilamb_root'] = os.getcwd()
+    cfg['dest_dir'] = models_dir
+    cfg['link_dir'] = models_link_dir
+    cfg['project_name'] = 'PBS'
+    cfg['source_name'] = 'CSDMS'
+    cfg['make_public'] = True
+    cfg['overwrite_files'] = False
+    cfg['ingest_files'] = entries
+    if batch_size is not None:
+        cfg['ingest_batch_size'] = batch_size
+    with open(ingest_file, 'w') as fp:
+        yaml.safe_dump(cfg, fp, default_flow_style=False)
+
+
+def test_load_explicit_list():
+    write_config([in_uploads(names[0])])
+    x = ModelIngestTool()
+    x.load(ingest_file)
+    assert_true(isinstance(x.ingest_files, list))
+    assert_equal(x.ingest_batch_size, 1000)
+
+
+def test_load_glob():
+    write_config([in_uploads('*.nc'), '@' + nested_manifest_file],
+                 batch_size=2)
+    x = ModelIngestTool()
+    x.load(ingest_file)
+    assert_true(isinstance(x.ingest_files, FileStream))
+    assert_equal(x.ingest_batch_size, 2)
+    assert_equal(len(list(x.ingest_files)), 3)
+
+
+def test_ingest_glob_in_batches():
+    setup_module()
+    write_config([in_uploads('*.nc'), in_uploads('sub', '*.nc')],
+                 batch_size=3)
+    x = ModelIngestTool()
+    x.load(ingest_file)
+    verified = []
+    verify = x.verify
+
+    def counting_verify(files=None):
+        verified.append(len(files))
+        return verify(files)
+    x.verify = counting_verify
+    x.ingest()
+    assert_equal(verified, [3, 1])
+    for name in names:
+        assert_true(os.path.isfile(os.path.join(models_dir, 'PBS-test',
+                                                name)))
+
+
+def test_verify_then_move_glob():
+    setup_module()
+    write_config([in_uploads('*.nc')])
+    x = ModelIngestTool()
+    x.load(ingest_file)
+    x.verify()
+    x.move()
+    for name in names[:2]:
+        assert_false(os.path.exists(in_uploads(name)))
+        assert_true(os.path.isfile(os.path.join(models_dir, 'PBS-test',
+                                                name)))
+
+
+def test_load_directory():
+    setup_module()
+    write_config([in_uploads('sub') + os.sep])
+    x = ModelIngestTool()
+    x.load(ingest_file)
+    assert_true(isinstance(x.ingest_files, FileStream))
+    assert_equal(sorted(f.name for f in x.ingest_files),
+                 sorted([in_uploads('sub', names[2]),
+                         in_uploads('sub', names[3]),
+                         in_uploads('sub', 'more.txt')]))
+
+
+def test_ingest_directory_without_slash():
+    setup_module()
+    write_config([in_uploads('sub')])
+    x = ModelIngestTool()
+    x.load(ingest_file)
+    assert_true(isinstance(x.ingest_files, FileStream))
+    x.ingest()
+    assert_true(os.path.isdir(in_uploads('sub')))
+    for name in names[2:]:
+        assert_true(os.path.isfile(os.path.join(models_dir, 'PBS-test',
+                                                name)))
+
+
+def test_verify_keeps_directory():
+    setup_module()
+    x = ModelIngestTool()
+    x.ingest_files = [IngestFile(in_uploads('sub'))]
+    x.verify()
+    assert_false(x.ingest_files[0].is_verified)
+    assert_true(os.path.isdir(in_uploads('sub')))
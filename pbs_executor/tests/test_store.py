@@ -0,0 +1,115 @@
+"""Tests for the store module."""
+
+import os
+import shutil
+import hashlib
+import tempfile
+from nose.plugins.skip import SkipTest
+from nose.tools import raises, assert_raises, assert_true, assert_equal
+from pbs_executor.store import BlobStore
+
+
+store_dir = 'test_store'
+data_dir = 'test_store_data'
+src_file = 'test_store.txt'
+contents = 'This is a test file.\n'
+digest = hashlib.sha256(contents.encode('utf-8')).hexdigest()
+
+
+def make_src_file():
+    with open(src_file, 'w') as fp:
+        fp.write(contents)
+
+
+def setup_module():
+    os.mkdir(data_dir)
+
+
+def teardown_module():
+    for d in [store_dir, data_dir]:
+        shutil.rmtree(d)
+    if os.path.exists(src_file):
+        os.remove(src_file)
+
+
+def test_path():
+    x = BlobStore(store_dir)
+    path = x.path(digest)
+    assert_equal(os.path.basename(path), digest)
+    assert_true(path.startswith(os.path.join(store_dir, 'sha256')))
+
+
+def test_add_dedup():
+    x = BlobStore(store_dir)
+    dst1 = os.path.join(data_dir, 'a.txt')
+    dst2 = os.path.join(data_dir, 'b.txt')
+    make_src_file()
+    p = x.add(src_file, dst1)
+    assert_equal(p.checksum, digest)
+    assert_true(os.path.samefile(dst1, x.path(digest)))
+    make_src_file()
+    p = x.add(src_file, dst2)
+    assert_equal(p.strategy, 'dedup')
+    assert_true(os.path.samefile(dst1, dst2))
+    assert_true(not os.path.exists(src_file))
+
+
+def test_add_unchanged():
+    x = BlobStore(store_dir)
+    dst = os.path.join(data_dir, 'a.txt')
+    make_src_file()
+    p = x.add(src_file, dst, overwrite=True)
+    assert_equal(p.strategy, 'unchanged')
+
+
+@raises(shutil.Error)
+def test_add_exists():
+    x = BlobStore(store_dir)
+    make_src_file()
+    x.add(src_file, os.path.join(data_dir, 'a.txt'))
+
+
+@raises(IOError)
+def test_add_link_fails_keeps_source():
+    x = BlobStore(store_dir)
+    make_src_file()
+    try:
+        x.add(src_file, os.path.join(data_dir, 'missing', 'c.txt'))
+    finally:
+        assert_true(os.path.isfile(src_file))
+
+
+@raises(IOError)
+def test_add_new_blob_fails_keeps_source():
+    x = BlobStore(store_dir)
+    with open(src_file, 'w') as fp:
+        fp.write('Other contents.\n')
+    try:
+        x.add(src_file, os.path.join(data_dir, 'missing', 'c.txt'))
+    finally:
+        assert_true(os.path.isfile(src_file))
+        assert_true(not os.path.exists(x.path(hashlib.sha256(
+            b'Other contents.\n').hexdigest())))
+
+
+def test_add_other_filesystem():
+    other = '/dev/shm'
+    if not os.path.isdir(other) or \
+            os.stat(other).st_dev == os.stat(os.curdir).st_dev:
+        raise SkipTest('No other filesystem')
+    root = tempfile.mkdtemp(dir=other)
+    try:
+        make_src_file()
+        assert_raises(IOError, BlobStore(root).add, src_file,
+                      os.path.join(data_dir, 'd.txt'))
+        assert_true(os.path.isfile(src_file))
+    finally:
+        shutil.rmtree(root)
+
+
+def test_prune():
+    x = BlobStore(store_dir)
+    for name in os.listdir(data_dir):
+        os.remove(os.path.join(data_dir, name))
+    assert_equal(x.prune(), 1)
+    assert_true(not os.path.exists(x.path(digest)))
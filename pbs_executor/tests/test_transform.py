@@ -0,0 +1,96 @@
+"""Tests for the transform module."""
+
+import os
+import shutil
+import numpy as np
+from nose.tools import assert_true, assert_false, assert_equal
+from netCDF4 import Dataset
+from pbs_executor.transform import (balanced_chunks, transform_file,
+                                    transform_in_place, is_netcdf3)
+from pbs_executor.ingest import ModelIngestTool
+from pbs_executor.file import IngestFile
+from pbs_executor import data_directory
+from . import log_file, models_dir
+
+
+nc_model_file = 'sftlf_fx_PBS-test_historical_r9i0p0.nc'
+nc3_file = 'test_transform.nc'
+out_file = 'test_transform_out.nc'
+
+
+def setup_module():
+    with Dataset(nc3_file, 'w', format='NETCDF3_CLASSIC') as dataset:
+        dataset.title = 'Test file'
+        dataset.createDimension('time', None)
+        dataset.createDimension('lat', 10)
+        dataset.createDimension('lon', 20)
+        t = dataset.createVariable('time', 'f8', ('time',))
+        t.units = 'days since 1850-01-01'
+        t[:] = np.arange(24)
+        v = dataset.createVariable('tas', 'f4', ('time', 'lat', 'lon'),
+                                   fill_value=1.0e20)
+        v.units = 'K'
+        v.scale_factor = 2.0
+        v[:] = np.ma.masked_greater(np.arange(24 * 200.0).reshape(24, 10, 20),
+                                    4000)
+        dataset.createVariable('scalar', 'i4', ())[:] = 7
+
+
+def teardown_module():
+    if os.path.exists(models_dir):
+        shutil.rmtree(models_dir)
+    for f in [nc3_file, out_file, nc_model_file, log_file]:
+        if os.path.exists(f):
+            os.remove(f)
+
+
+def test_balanced_chunks():
+    assert_equal(balanced_chunks((10, 20), 4), (10, 20))
+    c = balanced_chunks((1000, 180, 360), 4, chunk_bytes=2**20)
+    assert_true(c[0] * c[1] * c[2] * 4 <= 2**20)
+    assert_true(abs(1000.0 / c[0] - (180.0 / c[1]) * (360.0 / c[2])) < 20)
+    c = balanced_chunks((180, 360), 4, chunk_bytes=4 * 1800, time_axis=None)
+    assert_equal(c, (30, 60))
+
+
+def test_transform_file():
+    t = transform_file(nc3_file, out_file, chunk_bytes=800, max_memory=1000)
+    assert_equal(t.in_bytes, os.path.getsize(nc3_file))
+    assert_equal(t.out_bytes, os.path.getsize(out_file))
+    with Dataset(nc3_file) as a, Dataset(out_file) as b:
+        assert_equal(b.data_model, 'NETCDF4_CLASSIC')
+        assert_equal(b.title, a.title)
+        assert_true(b.dimensions['time'].isunlimited())
+        v = b.variables['tas']
+        assert_equal(v.units, 'K')
+        assert_equal(v.scale_factor, 2.0)
+        assert_equal(v._FillValue, np.float32(1.0e20))
+        assert_true(v.filters()['zlib'])
+        assert_true(v.filters()['shuffle'])
+        assert_true(v.chunking()[0] < 24)
+        assert_true(np.ma.allequal(v[:], a.variables['tas'][:]))
+        assert_equal(v[:].mask.sum(), a.variables['tas'][:].mask.sum())
+        assert_equal(b.variables['scalar'].getValue(), 7)
+
+
+def test_transform_in_place_skips_netcdf4():
+    transform_file(nc3_file, out_file)
+    assert_false(is_netcdf3(out_file))
+    assert_true(transform_in_place(out_file) is None)
+
+
+def test_ingest_with_transform():
+    shutil.copy(os.path.join(data_directory, nc_model_file), os.curdir)
+    x = ModelIngestTool()
+    x.ilamb_root = os.getcwd()
+    x.dest_dir = models_dir
+    x.overwrite_files = True
+    x.transform = True
+    x.ingest_files = [IngestFile(nc_model_file)]
+    x.ingest()
+    f = x.ingest_files[0]
+    with Dataset(f.target) as dataset:
+        assert_equal(dataset.data_model, 'NETCDF4_CLASSIC')
+    with open(log_file, 'r') as fp:
+        assert_true('File Transformed' in fp.read())
+    assert_true('transform' in x.metrics.summary())
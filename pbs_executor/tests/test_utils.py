@@ -0,0 +1,70 @@
+"""Tests for the utils module."""
+
+import os
+import shutil
+from multiprocessing.pool import ThreadPool
+from nose.tools import raises, assert_true, assert_false, assert_equal
+from pbs_executor.utils import makedirs, DirectoryCache, check_permissions
+
+
+test_dir = 'test_utils_dir'
+permissions = '775'
+
+
+def teardown_module():
+    if os.path.exists(test_dir):
+        shutil.rmtree(test_dir)
+
+
+def test_makedirs():
+    d = os.path.join(test_dir, 'a', 'b')
+    assert_true(makedirs(d))
+    assert_true(check_permissions(d, permissions))
+    shutil.rmtree(test_dir)
+
+
+@raises(OSError)
+def test_makedirs_exists():
+    makedirs(test_dir)
+    makedirs(test_dir)
+
+
+def test_makedirs_exist_ok():
+    d = os.path.join(test_dir, 'c')
+    makedirs(d)
+    assert_false(makedirs(d, exist_ok=True))
+    shutil.rmtree(test_dir)
+
+
+@raises(OSError)
+def test_makedirs_exist_ok_file():
+    makedirs(test_dir, exist_ok=True)
+    path = os.path.join(test_dir, 'file')
+    with open(path, 'w') as fp:
+        fp.write('This is not a directory.\n')
+    makedirs(path, exist_ok=True)
+
+
+def test_directory_cache():
+    d = os.path.join(test_dir, 'SiBCASA')
+    x = DirectoryCache()
+    assert_true(x.ensure(d))
+    assert_true(d in x)
+    assert_false(x.ensure(d))
+    assert_true(check_permissions(d, permissions))
+    x.forget(d)
+    assert_false(d in x)
+    shutil.rmtree(test_dir)
+
+
+def test_directory_cache_concurrent():
+    dirs = [os.path.join(test_dir, 'model{}'.format(i % 3))
+            for i in range(30)]
+    x = DirectoryCache()
+    pool = ThreadPool(8)
+    created = pool.map(x.ensure, dirs)
+    pool.close()
+    pool.join()
+    assert_equal(sum(created), 3)
+    assert_equal(len(os.listdir(test_dir)), 3)
+    shutil.rmtree(test_dir)
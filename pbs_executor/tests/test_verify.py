@@ -1,11 +1,13 @@
 """Tests for the verify module, aka the PBS Verification Tool (VerT)."""
 
 import os
+import numpy as np
+from netCDF4 import Dataset
 from nose.tools import raises, assert_true, assert_equal
 from pbs_executor.file import IngestFile
 from pbs_executor.verify import (VerificationTool, VerificationError,
                                  ModelVerificationTool,
-                                 BenchmarkVerificationTool)
+                                 BenchmarkVerificationTool, read_header)
 from pbs_executor import data_directory
 from . import ingest_file, model_file, make_model_files
 
@@ -13,6 +15,8 @@ from . import ingest_file, model_file, make_model_files
 file_txt = 'tropics.txt'
 file_nc = 'basins_0.5x0.5.nc'
 file_model = 'sftlf_fx_PBS-test_historical_r9i0p0.nc'
+file_deep = 'tas_test_deep.nc'
+file_header = 'tas_test_header.nc'
 
 
 def setup_module():
@@ -20,7 +24,7 @@ def setup_module():
 
 
 def teardown_module():
-    for f in [ingest_file, model_file]:
+    for f in [ingest_file, model_file, file_deep, file_header]:
         try:
             os.remove(f)
         except:
@@ -140,3 +144,269 @@ def test_not_verify_benchmark():
     ingest_file = IngestFile(f)
     v = BenchmarkVerificationTool(ingest_file)
     v.verify()
+
+
+def test_verify_closes_file():
+    f = os.path.join(data_directory, file_model)
+    ingest_file = IngestFile(f)
+    v = ModelVerificationTool(ingest_file)
+    v.verify()
+    assert_true(v.dataset is None)
+    assert_equal(v.data_model, 'NETCDF3_CLASSIC')
+
+
+def test_verify_closes_file_on_error():
+    f = os.path.join(data_directory, file_nc)
+    ingest_file = IngestFile(f)
+    v = ModelVerificationTool(ingest_file)
+    try:
+        v.verify()
+    except VerificationError:
+        pass
+    assert_true(v.dataset is None)
+
+
+def test_session_opens_file_once():
+    f = os.path.join(data_directory, file_model)
+    ingest_file = IngestFile(f)
+    with ModelVerificationTool(ingest_file) as v:
+        v.use_header = False
+        v.is_netcdf()
+        d = v.dataset
+        assert_true(d is not None)
+        v.is_netcdf3_data_model()
+        assert_true(v.dataset is d)
+    assert_true(v.dataset is None)
+
+
+def test_verify_timings():
+    f = os.path.join(data_directory, file_model)
+    ingest_file = IngestFile(f)
+    v = ModelVerificationTool(ingest_file)
+    v.verify()
+    assert_equal(list(v.timings.keys()), ModelVerificationTool.checks)
+
+
+def make_deep_file(lat=None, data=None, units='K', fill_value=-9999.):
+    with Dataset(file_deep, 'w', format='NETCDF3_CLASSIC') as d:
+        d.createDimension('time', None)
+        d.createDimension('lat', 4)
+        v = d.createVariable('lat', 'f4', ('lat',))
+        v.units = 'degrees_north'
+        v[:] = [-45, -15, 15, 45] if lat is None else lat
+        v = d.createVariable('tas', 'f4', ('time', 'lat'),
+                             fill_value=fill_value)
+        if units is not None:
+            v.units = units
+        v[:] = np.full((10, 4), 280.) if data is None else data
+    return IngestFile(file_deep)
+
+
+def test_deep_verify():
+    for f in [file_model, file_nc, 'nep.nc']:
+        ingest_file = IngestFile(os.path.join(data_directory, f))
+        v = VerificationTool(ingest_file, deep=True)
+        v.verify()
+        assert_equal(list(v.timings.keys()),
+                     VerificationTool.checks + VerificationTool.deep_checks)
+
+
+def test_deep_statistics():
+    data = np.full((10, 4), 280.)
+    data[0, :] = -9999.
+    data[9, 3] = 300.
+    v = VerificationTool(make_deep_file(data=data), deep=True)
+    v.chunk_elements = 8
+    v.verify()
+    stats = v.statistics['tas']
+    assert_equal(stats['count'], 40)
+    assert_equal(stats['fill'], 4)
+    assert_equal(stats['nan'], 0)
+    assert_equal(stats['min'], 280.)
+    assert_equal(stats['max'], 300.)
+
+
+@raises(VerificationError)
+def test_deep_all_fill():
+    v = VerificationTool(make_deep_file(data=np.full((10, 4), -9999.)),
+                         deep=True)
+    v.verify()
+
+
+@raises(VerificationError)
+def test_deep_nan():
+    data = np.full((10, 4), 280.)
+    data[5, 1] = np.nan
+    v = VerificationTool(make_deep_file(data=data), deep=True)
+    v.verify()
+
+
+def test_deep_nan_fill_value():
+    data = np.full((10, 4), 280.)
+    data[5, 1] = np.nan
+    v = VerificationTool(make_deep_file(data=data, fill_value=np.nan),
+                         deep=True)
+    v.verify()
+    stats = v.statistics['tas']
+    assert_equal(stats['fill'], 1)
+    assert_equal(stats['nan'], 0)
+    assert_equal(stats['max'], 280.)
+
+
+@raises(VerificationError)
+def test_deep_not_monotonic():
+    v = VerificationTool(make_deep_file(lat=[-45, 15, -15, 45]), deep=True)
+    v.chunk_elements = 2
+    v.verify()
+
+
+@raises(VerificationError)
+def test_deep_out_of_range():
+    v = VerificationTool(make_deep_file(lat=[-95, -15, 15, 45]), deep=True)
+    v.verify()
+
+
+@raises(VerificationError)
+def test_deep_no_units():
+    v = VerificationTool(make_deep_file(units=None), deep=True)
+    v.verify()
+
+
+def test_shallow_verify_skips_deep_checks():
+    v = VerificationTool(make_deep_file(units=None))
+    v.verify()
+    assert_equal(list(v.timings.keys()), VerificationTool.checks)
+
+
+def test_rules():
+    rules = ModelVerificationTool.rules()
+    assert_true(rules.startswith('ModelVerificationTool/'))
+    assert_true(rules != ModelVerificationTool.rules(deep=True))
+    assert_true(rules != BenchmarkVerificationTool.rules())
+
+
+def test_model_fields():
+    f = os.path.join(data_directory, file_model)
+    v = ModelVerificationTool(IngestFile(f))
+    v.verify()
+    assert_equal(v.fields(), {'variable_name': 'sftlf', 'mip_table': 'fx',
+                              'model_name': 'PBS-test',
+                              'experiment': 'historical',
+                              'ensemble_member': 'r9i0p0'})
+
+
+def test_bad_name_not_opened():
+    v = ModelVerificationTool(IngestFile('tas_Amon_M_historical_run1.nc'))
+    try:
+        v.verify()
+    except VerificationError as e:
+        assert_true('Ensemble member' in str(e))
+    assert_true(v.data_model is None)
+    assert_equal(list(v.timings.keys()), ['parse_filename'])
+
+
+def test_check_filenames():
+    errors = ModelVerificationTool.check_filenames([file_model, file_nc])
+    assert_true(errors[0] is None)
+    assert_true(errors[1] is not None)
+    assert_equal(BenchmarkVerificationTool.check_filenames([file_txt]),
+                 [None])
+
+
+def make_header_file(file_format):
+    with Dataset(file_header, 'w', format=file_format) as dataset:
+        dataset.title = 'Header test'
+        dataset.version = 2
+        dataset.createDimension('time', None)
+        dataset.createDimension('lat', 3)
+        t = dataset.createVariable('time', 'f8', ('time',))
+        t.units = 'days since 1850-01-01'
+        t[:] = [0.0, 1.0]
+        v = dataset.createVariable('tas', 'f4', ('time', 'lat'),
+                                   fill_value=1.0e20)
+        v.valid_range = np.array([0.0, 400.0], 'f4')
+        v[:] = np.ones((2, 3))
+
+
+def test_read_header_classic():
+    for file_format in ['NETCDF3_CLASSIC', 'NETCDF3_64BIT_OFFSET',
+                        'NETCDF3_64BIT_DATA']:
+        make_header_file(file_format)
+        h = read_header(file_header)
+        assert_equal(h.format, file_format)
+        assert_equal(dict(h.dimensions), {'time': 2, 'lat': 3})
+        assert_equal(h.unlimited, 'time')
+        assert_equal(h.attributes['title'], 'Header test')
+        assert_equal(h.attributes['version'], 2)
+        assert_equal(list(h.variables), ['time', 'tas'])
+        v = h.variables['tas']
+        assert_equal(v.dimensions, ('time', 'lat'))
+        assert_equal(v.dtype, 'f4')
+        assert_equal(v.attributes['valid_range'], [0.0, 400.0])
+        assert_equal(h.variables['time'].attributes['units'],
+                     'days since 1850-01-01')
+
+
+def test_read_header_matches_netcdf4():
+    f = os.path.join(data_directory, file_model)
+    h = read_header(f)
+    with Dataset(f) as dataset:
+        assert_equal(h.format, dataset.data_model)
+        assert_equal(list(h.dimensions), list(dataset.dimensions))
+        assert_equal(list(h.variables), list(dataset.variables))
+        assert_equal(list(h.attributes), dataset.ncattrs())
+
+
+def test_read_header_streaming():
+    for file_format, size in [('NETCDF3_CLASSIC', 4),
+                              ('NETCDF3_64BIT_DATA', 8)]:
+        make_header_file(file_format)
+        with open(file_header, 'rb+') as fp:
+            fp.seek(4)
+            fp.write(b'\xff' * size)
+        h = read_header(file_header)
+        assert_equal(h.dimensions['time'], 0)
+        assert_equal(h.unlimited, 'time')
+
+
+def test_read_header_netcdf4():
+    h = read_header(os.path.join(data_directory, file_nc))
+    assert_equal(h.format, 'NETCDF4')
+    assert_true(h.variables is None)
+
+
+def test_read_header_not_netcdf():
+    assert_true(read_header(os.path.join(data_directory, file_txt)) is None)
+
+
+@raises(ValueError)
+def test_read_header_truncated():
+    make_header_file('NETCDF3_CLASSIC')
+    with open(file_header, 'rb') as fp:
+        data = fp.read(40)
+    with open(file_header, 'wb') as fp:
+        fp.write(data)
+    read_header(file_header)
+
+
+class NoLibraryTool(ModelVerificationTool):
+
+    def open(self):
+        raise AssertionError('file opened with libnetcdf')
+
+
+def test_verify_with_header_only():
+    v = NoLibraryTool(IngestFile(os.path.join(data_directory, file_model)))
+    v.verify()
+    assert_equal(v.data_model, 'NETCDF3_CLASSIC')
+    assert_equal(v.header.format, 'NETCDF3_CLASSIC')
+
+
+@raises(VerificationError)
+def test_header_falls_back_to_netcdf4():
+    v = ModelVerificationTool(IngestFile(os.path.join(data_directory,
+                                                      file_nc)))
+    v.is_netcdf()
+    assert_true(v.header is None)
+    assert_equal(v.data_model, 'NETCDF4')
+    v.is_netcdf3_data_model()
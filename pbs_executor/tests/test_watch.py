@@ -0,0 +1,117 @@
+"""Tests for the watch module."""
+
+import os
+import shutil
+from nose.tools import assert_true, assert_false, assert_equal
+from pbs_executor.watch import WatchDaemon
+from pbs_executor.ingest import ModelIngestTool
+from pbs_executor import data_directory
+from . import ingest_file, log_file, models_dir, models_link_dir, make_files
+
+
+watch_dir = 'test_uploads'
+nc_model_file = 'sftlf_fx_PBS-test_historical_r9i0p0.nc'
+model_name = 'PBS-test'
+
+
+def setup_module():
+    os.mkdir(watch_dir)
+    make_files(None, models_dir, models_link_dir)
+
+
+def teardown_module():
+    for d in [watch_dir, models_dir, models_link_dir]:
+        if os.path.exists(d):
+            shutil.rmtree(d)
+    for f in [ingest_file, log_file]:
+        try:
+            os.remove(f)
+        except:
+            pass
+
+
+def make_daemon():
+    return WatchDaemon(ModelIngestTool, ingest_file, watch_dir,
+                       poll_interval=0.0, debounce=0.0)
+
+
+def test_poll_waits_for_stable_file():
+    x = make_daemon()
+    shutil.copy(os.path.join(data_directory, nc_model_file), watch_dir)
+    assert_equal(x.poll(), 0)
+    assert_false(x.is_batch_ready())
+    assert_equal(x.poll(), 1)
+    assert_equal(x.stats['queue_depth'], 1)
+    assert_true(x.is_batch_ready())
+    assert_equal(x.poll(), 0)
+
+
+def test_poll_ignores_pattern():
+    x = make_daemon()
+    with open(os.path.join(watch_dir, 'notes.txt'), 'w') as fp:
+        fp.write('Not a netCDF file.\n')
+    x.poll()
+    x.poll()
+    assert_equal(len(x.queue), 1)
+
+
+def test_ingest():
+    x = make_daemon()
+    x.run(max_polls=2)
+    assert_equal(x.stats['batches'], 1)
+    assert_equal(x.stats['files'], 1)
+    assert_equal(x.stats['queue_depth'], 0)
+    assert_false(os.path.exists(os.path.join(watch_dir, nc_model_file)))
+    assert_true(os.path.isfile(os.path.join(models_dir, model_name,
+                                            nc_model_file)))
+    assert_true(os.path.isfile(log_file))
+
+
+def test_ingest_keeps_log():
+    x = make_daemon()
+    x.batch_size = 1
+    for i in range(2):
+        name = 'sftlf_fx_PBS-test_historical_r{}i0p0.nc'.format(i)
+        shutil.copy(os.path.join(data_directory, nc_model_file),
+                    os.path.join(watch_dir, name))
+    x.poll()
+    x.poll()
+    tool = x.ingest()
+    assert_true(x.ingest() is tool)
+    with open(log_file, 'r') as fp:
+        log = fp.read()
+    assert_true('Batch 1 of 1 files' in log)
+    assert_true('Batch 2 of 1 files' in log)
+
+
+def test_ingest_empty_queue():
+    x = make_daemon()
+    assert_true(x.ingest() is None)
+
+
+class FailingTool(ModelIngestTool):
+    def ingest(self):
+        raise RuntimeError('Disk full')
+
+
+def test_ingest_failure_sets_batch_aside():
+    x = make_daemon()
+    path = os.path.join(watch_dir, nc_model_file)
+    shutil.copy(os.path.join(data_directory, nc_model_file), watch_dir)
+    x.poll()
+    x.poll()
+    x.tool_class = FailingTool
+    tool = x.ingest()
+    assert_equal(x.stats['failed_batches'], 1)
+    assert_equal(len(x.queue), 0)
+    assert_true(path in x.failed)
+    assert_false(path in x._queued)
+    assert_true('Disk full' in tool.log.data)
+    x.poll()
+    x.poll()
+    assert_equal(len(x.queue), 0)
+    os.utime(path, (0, 0))
+    x.poll()
+    x.poll()
+    assert_equal(len(x.queue), 1)
+    os.remove(path)
@@ -0,0 +1,198 @@
+"""Tests for the workqueue module."""
+
+import os
+import time
+import shutil
+import yaml
+from multiprocessing import Process
+from nose.tools import assert_true, assert_false, assert_equal
+from pbs_executor.workqueue import WorkQueue, Worker, Coordinator, main
+from pbs_executor.ingest import ModelIngestTool
+from pbs_executor import data_directory
+from . import log_file, models_dir, models_link_dir
+
+
+queue_dir = 'test_queue'
+config_file = 'test_workqueue.yaml'
+nc_model_file = 'sftlf_fx_PBS-test_historical_r9i0p0.nc'
+model_files = ['sftlf_fx_PBS-test_historical_r{}i0p0.nc'.format(i)
+               for i in range(6)]
+bad_files = ['test_workqueue_{}.txt'.format(i) for i in range(3)]
+metrics_file = 'test_workqueue_metrics.jsonl'
+
+
+def make_files(**extra):
+    for name in model_files:
+        shutil.copy(os.path.join(data_directory, nc_model_file), name)
+    for name in bad_files:
+        with open(name, 'w') as fp:
+            fp.write('This is not a netCDF file.\n')
+    cfg = {
+        'ilamb_root': os.getcwd(),
+        'dest_dir': models_dir,
+        'link_dir': models_link_dir,
+        'project_name': 'PBS',
+        'source_name': 'CSDMS',
+        'ingest_files': model_files[:3] + bad_files + model_files[3:],
+        'make_public': True,
+        'overwrite_files': True,
+        'coverage': True,
+    }
+    cfg.update(extra)
+    with open(config_file, 'w') as fp:
+        yaml.safe_dump(cfg, fp, default_flow_style=False)
+
+
+def teardown_module():
+    for d in [queue_dir, models_dir, models_link_dir]:
+        if os.path.exists(d):
+            shutil.rmtree(d)
+    for f in model_files + bad_files + [config_file, log_file,
+                                        '.pbs_coverage.json',
+                                        '.pbs_catalog.sqlite',
+                                        '.pbs_journal.jsonl', metrics_file]:
+        if os.path.exists(f):
+            os.remove(f)
+
+
+def reset():
+    if os.path.exists(queue_dir):
+        shutil.rmtree(queue_dir)
+
+
+def test_submit_and_claim():
+    reset()
+    q = WorkQueue(queue_dir)
+    assert_equal(q.submit(['a.nc', 'b.nc', 'c.nc'], batch_size=2), 2)
+    assert_equal(q.counts(), {'pending': 2, 'claimed': 0, 'done': 0})
+    batch, paths = q.claim('w1')
+    assert_equal(batch, 'batch-000000.json')
+    assert_equal(paths, [os.path.abspath('a.nc'), os.path.abspath('b.nc')])
+    batch2, paths2 = q.claim('w2')
+    assert_equal(paths2, [os.path.abspath('c.nc')])
+    assert_true(q.claim('w3') is None)
+    assert_false(q.is_finished())
+    q.complete(batch, 'w1', {'batch': batch})
+    q.complete(batch2, 'w2', {'batch': batch2})
+    assert_true(q.is_finished())
+    assert_equal([r['batch'] for r in q.results()], [batch, batch2])
+    assert_equal(q.submit(['d.nc']), 1)
+    assert_equal(q.batches()[-1], 'batch-000002.json')
+
+
+def test_requeue_stale():
+    reset()
+    q = WorkQueue(queue_dir)
+    q.submit(['a.nc'])
+    batch, paths = q.claim('w1')
+    assert_equal(q.requeue_stale(60.0), [])
+    claim = q.path('claimed', batch + '@w1')
+    os.utime(claim, (time.time() - 120, time.time() - 120))
+    assert_equal(q.requeue_stale(60.0), [batch])
+    assert_equal(q.claim('w2')[0], batch)
+
+
+def test_claim_skips_done_batch():
+    reset()
+    q = WorkQueue(queue_dir)
+    q.submit(['a.nc'])
+    batch, paths = q.claim('w1')
+    claim = q.path('claimed', batch + '@w1')
+    os.utime(claim, (time.time() - 120, time.time() - 120))
+    q.requeue_stale(60.0)
+    q.complete(batch, 'w1', {'batch': batch})
+    assert_true(q.claim('w2') is None)
+    assert_true(q.is_finished())
+
+
+def work(worker_id):
+    main(['work', 'model', config_file, queue_dir, '--worker-id', worker_id])
+
+
+def test_distributed_ingest():
+    reset()
+    make_files()
+    c = Coordinator(ModelIngestTool, config_file, queue_dir, batch_size=2)
+    assert_equal(c.submit(), 5)
+    workers = [Process(target=work, args=('w{}'.format(i),))
+               for i in range(3)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    assert_true(c.wait(poll_interval=0.1, timeout=10))
+    results = list(c.queue.results())
+    assert_equal(len(results), 5)
+    assert_equal(sum(len(r['placed']) for r in results), len(model_files))
+    for name in model_files + bad_files:
+        assert_false(os.path.exists(name))
+    for name in model_files:
+        assert_true(os.path.islink(os.path.join(models_link_dir, 'PBS',
+                                                name)))
+    assert_true(os.path.isfile(c.queue.path('logs', 'batch-000000.html')))
+    tool = c.merge()
+    assert_equal(tool.metrics.totals['verify']['count'],
+                 len(model_files) + len(bad_files))
+    with open(log_file, 'r') as fp:
+        log = fp.read()
+    for name in model_files + bad_files:
+        assert_true(name in log)
+    positions = [log.index(name) for name in
+                 [model_files[0], bad_files[1], model_files[5]]]
+    assert_equal(positions, sorted(positions))
+    assert_true('9 files in 5 batches' in log)
+    assert_true('Timing Summary' in log)
+
+
+def test_worker_files():
+    reset()
+    teardown_module()
+    make_files(catalog=True, verify_cache=True, journal=True,
+               journal_sync=False, metrics_file=metrics_file)
+    c = Coordinator(ModelIngestTool, config_file, queue_dir, batch_size=4)
+    c.submit()
+    Worker(ModelIngestTool, config_file, queue_dir, worker_id='a').run(1)
+    Worker(ModelIngestTool, config_file, queue_dir, worker_id='b').run()
+    for name in ['.pbs_catalog.sqlite', '.pbs_verify_cache.sqlite',
+                 '.pbs_journal.jsonl', metrics_file]:
+        assert_false(os.path.exists(name))
+    for worker_id in ['a', 'b']:
+        for kind in ['journal', 'metrics']:
+            assert_true(os.path.isfile(c.queue.path(
+                'logs', '{}.{}.jsonl'.format(worker_id, kind))))
+    tool = c.merge()
+    assert_equal(tool.get_catalog().count(), len(model_files))
+
+
+def test_worker_run_in_process():
+    reset()
+    make_files()
+    c = Coordinator(ModelIngestTool, config_file, queue_dir, batch_size=4)
+    c.submit()
+    w = Worker(ModelIngestTool, config_file, queue_dir, worker_id='solo')
+    assert_equal(w.run(max_batches=1), 1)
+    assert_equal(c.queue.counts()['pending'], 2)
+    assert_equal(w.run(), 2)
+    assert_true(c.queue.is_finished())
+
+
+def test_worker_batch_error():
+    reset()
+    make_files()
+    c = Coordinator(ModelIngestTool, config_file, queue_dir, batch_size=4)
+    c.submit()
+    w = Worker(ModelIngestTool, config_file, queue_dir, worker_id='bad')
+
+    def run_batch(batch, paths):
+        raise RuntimeError('node lost its mount')
+    w.run_batch = run_batch
+    assert_equal(w.run(), 3)
+    assert_true(c.queue.is_finished())
+    assert_true(c.wait(poll_interval=0.1, timeout=1))
+    results = list(c.queue.results())
+    assert_equal([r['error'] for r in results], ['node lost its mount'] * 3)
+    c.merge()
+    with open(log_file, 'r') as fp:
+        log = fp.read()
+    assert_true('Batch Failed' in log)
+    assert_true('node lost its mount' in log)
@@ -0,0 +1,230 @@
+"""The `transform` module rewrites uploaded netCDF3 files as compressed,
+chunked NETCDF4_CLASSIC files.
+
+"""
+import os
+import time
+
+
+target_format = 'NETCDF4_CLASSIC'
+time_names = ['time', 't']
+
+
+class Transform(object):
+    """
+    A record of a file rewritten by `transform_file`.
+
+    Parameters
+    ----------
+    in_bytes : int
+      The size of the original file, in bytes.
+    out_bytes : int
+      The size of the rewritten file, in bytes.
+    seconds : float
+      The wall time taken to rewrite the file.
+
+    Attributes
+    ----------
+    in_bytes : int
+      The size of the original file, in bytes.
+    out_bytes : int
+      The size of the rewritten file, in bytes.
+    seconds : float
+      The wall time taken to rewrite the file.
+
+    """
+    def __init__(self, in_bytes, out_bytes, seconds):
+        self.in_bytes = in_bytes
+        self.out_bytes = out_bytes
+        self.seconds = seconds
+
+    @property
+    def reduction(self):
+        """Fraction of the original size saved."""
+        if self.in_bytes <= 0:
+            return 0.0
+        return 1.0 - float(self.out_bytes) / self.in_bytes
+
+
+def balanced_chunks(shape, itemsize, chunk_bytes=2**20, time_axis=0):
+    """
+    Choose a chunk shape for reading both time series and time slices.
+
+    The chunk shape is chosen so that reading the time series at one
+    point touches about as many chunks as reading one time slice.
+
+    Parameters
+    ----------
+    shape : tuple of int
+      The shape of a variable.
+    itemsize : int
+      The size of one value, in bytes.
+    chunk_bytes : int, optional
+      The target size of a chunk, in bytes (default is 1 MiB).
+    time_axis : int or None, optional
+      The index of the time dimension (default is 0), or None if the
+      variable has none.
+
+    Returns
+    -------
+    tuple of int
+      The chunk shape.
+
+    """
+    shape = [max(1, n) for n in shape]
+    total = 1
+    for n in shape:
+        total *= n
+    values = max(1, chunk_bytes // itemsize)
+    if total <= values:
+        return tuple(shape)
+    ndim = len(shape)
+    if time_axis is None or ndim == 1:
+        f = (float(values) / total) ** (1.0 / ndim)
+        fractions = [f] * ndim
+    else:
+        f = (float(values) / total) ** (1.0 / (2 * (ndim - 1)))
+        fractions = [f] * ndim
+        fractions[time_axis] = f ** (ndim - 1)
+    return tuple(max(1, min(n, int(n * x))) for n, x in zip(shape, fractions))
+
+
+def _time_axis(variable):
+    for i, name in enumerate(variable.dimensions):
+        if name.lower() in time_names:
+            return i
+    if len(variable.dimensions) > 0 and \
+            variable.group().dimensions[variable.dimensions[0]].isunlimited():
+        return 0
+    return None
+
+
+def _copy_variable(src, dst, complevel, shuffle, chunk_bytes, max_memory):
+    import numpy as np
+    attrs = dict((k, src.getncattr(k)) for k in src.ncattrs())
+    fill_value = attrs.pop('_FillValue', None)
+    dtype = np.dtype(src.dtype)
+    kwargs = {}
+    if src.ndim > 0:
+        shape = [n if n > 0 else 1 for n in src.shape]
+        kwargs = {'zlib': complevel > 0, 'complevel': complevel,
+                  'shuffle': shuffle,
+                  'chunksizes': balanced_chunks(shape, dtype.itemsize,
+                                                chunk_bytes,
+                                                _time_axis(src))}
+    out = dst.createVariable(src.name, dtype, src.dimensions,
+                             fill_value=fill_value, **kwargs)
+    out.setncatts(attrs)
+    src.set_auto_maskandscale(False)
+    out.set_auto_maskandscale(False)
+    if src.ndim == 0:
+        out.assignValue(src.getValue())
+        return
+    if src.shape[0] == 0:
+        return
+    row = dtype.itemsize
+    for n in src.shape[1:]:
+        row *= n
+    step = max(1, max_memory // max(row, 1))
+    chunk = kwargs['chunksizes'][0]
+    if step > chunk:
+        step -= step % chunk
+    n = src.shape[0]
+    for i in range(0, n, step):
+        j = min(i + step, n)
+        out[i:j] = src[i:j]
+
+
+def transform_file(src, dst, complevel=4, shuffle=True, chunk_bytes=2**20,
+                   max_memory=64 * 2**20):
+    """
+    Rewrite a netCDF file as a compressed NETCDF4_CLASSIC file.
+
+    Dimensions, variables, and global and variable attributes are
+    copied unchanged. Each variable is compressed with zlib and
+    chunked with `balanced_chunks`, and is copied in slabs along its
+    first dimension, so no more than about *max_memory* bytes of data
+    are held at once.
+
+    Parameters
+    ----------
+    src : str
+      The path to the original file.
+    dst : str
+      The path to the new file.
+    complevel : int, optional
+      The zlib compression level, from 0 (none) to 9 (default is 4).
+    shuffle : bool, optional
+      Set to True to apply the shuffle filter before compressing
+      (default is True).
+    chunk_bytes : int, optional
+      The target size of a chunk, in bytes (default is 1 MiB).
+    max_memory : int, optional
+      The target size of the slabs copied at a time, in bytes
+      (default is 64 MiB).
+
+    Returns
+    -------
+    Transform
+      The sizes of the two files and the time taken.
+
+    """
+    from netCDF4 import Dataset
+    start = time.time()
+    with Dataset(src, 'r') as a:
+        with Dataset(dst, 'w', format=target_format) as b:
+            b.setncatts(dict((k, a.getncattr(k)) for k in a.ncattrs()))
+            for name, dim in a.dimensions.items():
+                b.createDimension(name, None if dim.isunlimited()
+                                  else len(dim))
+            for v in a.variables.values():
+                _copy_variable(v, b, complevel, shuffle, chunk_bytes,
+                               max_memory)
+    return Transform(os.path.getsize(src), os.path.getsize(dst),
+                     time.time() - start)
+
+
+def is_netcdf3(path):
+    """
+    Check whether a file is a netCDF3 (classic or 64-bit) file.
+
+    """
+    from netCDF4 import Dataset
+    try:
+        with Dataset(path, 'r') as dataset:
+            return dataset.data_model.startswith('NETCDF3')
+    except (IOError, OSError, RuntimeError):
+        return False
+
+
+def transform_in_place(path, **kwargs):
+    """
+    Rewrite a netCDF3 file as a compressed NETCDF4_CLASSIC file.
+
+    The new file is written beside the original and renamed over it
+    only once complete; if the rewrite fails, the original is kept.
+
+    Parameters
+    ----------
+    path : str
+      The path to the file.
+    **kwargs
+      Options passed to `transform_file`.
+
+    Returns
+    -------
+    Transform or None
+      The record of the rewrite, or None if the file isn't netCDF3.
+
+    """
+    if not is_netcdf3(path):
+        return None
+    head, tail = os.path.split(path)
+    tmp = os.path.join(head, '.{}.{}.tmp'.format(tail, os.getpid()))
+    try:
+        t = transform_file(path, tmp, **kwargs)
+        os.rename(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return t
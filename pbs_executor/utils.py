@@ -4,9 +4,11 @@ in the PBS executor.
 """
 import os
 import re
+import errno
+import threading
 
 
-def makedirs(path, mode=0775):
+def makedirs(path, mode=0775, exist_ok=False):
     """
     Make a directory and all intermediate directories.
 
@@ -20,6 +22,15 @@ def makedirs(path, mode=0775):
       The directory path to create.
     mode : int
       The permissions of the directory.
+    exist_ok : bool, optional
+      Set to True to succeed, without changing its mode, if the
+      directory already exists; e.g., because another process has
+      just created it (default is False).
+
+    Returns
+    -------
+    bool
+      True if the directory was created.
 
     Examples
     --------
@@ -28,8 +39,86 @@ def makedirs(path, mode=0775):
     >>> makedirs('tmp', mode=0775)
 
     """
-    os.makedirs(path)
+    try:
+        os.makedirs(path)
+    except OSError as e:
+        if not (exist_ok and e.errno == errno.EEXIST and os.path.isdir(path)):
+            raise
+        return False
     os.chmod(path, mode)
+    return True
+
+
+class DirectoryCache(object):
+    """
+    Make directories, remembering those already made or found.
+
+    A directory is checked or created only the first time it's
+    ensured, so a batch of files placed in a few directories costs a
+    few system calls per directory rather than per file. Directories
+    created at the same time by another thread or process are
+    accepted.
+
+    Parameters
+    ----------
+    mode : int, optional
+      The permissions of new directories (default is 0775).
+
+    Examples
+    --------
+    >>> dirs = DirectoryCache()
+    >>> dirs.ensure('MODELS/SiBCASA')
+    True
+    >>> dirs.ensure('MODELS/SiBCASA')
+    False
+
+    """
+    def __init__(self, mode=0775):
+        self.mode = mode
+        self._known = set()
+        self._lock = threading.Lock()
+
+    def __contains__(self, path):
+        return os.path.abspath(path) in self._known
+
+    def ensure(self, path):
+        """
+        Make sure a directory exists.
+
+        Parameters
+        ----------
+        path : str
+          The directory path.
+
+        Returns
+        -------
+        bool
+          True if the directory was created by this call.
+
+        """
+        key = os.path.abspath(path)
+        if key in self._known:
+            return False
+        created = makedirs(path, mode=self.mode, exist_ok=True)
+        with self._lock:
+            self._known.add(key)
+        return created
+
+    def forget(self, path=None):
+        """
+        Forget a directory, or all directories, so they're checked again.
+
+        Parameters
+        ----------
+        path : str, optional
+          The directory path (default is to forget all directories).
+
+        """
+        with self._lock:
+            if path is None:
+                self._known.clear()
+            else:
+                self._known.discard(os.path.abspath(path))
 
 
 def is_in_file(path, search_string):
@@ -69,3 +158,30 @@ def check_permissions(path, mode):
 
     """
     return oct(os.stat(path).st_mode)[-3:] == mode
+
+
+def batches(iterable, size):
+    """
+    Split an iterable into lists of at most *size* items, lazily.
+
+    Parameters
+    ----------
+    iterable : iterable
+      The items.
+    size : int
+      The maximum number of items in a batch.
+
+    Returns
+    -------
+    generator of list
+      The batches, in order.
+
+    """
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
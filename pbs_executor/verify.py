@@ -1,7 +1,37 @@
 """Verify that ingest files follow the CMIP5 standard format."""
 
 import os
-from netCDF4 import Dataset
+import mmap
+import time
+import struct
+from collections import OrderedDict, namedtuple
+from .filenames import parse_model, parse_many, explain_model
+
+
+cdf_formats = {
+    1: 'NETCDF3_CLASSIC',
+    2: 'NETCDF3_64BIT_OFFSET',
+    5: 'NETCDF3_64BIT_DATA',
+}
+cdf_types = {
+    1: ('b', 1), 2: ('c', 1), 3: ('h', 2), 4: ('i', 4), 5: ('f', 4),
+    6: ('d', 8), 7: ('B', 1), 8: ('H', 2), 9: ('I', 4), 10: ('q', 8),
+    11: ('Q', 8),
+}
+cdf_dtypes = {
+    1: 'i1', 2: 'S1', 3: 'i2', 4: 'i4', 5: 'f4', 6: 'f8', 7: 'u1',
+    8: 'u2', 9: 'u4', 10: 'i8', 11: 'u8',
+}
+hdf5_signature = b'\x89HDF\r\n\x1a\n'
+hdf5_offsets = [0, 512, 1024, 2048]
+NC_DIMENSION, NC_VARIABLE, NC_ATTRIBUTE = 10, 11, 12
+STREAMING = 0xFFFFFFFF
+STREAMING_64 = 0xFFFFFFFFFFFFFFFF
+
+Header = namedtuple('Header', ['format', 'dimensions', 'unlimited',
+                               'variables', 'attributes'])
+HeaderVariable = namedtuple('HeaderVariable', ['dimensions', 'dtype',
+                                               'attributes'])
 
 
 class VerificationError(Exception):
@@ -26,6 +56,183 @@ class VerificationError(Exception):
         return self.msg
 
 
+def _chunks(variable, chunk_elements):
+    """
+    Read a variable in slices along its first (usually time) dimension.
+
+    Parameters
+    ----------
+    variable : netCDF4.Variable
+      A variable with masking and scaling turned off.
+    chunk_elements : int
+      The number of values to read at a time. At least one slice of
+      the first dimension is read.
+
+    """
+    import numpy as np
+    if variable.ndim == 0:
+        yield np.asarray(variable.getValue())
+        return
+    row = int(np.prod(variable.shape[1:]))
+    step = max(1, chunk_elements // max(row, 1))
+    for i in range(0, variable.shape[0], step):
+        yield np.asarray(variable[i:i + step])
+
+
+def _fill_values(variable):
+    """
+    Get the raw values that mark missing data in a variable.
+
+    """
+    import numpy as np
+    from netCDF4 import default_fillvals
+    attrs = variable.ncattrs()
+    values = []
+    if '_FillValue' in attrs:
+        values.append(variable.getncattr('_FillValue'))
+    else:
+        values.append(default_fillvals.get(variable.dtype.str[1:]))
+    if 'missing_value' in attrs:
+        values.extend(np.atleast_1d(variable.getncattr('missing_value')))
+    return [v for v in values if v is not None]
+
+
+class _HeaderReader(object):
+
+    def __init__(self, buf, version):
+        self.buf = buf
+        self.pos = 4
+        self.size = 8 if version == 5 else 4
+        self.offset_size = 4 if version == 1 else 8
+
+    def unpack(self, fmt):
+        values = struct.unpack_from('>' + fmt, self.buf, self.pos)
+        self.pos += struct.calcsize('>' + fmt)
+        return values
+
+    def count(self):
+        return self.unpack('Q' if self.size == 8 else 'I')[0]
+
+    def padded(self, n):
+        data = self.buf[self.pos:self.pos + n]
+        if len(data) < n:
+            raise ValueError('Truncated header')
+        self.pos += n + (-n % 4)
+        return data
+
+    def name(self):
+        return self.padded(self.count()).decode('utf-8')
+
+    def tag(self, expected):
+        tag = self.unpack('I')[0]
+        n = self.count()
+        if tag not in (0, expected) or (tag == 0 and n != 0):
+            raise ValueError('Bad header tag: {}'.format(tag))
+        return n
+
+    def values(self, nc_type, n):
+        if nc_type not in cdf_types:
+            raise ValueError('Bad type: {}'.format(nc_type))
+        code, itemsize = cdf_types[nc_type]
+        data = self.padded(n * itemsize)
+        if code == 'c':
+            return data.rstrip(b'\x00').decode('utf-8', 'replace')
+        values = struct.unpack('>{}{}'.format(n, code), data)
+        return values[0] if n == 1 else list(values)
+
+    def attributes(self):
+        attrs = OrderedDict()
+        for i in range(self.tag(NC_ATTRIBUTE)):
+            name = self.name()
+            nc_type = self.unpack('I')[0]
+            attrs[name] = self.values(nc_type, self.count())
+        return attrs
+
+
+def read_header(path):
+    """
+    Read the header of a netCDF file without libnetcdf.
+
+    The file is memory-mapped, so only the pages that hold the header
+    are read from disk. The classic formats (CDF-1, CDF-2 and CDF-5)
+    are parsed in full; for netCDF-4 files, only the HDF5 signature
+    is found.
+
+    Parameters
+    ----------
+    path : str
+      The path to the file.
+
+    Returns
+    -------
+    Header or None
+      The format, dimension lengths, unlimited dimension, variables
+      and global attributes of the file, or None if it doesn't start
+      with a netCDF signature. For a netCDF-4 file, only the format,
+      'NETCDF4', is set.
+
+    Raises
+    ------
+    ValueError
+      If a classic header is malformed or truncated.
+
+    """
+    with open(path, 'rb') as fp:
+        if os.fstat(fp.fileno()).st_size < 8:
+            return None
+        buf = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        magic = buf[:4]
+        if magic[:3] != b'CDF':
+            for offset in hdf5_offsets:
+                if buf[offset:offset + 8] == hdf5_signature:
+                    return Header('NETCDF4', None, None, None, None)
+            return None
+        version = bytearray(magic)[3]
+        if version not in cdf_formats:
+            return None
+        r = _HeaderReader(buf, version)
+        try:
+            return _read_classic(r, cdf_formats[version])
+        except struct.error:
+            raise ValueError('Truncated header')
+    finally:
+        buf.close()
+
+
+def _read_classic(r, file_format):
+    numrecs = r.count()
+    streaming = STREAMING_64 if r.size == 8 else STREAMING
+    dimensions = OrderedDict()
+    names = []
+    unlimited = None
+    for i in range(r.tag(NC_DIMENSION)):
+        name = r.name()
+        length = r.count()
+        if length == 0:
+            unlimited = name
+            length = 0 if numrecs == streaming else numrecs
+        dimensions[name] = length
+        names.append(name)
+    attributes = r.attributes()
+    variables = OrderedDict()
+    for i in range(r.tag(NC_VARIABLE)):
+        name = r.name()
+        dimids = [r.count() for j in range(r.count())]
+        try:
+            dims = tuple(names[j] for j in dimids)
+        except IndexError:
+            raise ValueError('Bad dimension id in variable {}'.format(name))
+        attrs = r.attributes()
+        nc_type = r.unpack('I')[0]
+        if nc_type not in cdf_dtypes:
+            raise ValueError('Bad type: {}'.format(nc_type))
+        r.count()
+        r.unpack('Q' if r.offset_size == 8 else 'I')
+        variables[name] = HeaderVariable(dims, cdf_dtypes[nc_type], attrs)
+    return Header(file_format, dimensions, unlimited, variables, attributes)
+
+
 class VerificationTool(object):
     """
     Tool for verifying that files are ILAMB-compatible.
@@ -34,38 +241,150 @@ class VerificationTool(object):
     ----------
     file : str
       The name of a file to verify.
+    deep : bool, optional
+      Set to True to also run `deep_checks`, which read the data
+      (default is False).
 
     Attributes
     ----------
     file : str
       The name of a file to verify.
+    deep : bool
+      Whether `verify` runs `deep_checks`.
     parts : list
       Parts of the filename (see Notes in subclasses).
     variable_name : str or None
       CMIP5 short variable name.
+    statistics : OrderedDict
+      The count, fill fraction, NaN fraction, minimum and maximum of
+      each numeric variable, filled in by `has_valid_data`.
+    dataset : netCDF4.Dataset or None
+      The open file, or None outside of a verification session.
+    header : Header or None
+      The header of the file, read by `load_header` without
+      libnetcdf; None if not read or not a classic netCDF file.
+    data_model : str or None
+      The netCDF data model of the file, read from its header.
+    timings : OrderedDict
+      Wall time, in seconds, taken by each check run by `verify`.
+
+    Notes
+    -----
+    A VerificationTool is also a context manager. The file is opened
+    at most once, by the first check that needs it, and it's closed
+    when the `with` block (or `verify`) exits. The filename checks
+    run first, so a file with a bad name is never opened. If
+    `use_header` is set, `is_netcdf` and `is_netcdf3_data_model` read
+    the header of a classic netCDF file with `read_header`, so the
+    file is opened with libnetcdf only by checks that need its data.
+
+    The deep checks read each variable in slices of at most
+    `chunk_elements` values along its first dimension, so memory use
+    doesn't grow with the size of the file. Values are checked in
+    their stored (packed) form against the `valid_min`, `valid_max`
+    and `valid_range` attributes, and after unpacking against
+    `value_ranges`, which is keyed by variable name.
 
     """
-    def __init__(self, file):
+    rules_version = 3
+    use_header = True
+    checks = ['parse_filename', 'filename_has_variable_name', 'is_netcdf']
+    deep_checks = ['has_units', 'has_monotonic_coordinates', 'has_valid_data']
+    field_names = ['variable_name']
+    chunk_elements = 2 ** 22
+    max_fill_fraction = 1.0
+    max_nan_fraction = 0.0
+    value_ranges = {
+        'lat': (-90.0, 90.0),
+        'lon': (-360.0, 360.0),
+    }
+
+    def __init__(self, file, deep=False):
         self.file = file
+        self.deep = deep
         self.parts = []
         self.variable_name = None
+        self.statistics = OrderedDict()
+        self.dataset = None
+        self.header = None
+        self.data_model = None
+        self.timings = OrderedDict()
+        self._header_read = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __del__(self):
+        if getattr(self, 'dataset', None) is not None:
+            self.close()
+
+    def open(self):
+        """
+        Open the file and read its header, if not already open.
+
+        Returns
+        -------
+        netCDF4.Dataset
+          The open file.
+
+        """
+        if self.dataset is None:
+            from netCDF4 import Dataset
+            try:
+                self.dataset = Dataset(self.file.name)
+            except IOError as e:
+                raise VerificationError(str(e))
+            self.data_model = self.dataset.data_model
+        return self.dataset
+
+    def load_header(self):
+        """
+        Read the header of the file without libnetcdf, if not already read.
+
+        Returns
+        -------
+        Header or None
+          The header, or None if `use_header` isn't set, the file
+          isn't a classic netCDF file, or its header is malformed.
+
+        """
+        if self.use_header and not self._header_read:
+            self._header_read = True
+            try:
+                header = read_header(self.file.name)
+            except (IOError, OSError, ValueError):
+                header = None
+            if header is not None and header.variables is not None:
+                self.header = header
+                self.data_model = header.format
+        return self.header
+
+    def close(self):
+        """
+        Close the file, if open.
+
+        """
+        if self.dataset is not None:
+            self.dataset.close()
+            self.dataset = None
 
     def is_netcdf(self):
         """
         Check whether a file is netCDF.
 
         """
-        try:
-            Dataset(self.file.name)
-        except IOError as e:
-            raise VerificationError(e.message)
+        if self.load_header() is None:
+            self.open()
 
     def parse_filename(self):
         """
         Break a filename into its component parts.
 
         """
-        base, ext = os.path.splitext(self.file.name)
+        base, ext = os.path.splitext(os.path.basename(self.file.name))
         self.parts = base.split('_')
         self.parts.append(ext)
 
@@ -80,16 +399,269 @@ class VerificationTool(object):
             msg = 'Variable name not found'
             raise VerificationError(msg)
 
+    def bounds_variables(self):
+        """
+        Get the names of the cell bounds variables in the file.
+
+        """
+        names = set()
+        for v in self.open().variables.values():
+            if 'bounds' in v.ncattrs():
+                names.add(v.getncattr('bounds'))
+        return names
+
+    def has_units(self):
+        """
+        Check that each floating-point variable has units.
+
+        Cell bounds variables take the units of their coordinate and
+        are skipped.
+
+        """
+        import numpy as np
+        bounds = self.bounds_variables()
+        for name, v in self.open().variables.items():
+            if name in bounds or np.dtype(v.dtype).kind != 'f':
+                continue
+            if len(str(getattr(v, 'units', '')).strip()) == 0:
+                msg = 'Variable {} has no units'.format(name)
+                raise VerificationError(msg)
+
+    def has_monotonic_coordinates(self):
+        """
+        Check that each coordinate variable is strictly monotonic.
+
+        """
+        import numpy as np
+        dataset = self.open()
+        for name in dataset.dimensions:
+            v = dataset.variables.get(name)
+            if v is None or v.ndim != 1:
+                continue
+            if np.dtype(v.dtype).kind not in 'iuf':
+                continue
+            v.set_auto_maskandscale(False)
+            sign = 0
+            last = None
+            for chunk in _chunks(v, self.chunk_elements):
+                if last is not None:
+                    chunk = np.concatenate(([last], chunk))
+                if chunk.size == 0:
+                    continue
+                last = chunk[-1]
+                diff = np.diff(chunk.astype('f8'))
+                if sign == 0 and diff.size > 0:
+                    sign = 1 if diff[0] > 0 else -1
+                if not np.all(sign * diff > 0):
+                    msg = 'Coordinate {} is not monotonic'.format(name)
+                    raise VerificationError(msg)
+
+    def has_valid_data(self):
+        """
+        Check that each numeric variable holds valid data.
+
+        A variable fails if all of its values are fill, if more than
+        `max_fill_fraction` of its values are fill, if more than
+        `max_nan_fraction` of its values are NaN, or if a value is out
+        of range.
+
+        """
+        import numpy as np
+        dataset = self.open()
+        for name, v in dataset.variables.items():
+            if np.dtype(v.dtype).kind not in 'iuf' or v.size == 0:
+                continue
+            self.statistics[name] = stats = self.read_statistics(v)
+            valid = stats['count'] - stats['fill'] - stats['nan']
+            fill_fraction = float(stats['fill']) / stats['count']
+            nan_fraction = float(stats['nan']) / stats['count']
+            if valid == 0:
+                msg = 'Variable {} has no valid values'.format(name)
+                raise VerificationError(msg)
+            if fill_fraction > self.max_fill_fraction:
+                msg = 'Variable {} is {:.1%} fill'.format(name, fill_fraction)
+                raise VerificationError(msg)
+            if nan_fraction > self.max_nan_fraction:
+                msg = 'Variable {} is {:.1%} NaN'.format(name, nan_fraction)
+                raise VerificationError(msg)
+            self.check_range(v, stats['min'], stats['max'])
+
+    def read_statistics(self, variable):
+        """
+        Count the fill and NaN values and find the range of a variable.
+
+        Parameters
+        ----------
+        variable : netCDF4.Variable
+          The variable to read.
+
+        Returns
+        -------
+        dict
+          The number of values, the number of fill and NaN values, and
+          the raw minimum and maximum of the valid values (None if
+          there are no valid values). NaNs count as fill when the fill
+          value is NaN.
+
+        """
+        import numpy as np
+        variable.set_auto_maskandscale(False)
+        fill_values = _fill_values(variable)
+        is_float = np.dtype(variable.dtype).kind == 'f'
+        stats = {'count': 0, 'fill': 0, 'nan': 0, 'min': None, 'max': None}
+        nan_fill = is_float and any(np.isnan(v) for v in fill_values)
+        for chunk in _chunks(variable, self.chunk_elements):
+            missing = np.zeros(chunk.shape, dtype=bool)
+            for value in fill_values:
+                if is_float and np.isnan(value):
+                    continue
+                missing |= chunk == value
+            if nan_fill:
+                missing |= np.isnan(chunk)
+            stats['count'] += chunk.size
+            stats['fill'] += int(np.count_nonzero(missing))
+            if is_float and not nan_fill:
+                nan = np.isnan(chunk)
+                stats['nan'] += int(np.count_nonzero(nan))
+                missing |= nan
+            if missing.all():
+                continue
+            values = chunk[~missing]
+            lo, hi = values.min(), values.max()
+            if stats['min'] is None or lo < stats['min']:
+                stats['min'] = lo
+            if stats['max'] is None or hi > stats['max']:
+                stats['max'] = hi
+        return stats
+
+    def check_range(self, variable, lo, hi):
+        """
+        Check the minimum and maximum of a variable against its limits.
+
+        Parameters
+        ----------
+        variable : netCDF4.Variable
+          The variable checked.
+        lo, hi : number
+          The raw minimum and maximum values of the variable.
+
+        """
+        attrs = variable.ncattrs()
+        valid_min, valid_max = None, None
+        if 'valid_range' in attrs:
+            valid_min, valid_max = variable.getncattr('valid_range')
+        if 'valid_min' in attrs:
+            valid_min = variable.getncattr('valid_min')
+        if 'valid_max' in attrs:
+            valid_max = variable.getncattr('valid_max')
+        if ((valid_min is not None and lo < valid_min) or
+                (valid_max is not None and hi > valid_max)):
+            msg = 'Variable {} has values outside its valid range'.format(
+                variable.name)
+            raise VerificationError(msg)
+        if variable.name not in self.value_ranges:
+            return
+        scale = getattr(variable, 'scale_factor', 1.0)
+        offset = getattr(variable, 'add_offset', 0.0)
+        lo, hi = sorted([lo * scale + offset, hi * scale + offset])
+        limit_lo, limit_hi = self.value_ranges[variable.name]
+        if lo < limit_lo or hi > limit_hi:
+            msg = 'Variable {} has values outside [{}, {}]'.format(
+                variable.name, limit_lo, limit_hi)
+            raise VerificationError(msg)
+
+    def fields(self):
+        """
+        Get the fields parsed from the file.
+
+        Returns
+        -------
+        dict
+          The fields in `field_names` that have been set.
+
+        """
+        fields = {}
+        for name in self.field_names:
+            value = getattr(self, name)
+            if value is not None:
+                fields[name] = value
+        return fields
+
+    @classmethod
+    def check_filenames(cls, filenames):
+        """
+        Check many filenames without opening the files.
+
+        Parameters
+        ----------
+        filenames : list of str
+          The names of the files.
+
+        Returns
+        -------
+        list
+          A message for each name that fails the filename checks, or
+          None for each name that passes, in the order of *filenames*.
+
+        """
+        return [None] * len(filenames)
+
+    @classmethod
+    def rules(cls, deep=False):
+        """
+        Describe the checks run by `verify`.
+
+        Results cached under one description aren't valid under
+        another. Increase `rules_version` when a check changes.
+
+        Parameters
+        ----------
+        deep : bool, optional
+          Whether the deep checks are run (default is False).
+
+        Returns
+        -------
+        str
+          The tool name, rules version and names of the checks.
+
+        """
+        checks = list(cls.checks)
+        if deep:
+            checks += cls.deep_checks
+        return '{}/{}/{}'.format(cls.__name__, cls.rules_version,
+                                 ','.join(checks))
+
+    def run_check(self, name):
+        """
+        Run a check and record the time it takes.
+
+        Parameters
+        ----------
+        name : str
+          The name of the check method.
+
+        """
+        start = time.time()
+        try:
+            getattr(self, name)()
+        finally:
+            self.timings[name] = time.time() - start
+
     def verify(self):
         """
         Run all checks.
 
-        A file that passes all checks is verified.
+        A file that passes all checks is verified. The `deep_checks`
+        are also run if `deep` is set. The file is closed when the
+        checks finish, whether or not they pass.
 
         """
-        self.is_netcdf()
-        self.parse_filename()
-        self.filename_has_variable_name()
+        checks = list(self.checks)
+        if self.deep:
+            checks += self.deep_checks
+        with self:
+            for name in checks:
+                self.run_check(name)
 
 
 class ModelVerificationTool(VerificationTool):
@@ -100,6 +672,8 @@ class ModelVerificationTool(VerificationTool):
     ----------
     file : str
       The name of a file to verify.
+    deep : bool, optional
+      Set to True to also run `deep_checks` (default is False).
 
     Attributes
     ----------
@@ -136,21 +710,62 @@ class ModelVerificationTool(VerificationTool):
         tas_Amon_HADCM3_historical_r1i1p1_185001-200512.nc
 
     """
-    def __init__(self, file):
-        super(ModelVerificationTool, self).__init__(file)
+    checks = ['parse_filename', 'filename_has_variable_name',
+              'filename_has_model_name', 'is_netcdf', 'is_netcdf3_data_model']
+    field_names = VerificationTool.field_names + ['mip_table', 'model_name',
+                                                  'experiment',
+                                                  'ensemble_member',
+                                                  'temporal_subset']
+
+    def __init__(self, file, deep=False):
+        super(ModelVerificationTool, self).__init__(file, deep=deep)
         self.mip_table = None
         self.model_name = None
         self.experiment = None
         self.ensemble_member = None
         self.temporal_subset = None
 
+    @classmethod
+    def check_filenames(cls, filenames):
+        """
+        Check many filenames against the CMIP5 standard at once.
+
+        Parameters
+        ----------
+        filenames : list of str
+          The names of the files.
+
+        Returns
+        -------
+        list
+          A message for each name that isn't CMIP5-compatible, or None
+          for each name that is, in the order of *filenames*.
+
+        """
+        results = parse_many(filenames, kind='model')
+        return [explain_model(name) if fields is None else None
+                for name, fields in zip(filenames, results)]
+
+    def parse_filename(self):
+        """
+        Parse a CMIP5 filename into its fields.
+
+        """
+        super(ModelVerificationTool, self).parse_filename()
+        fields = parse_model(self.file.name)
+        if fields is None:
+            raise VerificationError(explain_model(self.file.name))
+        for name in self.field_names:
+            setattr(self, name, fields[name])
+
     def is_netcdf3_data_model(self):
         """
         Check whether a netCDF file uses the classic data model.
 
         """
-        d = Dataset(self.file.name)
-        if not d.data_model in ['NETCDF3_CLASSIC', 'NETCDF4_CLASSIC']:
+        if self.load_header() is None:
+            self.open()
+        if not self.data_model in ['NETCDF3_CLASSIC', 'NETCDF4_CLASSIC']:
             msg = 'NetCDF: File must use classic data model'
             raise VerificationError(msg)
 
@@ -165,17 +780,6 @@ class ModelVerificationTool(VerificationTool):
             msg = 'Model name not found'
             raise VerificationError(msg)
 
-    def verify(self):
-        """
-        Run all checks.
-
-        A file that passes all checks is verified.
-
-        """
-        super(ModelVerificationTool, self).verify()
-        self.is_netcdf3_data_model()
-        self.filename_has_model_name()
-
 
 class BenchmarkVerificationTool(VerificationTool):
     """
@@ -185,6 +789,8 @@ class BenchmarkVerificationTool(VerificationTool):
     ----------
     file : str
       The name of a file to verify.
+    deep : bool, optional
+      Set to True to also run `deep_checks` (default is False).
 
     Attributes
     ----------
@@ -214,5 +820,5 @@ class BenchmarkVerificationTool(VerificationTool):
         tas_0.5x0.5.nc
 
     """
-    def __init__(self, file):
-        super(BenchmarkVerificationTool, self).__init__(file)
+    def __init__(self, file, deep=False):
+        super(BenchmarkVerificationTool, self).__init__(file, deep=deep)
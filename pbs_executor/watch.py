@@ -0,0 +1,294 @@
+"""The `watch` module contains a long-running daemon that ingests files
+as they're uploaded to a directory.
+
+"""
+import os
+import sys
+import time
+import fnmatch
+import argparse
+import traceback
+from .file import IngestFile
+from .ingest import ModelIngestTool, BenchmarkIngestTool
+
+
+watch_status = '''## Watch Status\n
+Batch {} of {} files; {} files still queued.
+Latency from upload to ingest: {:.2f} s mean, {:.2f} s max.
+'''
+watch_error = '''## Watch Error
+
+Batch of {} files failed; they'll be retried once they're uploaded
+again:
+
+```
+{}
+```
+'''
+
+tools = {
+    'model': ModelIngestTool,
+    'benchmark': BenchmarkIngestTool,
+}
+
+
+class WatchDaemon(object):
+    """
+    Ingest files as they arrive in an upload directory.
+
+    The directory is polled for new files. A file is queued once its
+    size and modification time are unchanged between two polls. Queued
+    files are ingested in micro-batches, through the tool's `ingest`
+    method, when *batch_size* files are queued or when no
+    new file has arrived for *debounce* seconds. If a batch fails,
+    the error is logged and its files are set aside until they change.
+    One tool, and so one log and one set of caches and connections,
+    is kept for the life of the daemon.
+
+    Parameters
+    ----------
+    tool_class : type
+      ModelIngestTool or BenchmarkIngestTool.
+    config_file : str
+      Path to the ingest configuration file. Its `ingest_files` are
+      ignored.
+    watch_dir : str
+      The directory to watch.
+    poll_interval : float, optional
+      Seconds between polls (default is 2).
+    debounce : float, optional
+      Seconds without new files before a partial batch is ingested
+      (default is 5).
+    batch_size : int, optional
+      Maximum number of files in a batch (default is 100).
+    pattern : str, optional
+      Glob pattern of the files to ingest (default is '*.nc').
+
+    Attributes
+    ----------
+    tool : IngestTool or None
+      The tool that ingests each batch, once the first batch is
+      ingested.
+    queue : list
+      Paths of files waiting to be ingested, with their arrival
+      times.
+    failed : dict
+      The size and modification time of the files of failed batches,
+      by path. They're skipped by `poll` until either changes.
+    stats : dict
+      Counts of batches and files ingested, of failed batches, the
+      queue depth and the latency of the last batch.
+
+    """
+    def __init__(self, tool_class, config_file, watch_dir, poll_interval=2.0,
+                 debounce=5.0, batch_size=100, pattern='*.nc'):
+        self.tool_class = tool_class
+        self.config_file = config_file
+        self.watch_dir = watch_dir
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.batch_size = batch_size
+        self.pattern = pattern
+        self.tool = None
+        self.queue = []
+        self.failed = {}
+        self.stats = {'batches': 0, 'files': 0, 'failed_batches': 0,
+                      'queue_depth': 0, 'mean_latency': 0.0,
+                      'max_latency': 0.0}
+        self._pending = {}
+        self._queued = set()
+        self._last_arrival = None
+        self._configured = False
+
+    def poll(self):
+        """
+        Scan the watch directory and queue files that are complete.
+
+        Returns
+        -------
+        int
+          The number of files queued by this poll.
+
+        """
+        now = time.time()
+        pending = {}
+        count = 0
+        for name in os.listdir(self.watch_dir):
+            if name.startswith('.') or not fnmatch.fnmatch(name, self.pattern):
+                continue
+            path = os.path.join(self.watch_dir, name)
+            if path in self._queued:
+                continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            state = (st.st_size, st.st_mtime)
+            if self.failed.get(path) == state:
+                continue
+            self.failed.pop(path, None)
+            first_seen = now
+            if path in self._pending:
+                last_state, first_seen = self._pending[path]
+                if last_state == state:
+                    self.queue.append((path, first_seen))
+                    self._queued.add(path)
+                    self._last_arrival = now
+                    count += 1
+                    continue
+            pending[path] = (state, first_seen)
+        self._pending = pending
+        self.stats['queue_depth'] = len(self.queue)
+        return count
+
+    def is_batch_ready(self):
+        """
+        Check whether the queued files should be ingested now.
+
+        """
+        if len(self.queue) == 0:
+            return False
+        if len(self.queue) >= self.batch_size:
+            return True
+        return time.time() - self._last_arrival >= self.debounce
+
+    def get_tool(self):
+        """
+        Get the daemon's tool, configuring it the first time.
+
+        Returns
+        -------
+        IngestTool
+          The tool, configured from `config_file`.
+
+        """
+        if self.tool is None:
+            self.tool = self.tool_class()
+        if not self._configured:
+            self.tool.load(self.config_file)
+            self._configured = True
+        return self.tool
+
+    def ingest(self):
+        """
+        Ingest the next batch of queued files.
+
+        If the ingest raises, the error is written to the log and the
+        files of the batch are added to `failed`.
+
+        Returns
+        -------
+        IngestTool
+          The tool used for the batch, or None if the queue is empty.
+
+        """
+        batch = self.queue[:self.batch_size]
+        if len(batch) == 0:
+            return None
+        del self.queue[:len(batch)]
+        try:
+            tool = self.get_tool()
+            tool.ingest_files = [IngestFile(path) for path, t in batch]
+            tool.ingest()
+        except Exception:
+            self.set_aside(batch)
+            self.stats['failed_batches'] += 1
+            self.stats['queue_depth'] = len(self.queue)
+            tool = self.tool
+            tool.log.add(watch_error.format(len(batch),
+                                            traceback.format_exc()))
+            tool.log.close()
+            return tool
+        finally:
+            for path, t in batch:
+                self._queued.discard(path)
+        now = time.time()
+        latencies = [now - t for path, t in batch]
+        self.stats['batches'] += 1
+        self.stats['files'] += len(batch)
+        self.stats['queue_depth'] = len(self.queue)
+        self.stats['mean_latency'] = sum(latencies) / len(latencies)
+        self.stats['max_latency'] = max(latencies)
+        tool.log.add(watch_status.format(self.stats['batches'], len(batch),
+                                         self.stats['queue_depth'],
+                                         self.stats['mean_latency'],
+                                         self.stats['max_latency']))
+        tool.log.close()
+        return tool
+
+    def set_aside(self, batch):
+        """
+        Skip the files of a failed batch until they're uploaded again.
+
+        Parameters
+        ----------
+        batch : list
+          Paths of files, with their arrival times.
+
+        """
+        for path, t in batch:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            self.failed[path] = (st.st_size, st.st_mtime)
+
+    def run_once(self):
+        """
+        Poll the watch directory and ingest a batch if one is ready.
+
+        """
+        self.poll()
+        while self.is_batch_ready():
+            self.ingest()
+
+    def run(self, max_polls=None):
+        """
+        Watch the upload directory until interrupted.
+
+        Parameters
+        ----------
+        max_polls : int, optional
+          Stop after this many polls (default is to run forever).
+
+        """
+        polls = 0
+        while max_polls is None or polls < max_polls:
+            self.run_once()
+            polls += 1
+            time.sleep(self.poll_interval)
+
+
+def main(argv=None):
+    """
+    Run the watch daemon from the command line.
+
+    """
+    parser = argparse.ArgumentParser(
+        description='Ingest files as they are uploaded to a directory.')
+    parser.add_argument('tool', choices=sorted(tools),
+                        help='Type of files to ingest')
+    parser.add_argument('config_file', help='Ingest configuration file')
+    parser.add_argument('watch_dir', help='Directory to watch')
+    parser.add_argument('--poll-interval', type=float, default=2.0,
+                        help='Seconds between polls')
+    parser.add_argument('--debounce', type=float, default=5.0,
+                        help='Seconds without new files before ingesting')
+    parser.add_argument('--batch-size', type=int, default=100,
+                        help='Maximum number of files per batch')
+    parser.add_argument('--pattern', default='*.nc',
+                        help='Glob pattern of files to ingest')
+    args = parser.parse_args(argv)
+    daemon = WatchDaemon(tools[args.tool], args.config_file, args.watch_dir,
+                         poll_interval=args.poll_interval,
+                         debounce=args.debounce, batch_size=args.batch_size,
+                         pattern=args.pattern)
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        return 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
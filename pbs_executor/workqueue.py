@@ -0,0 +1,606 @@
+"""The `workqueue` module shards one ingest across worker processes on
+many nodes, through a queue of batch files on a shared filesystem.
+
+"""
+import os
+import sys
+import time
+import json
+import socket
+import argparse
+import threading
+from .file import IngestFile, Logger
+from .ingest import ModelIngestTool, BenchmarkIngestTool
+from .utils import makedirs, batches
+
+
+queue_status = '''## Distributed Ingest\n
+{} files in {} batches were ingested by {} workers.
+'''
+batch_missing = '''## Batches Not Ingested\n
+These batches have no results: {}.
+'''
+
+batch_failed = '''## Batch Failed\n
+The ingest of batch `{}` by `{}` stopped with an error, and its files
+may have been only partly ingested. Error message:\n
+    {}
+'''
+
+tools = {
+    'model': ModelIngestTool,
+    'benchmark': BenchmarkIngestTool,
+}
+
+
+def default_worker_id():
+    """
+    Get a name for this process that is unique across nodes.
+
+    """
+    return '{}-{}'.format(socket.gethostname(), os.getpid())
+
+
+def _write_json(path, data):
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp, 'w') as fp:
+        json.dump(data, fp)
+    os.rename(tmp, path)
+
+
+def _read_json(path):
+    with open(path, 'r') as fp:
+        return json.load(fp)
+
+
+class WorkQueue(object):
+    """
+    A queue of batches of files, kept as files in a shared directory.
+
+    Each batch is a JSON file that moves from `pending` to `claimed`
+    to `done`. A worker claims a batch by renaming it, which is atomic
+    on a POSIX or NFS filesystem, so no two workers get the same batch
+    and no broker or lock server is needed.
+
+    Parameters
+    ----------
+    root : str
+      The queue directory. It's created if it doesn't exist.
+
+    Attributes
+    ----------
+    root : str
+      The queue directory.
+
+    Examples
+    --------
+    >>> queue = WorkQueue('/shared/queue')
+    >>> queue.submit(['a.nc', 'b.nc', 'c.nc'], batch_size=2)
+    2
+    >>> batch, paths = queue.claim('node1-123')
+    >>> queue.complete(batch, 'node1-123', {'messages': []})
+
+    """
+    states = ['pending', 'claimed', 'done', 'logs']
+
+    def __init__(self, root):
+        self.root = root
+        for state in self.states:
+            makedirs(os.path.join(root, state), exist_ok=True)
+
+    def path(self, state, name=''):
+        """
+        Get the path of a file in one of the queue's directories.
+
+        """
+        return os.path.join(self.root, state, name)
+
+    def submit(self, paths, batch_size=100):
+        """
+        Split files into batches and add them to the queue.
+
+        Parameters
+        ----------
+        paths : iterable of str
+          The paths of the files to ingest. They're read one batch at
+          a time.
+        batch_size : int, optional
+          Maximum number of files in a batch (default is 100).
+
+        Returns
+        -------
+        int
+          The number of batches added.
+
+        """
+        start = len(self.batches())
+        count = 0
+        for batch in batches(paths, batch_size):
+            name = 'batch-{:06d}.json'.format(start + count)
+            _write_json(self.path('pending', name),
+                        {'batch': name,
+                         'files': [os.path.abspath(p) for p in batch]})
+            count += 1
+        return count
+
+    def batches(self):
+        """
+        List the names of all batches, in any state.
+
+        """
+        names = set()
+        for state in ['pending', 'claimed', 'done']:
+            for name in os.listdir(self.path(state)):
+                if name.startswith('batch-') and not name.endswith('.tmp'):
+                    names.add(name.split('@')[0])
+        return sorted(names)
+
+    def claim(self, worker):
+        """
+        Claim the next pending batch.
+
+        Parameters
+        ----------
+        worker : str
+          The name of the worker.
+
+        Returns
+        -------
+        tuple or None
+          The batch name and the paths of its files, or None if no
+          batch is pending.
+
+        """
+        for name in sorted(os.listdir(self.path('pending'))):
+            if not name.startswith('batch-') or name.endswith('.tmp'):
+                continue
+            src = self.path('pending', name)
+            dst = self.path('claimed', '{}@{}'.format(name, worker))
+            try:
+                os.rename(src, dst)
+            except OSError:
+                if not os.path.exists(dst):
+                    continue
+            if os.path.exists(self.path('done', name)):
+                os.remove(dst)
+                continue
+            os.utime(dst, None)
+            return name, _read_json(dst)['files']
+        return None
+
+    def touch(self, batch, worker):
+        """
+        Mark a claimed batch as still being worked on.
+
+        """
+        try:
+            os.utime(self.path('claimed', '{}@{}'.format(batch, worker)),
+                     None)
+        except OSError:
+            pass
+
+    def complete(self, batch, worker, result):
+        """
+        Record the result of a batch and release its claim.
+
+        Parameters
+        ----------
+        batch : str
+          The batch name.
+        worker : str
+          The name of the worker.
+        result : dict
+          The result, which must be serializable as JSON.
+
+        """
+        _write_json(self.path('done', batch), result)
+        try:
+            os.remove(self.path('claimed', '{}@{}'.format(batch, worker)))
+        except OSError:
+            pass
+
+    def requeue_stale(self, max_age):
+        """
+        Return batches claimed by workers that have stopped to the queue.
+
+        Parameters
+        ----------
+        max_age : float
+          Seconds since a claim was last touched after which it's
+          considered abandoned.
+
+        Returns
+        -------
+        list of str
+          The names of the batches returned to the queue.
+
+        """
+        now = time.time()
+        requeued = []
+        for name in os.listdir(self.path('claimed')):
+            p = self.path('claimed', name)
+            try:
+                age = now - os.stat(p).st_mtime
+            except OSError:
+                continue
+            if age < max_age:
+                continue
+            batch = name.split('@')[0]
+            try:
+                os.rename(p, self.path('pending', batch))
+            except OSError:
+                continue
+            requeued.append(batch)
+        return requeued
+
+    def counts(self):
+        """
+        Count the batches in each state.
+
+        Returns
+        -------
+        dict
+          The number of 'pending', 'claimed' and 'done' batches.
+
+        """
+        return dict((state, len([n for n in os.listdir(self.path(state))
+                                 if n.startswith('batch-') and
+                                 not n.endswith('.tmp')]))
+                    for state in ['pending', 'claimed', 'done'])
+
+    def is_finished(self):
+        """
+        Check whether every batch has a result.
+
+        """
+        counts = self.counts()
+        return counts['pending'] == 0 and counts['claimed'] == 0
+
+    def results(self):
+        """
+        Read the results of the finished batches, in batch order.
+
+        Returns
+        -------
+        generator of dict
+          The result of each batch.
+
+        """
+        for name in sorted(os.listdir(self.path('done'))):
+            if name.startswith('batch-') and not name.endswith('.tmp'):
+                yield _read_json(self.path('done', name))
+
+
+class _BatchLog(Logger):
+
+    def __init__(self, *args, **kwargs):
+        self.messages = []
+        super(_BatchLog, self).__init__(*args, **kwargs)
+
+    def add(self, message):
+        self.messages.append(message)
+        super(_BatchLog, self).add(message)
+
+
+class Worker(object):
+    """
+    Claim and ingest batches from a work queue until it's empty.
+
+    Each batch is ingested by a new tool, configured from
+    *config_file*, through the tool's `run_stages` method. The log of
+    each batch is written to the queue's `logs` directory, and its
+    messages, metrics and placed files are stored as the batch's
+    result for the coordinator to merge.
+
+    Locking and appends aren't reliable on a shared filesystem, so no
+    two processes write to the same file: the coverage index and the
+    catalog are written by the coordinator, from the results, and the
+    verification cache isn't used. If `journal` or `metrics_file` is
+    set, each worker writes its own journal or metrics file, named
+    after the worker, in the `logs` directory.
+
+    Parameters
+    ----------
+    tool_class : type
+      ModelIngestTool or BenchmarkIngestTool.
+    config_file : str
+      Path to the ingest configuration file. Its `ingest_files` are
+      ignored.
+    queue_dir : str
+      The queue directory.
+    worker_id : str, optional
+      The name of the worker (default is the host name and process
+      ID).
+    heartbeat : float, optional
+      Seconds between touches of a claimed batch (default is 30).
+
+    Attributes
+    ----------
+    queue : WorkQueue
+      The queue.
+    worker_id : str
+      The name of the worker.
+
+    """
+    def __init__(self, tool_class, config_file, queue_dir, worker_id=None,
+                 heartbeat=30.0):
+        self.tool_class = tool_class
+        self.config_file = config_file
+        self.queue = WorkQueue(queue_dir)
+        self.worker_id = worker_id or default_worker_id()
+        self.heartbeat = heartbeat
+
+    def run_batch(self, batch, paths):
+        """
+        Ingest the files of a batch.
+
+        Parameters
+        ----------
+        batch : str
+          The batch name.
+        paths : list of str
+          The paths of the files.
+
+        Returns
+        -------
+        dict
+          The batch name, worker name, log messages, metrics totals
+          and the files placed in the data store.
+
+        """
+        tool = self.tool_class()
+        tool.load(self.config_file)
+        tool.log = _BatchLog(
+            title='Batch {}'.format(batch),
+            path=self.queue.path('logs', batch.replace('.json', '.html')))
+        tool.coverage = False
+        tool.catalog = False
+        tool.verify_cache = False
+        if tool.journal:
+            tool.journal_file = os.path.abspath(self.queue.path(
+                'logs', '{}.journal.jsonl'.format(self.worker_id)))
+        if tool.metrics.path is not None:
+            tool.metrics.path = os.path.abspath(self.queue.path(
+                'logs', '{}.metrics.jsonl'.format(self.worker_id)))
+        tool.ingest_files = [IngestFile(p) for p in paths]
+        start = time.time()
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(self.heartbeat):
+                self.queue.touch(batch, self.worker_id)
+
+        t = threading.Thread(target=beat)
+        t.daemon = True
+        t.start()
+        try:
+            tool.run_stages()
+        finally:
+            stop.set()
+        tool.log.close()
+        if tool.journal:
+            tool.get_journal().close()
+        placed = [{'name': f.name, 'target': f.target, 'fields': f.fields,
+                   'data': f.data, 'checksum': f.checksum}
+                  for f in tool.ingest_files if f.target is not None]
+        return {'batch': batch, 'worker': self.worker_id,
+                'files': len(paths), 'placed': placed,
+                'messages': tool.log.messages,
+                'metrics': tool.metrics.totals,
+                'seconds': time.time() - start}
+
+    def run(self, max_batches=None):
+        """
+        Ingest batches until none are pending.
+
+        A batch that raises an error is completed with a result that
+        holds the error message, so the coordinator logs it rather
+        than waiting for the batch.
+
+        Parameters
+        ----------
+        max_batches : int, optional
+          Stop after this many batches (default is no limit).
+
+        Returns
+        -------
+        int
+          The number of batches ingested.
+
+        """
+        count = 0
+        while max_batches is None or count < max_batches:
+            claimed = self.queue.claim(self.worker_id)
+            if claimed is None:
+                break
+            batch, paths = claimed
+            try:
+                result = self.run_batch(batch, paths)
+            except Exception as e:
+                msg = batch_failed.format(batch, self.worker_id, e)
+                result = {'batch': batch, 'worker': self.worker_id,
+                          'files': len(paths), 'placed': [],
+                          'messages': [msg], 'metrics': {},
+                          'seconds': 0.0, 'error': str(e)}
+            self.queue.complete(batch, self.worker_id, result)
+            count += 1
+        return count
+
+
+class Coordinator(object):
+    """
+    Split an ingest into a work queue and merge the workers' results.
+
+    Parameters
+    ----------
+    tool_class : type
+      ModelIngestTool or BenchmarkIngestTool.
+    config_file : str
+      Path to the ingest configuration file.
+    queue_dir : str
+      The queue directory, on a filesystem shared with the workers.
+    batch_size : int, optional
+      Maximum number of files in a batch (default is 100).
+
+    Attributes
+    ----------
+    queue : WorkQueue
+      The queue.
+
+    """
+    def __init__(self, tool_class, config_file, queue_dir, batch_size=100):
+        self.tool_class = tool_class
+        self.config_file = config_file
+        self.queue = WorkQueue(queue_dir)
+        self.batch_size = batch_size
+
+    def submit(self):
+        """
+        Add the `ingest_files` of the configuration file to the queue.
+
+        Returns
+        -------
+        int
+          The number of batches added.
+
+        """
+        tool = self.tool_class()
+        tool.load(self.config_file)
+        return self.queue.submit((f.name for f in tool.ingest_files),
+                                 batch_size=self.batch_size)
+
+    def wait(self, poll_interval=5.0, stale_after=300.0, timeout=None):
+        """
+        Wait for the workers to finish every batch.
+
+        Parameters
+        ----------
+        poll_interval : float, optional
+          Seconds between checks of the queue (default is 5).
+        stale_after : float, optional
+          Seconds after which a claim that hasn't been touched is
+          returned to the queue (default is 300, ten worker
+          heartbeats). Set to None to never requeue claims.
+        timeout : float, optional
+          Seconds after which to stop waiting (default is never).
+
+        Returns
+        -------
+        bool
+          True if every batch is finished.
+
+        """
+        start = time.time()
+        while not self.queue.is_finished():
+            if timeout is not None and time.time() - start > timeout:
+                return False
+            if stale_after is not None:
+                self.queue.requeue_stale(stale_after)
+            time.sleep(poll_interval)
+        return True
+
+    def merge(self):
+        """
+        Merge the results of the batches into one log.
+
+        The messages of the batches are logged in batch order,
+        followed by the coverage gaps, if `coverage` is set, and the
+        combined timing summary. If `catalog` is set, the placed files
+        of each batch are added to the catalog.
+
+        Returns
+        -------
+        IngestTool
+          The tool whose log holds the merged summary.
+
+        """
+        tool = self.tool_class()
+        tool.load(self.config_file)
+        done = set()
+        workers = set()
+        nfiles = 0
+        for result in self.queue.results():
+            done.add(result['batch'])
+            workers.add(result['worker'])
+            nfiles += result['files']
+            for msg in result['messages']:
+                tool.log_message(msg)
+            tool.metrics.merge(result['metrics'])
+            placed = []
+            for record in result['placed']:
+                f = IngestFile(record['name'])
+                f.target = record['target']
+                f.fields = record['fields']
+                f.data = record.get('data')
+                f.checksum = record.get('checksum')
+                placed.append(f)
+            if tool.catalog and placed:
+                tool.get_catalog().add_many([tool.catalog_record(f)
+                                             for f in placed])
+            if tool.coverage:
+                for f in placed:
+                    msg = tool.add_to_coverage(f)
+                    if msg:
+                        tool.log_message('## Coverage of `{}`\n{}'.format(
+                            os.path.basename(f.target), msg))
+        tool.save_coverage()
+        missing = [b for b in self.queue.batches() if b not in done]
+        if missing:
+            tool.log_message(batch_missing.format(', '.join(missing)))
+        tool.log_message(queue_status.format(nfiles, len(done),
+                                             len(workers)))
+        tool.log.add(tool.metrics.summary())
+        tool.log.close()
+        return tool
+
+
+def main(argv=None):
+    """
+    Run the coordinator or a worker of a distributed ingest.
+
+    """
+    parser = argparse.ArgumentParser(
+        description='Shard an ingest across workers through a shared '
+        'directory.')
+    parser.add_argument('command', choices=['submit', 'work', 'wait',
+                                            'merge', 'status'],
+                        help='Step to run')
+    parser.add_argument('tool', choices=sorted(tools),
+                        help='Type of files to ingest')
+    parser.add_argument('config_file', help='Ingest configuration file')
+    parser.add_argument('queue_dir', help='Shared queue directory')
+    parser.add_argument('--batch-size', type=int, default=100,
+                        help='Maximum number of files per batch')
+    parser.add_argument('--worker-id', help='Name of this worker')
+    parser.add_argument('--max-batches', type=int,
+                        help='Maximum number of batches for this worker')
+    parser.add_argument('--poll-interval', type=float, default=5.0,
+                        help='Seconds between checks of the queue')
+    parser.add_argument('--stale-after', type=float, default=300.0,
+                        help='Seconds after which an untouched claim is '
+                        'returned to the queue')
+    args = parser.parse_args(argv)
+    tool_class = tools[args.tool]
+    if args.command == 'work':
+        n = Worker(tool_class, args.config_file, args.queue_dir,
+                   worker_id=args.worker_id).run(args.max_batches)
+        sys.stdout.write('{} batches ingested\n'.format(n))
+        return 0
+    coordinator = Coordinator(tool_class, args.config_file, args.queue_dir,
+                              batch_size=args.batch_size)
+    if args.command == 'submit':
+        n = coordinator.submit()
+        sys.stdout.write('{} batches submitted\n'.format(n))
+    elif args.command == 'wait':
+        coordinator.wait(poll_interval=args.poll_interval,
+                         stale_after=args.stale_after)
+    elif args.command == 'merge':
+        coordinator.merge()
+    else:
+        sys.stdout.write(json.dumps(coordinator.queue.counts(),
+                                    sort_keys=True) + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
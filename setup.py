@@ -18,6 +18,13 @@ setup(name='pbs-executor',
       ],
       packages=find_packages(exclude=['*.tests']),
       include_package_data=True,
+      entry_points={
+          'console_scripts': [
+              'pbs-ingest-watch=pbs_executor.watch:main',
+              'pbs-rebuild-links=pbs_executor.links:main',
+              'pbs-work-queue=pbs_executor.workqueue:main',
+          ],
+      },
       test_suite='nose.collector',
       tests_require=[
           'nose',